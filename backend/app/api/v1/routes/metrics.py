@@ -0,0 +1,40 @@
+"""
+Metrics Endpoint
+
+GET /api/v1/metrics/cache
+    In-process flight offer LRU: size, memory bound, hit ratio (per worker)
+
+GET /api/v1/metrics/partitions
+    flight_cache partitions: live/dead rows, table and index size, last vacuum
+
+GET /api/v1/metrics/providers
+    Adaptive concurrency limit of each flight provider: current limit, calls
+    in flight / waiting, latency and error-rate EWMAs, 429s (per worker)
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.cache_maintenance import partition_stats
+from app.db.database import get_session
+from app.db.memory_cache import offer_lru
+from app.utils.adaptive_limiter import limiter_stats
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def cache_metrics() -> dict:
+    """Stats of this worker's in-process cache tier."""
+    return offer_lru.stats()
+
+
+@router.get("/partitions")
+async def partition_metrics(session: AsyncSession = Depends(get_session)) -> list[dict]:
+    """Size and vacuum pressure of each monthly flight_cache partition."""
+    return await partition_stats(session)
+
+
+@router.get("/providers")
+async def provider_metrics() -> list[dict]:
+    """This worker's adaptive concurrency limiters, one per flight provider."""
+    return limiter_stats()
@@ -1,14 +1,33 @@
-import asyncio
+import json
 from datetime import date, datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
-from app.models.schemas import FlightOfferOut, ReverseSearchOut, SmartMultiIn, SmartMultiOut
+from app.db.database import async_session_maker, get_session
+from app.db.search_history import record_search
+from app.models.schemas import (
+    DestinationOfferOut,
+    FlightOfferOut,
+    ForwardSearchOut,
+    LegOut,
+    MeetInTheMiddleIn,
+    MeetInTheMiddleOut,
+    ReverseSearchOut,
+    RoundTripOut,
+    RoundTripSearchOut,
+    SmartMultiIn,
+    SmartMultiOut,
+)
+from app.services.forward_search import forward_search
+from app.services.meet_search import meet_in_the_middle_search
+from app.services.providers.base import FlightOffer
+from app.services.round_trip import round_trip_search
 from app.services.search_engine import reverse_search
-from app.services.itinerary_engine import run_smart_multi
+from app.utils.deadline import Deadline
+from app.services.itinerary_engine import run_smart_multi, stream_smart_multi
 
 router = APIRouter()
 
@@ -31,6 +50,7 @@ GET /api/v1/search/reverse
 @router.get("/reverse", response_model=ReverseSearchOut)
 async def search_reverse(
     session: SessionDep,
+    background_tasks: BackgroundTasks,
     destination: Annotated[
         str, Query(min_length=3, max_length=3, description="Codice IATA destinazione")
     ],
@@ -61,6 +81,14 @@ async def search_reverse(
         )
     #Validation area -------------------------------------------
 
+    # Demand signal for the pre-warming scheduler (written after the response)
+    background_tasks.add_task(record_search, "reverse", {
+        "destination": destination.upper(),
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "direct_only": direct_only,
+    })
+
 
     results, cached, fetched_at, provider_status = await reverse_search(
         session=session,
@@ -101,16 +129,247 @@ async def search_reverse(
     )
 
 
-@router.post("/smart-multi", response_model=SmartMultiOut)
-async def search_smart_multi(
+"""
+Endpoint Forward Search.
+
+GET /api/v1/search/forward
+  ?origin=CTA
+  &date_from=2026-04-01
+  &date_to=2026-04-03
+  &direct_only=false
+  &max_results=100
+  &radius_km=1500
+"""
+@router.get("/forward", response_model=ForwardSearchOut)
+async def search_forward(
     session: SessionDep,
-    body: SmartMultiIn,
-) -> SmartMultiOut:
+    background_tasks: BackgroundTasks,
+    origin: Annotated[
+        str, Query(min_length=3, max_length=3, description="IATA code of the departure airport")
+    ],
+    date_from: Annotated[date, Query(description="Earliest departure date (YYYY-MM-DD)")],
+    date_to: Annotated[date, Query(description="Latest departure date (YYYY-MM-DD)")],
+    direct_only: Annotated[bool, Query(description="Direct flights only")] = False,
+    max_results: Annotated[int, Query(ge=1, le=500, description="Max number of destinations")] = 100,
+    radius_km: Annotated[
+        int | None, Query(ge=50, le=5000, description="Max distance of the destinations in km")
+    ] = None,
+) -> ForwardSearchOut:
+
+    #Validation area -------------------------------------------
+    if date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from has to be <= date_to")
+    if (date_to - date_from).days > 6:
+        raise HTTPException(status_code=422, detail="Max range is 7 days")
+    #Validation area -------------------------------------------
+
+    background_tasks.add_task(record_search, "forward", {
+        "origin": origin.upper(),
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "direct_only": direct_only,
+    })
+
+    try:
+        results, cached, fetched_at, provider_status = await forward_search(
+            session=session,
+            origin=origin.upper(),
+            date_from=date_from,
+            date_to=date_to,
+            direct_only=direct_only,
+            max_results=max_results,
+            radius_km=radius_km,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No flight found from {origin}")
+
+    offers = [
+        DestinationOfferOut(
+            destination=r["destination"],
+            destination_city=r["destination_city"],
+            price_eur=r["price_eur"],
+            airline=r["airline"],
+            departure=datetime.fromisoformat(r["departure"]),
+            direct=r["direct"],
+            duration_minutes=r["duration_minutes"],
+            latitude=r["latitude"],
+            longitude=r["longitude"],
+        )
+        for r in results
+    ]
+
+    return ForwardSearchOut(
+        origin=origin.upper(),
+        results=offers,
+        cached=cached,
+        fetched_at=fetched_at,
+        provider_status=provider_status,
+    )
+
+
+"""
+Endpoint Round-Trip Search.
+
+GET /api/v1/search/round-trip
+  ?origin=CTA
+  &depart_from=2026-04-03
+  &depart_to=2026-04-03
+  &min_nights=2
+  &max_nights=2
+  &destination=ATH        (optional: omitted → best combination per destination)
+  &direct_only=false
+  &max_results=20
+"""
+@router.get("/round-trip", response_model=RoundTripSearchOut)
+async def search_round_trip(
+    session: SessionDep,
+    background_tasks: BackgroundTasks,
+    origin: Annotated[
+        str, Query(min_length=3, max_length=3, description="IATA code of the departure/return airport")
+    ],
+    depart_from: Annotated[date, Query(description="Earliest outbound date (YYYY-MM-DD)")],
+    depart_to: Annotated[date, Query(description="Latest outbound date (YYYY-MM-DD)")],
+    min_nights: Annotated[int, Query(ge=0, le=14, description="Minimum nights at destination")] = 1,
+    max_nights: Annotated[int, Query(ge=0, le=14, description="Maximum nights at destination")] = 3,
+    destination: Annotated[
+        str | None, Query(min_length=3, max_length=3, description="IATA code of the destination")
+    ] = None,
+    direct_only: Annotated[bool, Query(description="Direct flights only")] = False,
+    max_results: Annotated[int, Query(ge=1, le=100, description="Max number of combinations")] = 20,
+) -> RoundTripSearchOut:
+
+    #Validation area -------------------------------------------
+    if depart_from > depart_to:
+        raise HTTPException(status_code=422, detail="depart_from has to be <= depart_to")
+    if (depart_to - depart_from).days > 6:
+        raise HTTPException(status_code=422, detail="Max outbound range is 7 days")
+    if min_nights > max_nights:
+        raise HTTPException(status_code=422, detail="min_nights has to be <= max_nights")
+    #Validation area -------------------------------------------
+
+    background_tasks.add_task(record_search, "round_trip", {
+        "origin": origin.upper(),
+        "destination": destination.upper() if destination else None,
+        "depart_from": depart_from.isoformat(),
+        "depart_to": depart_to.isoformat(),
+        "min_nights": min_nights,
+        "max_nights": max_nights,
+    })
+
+    try:
+        results, cached, provider_status = await round_trip_search(
+            session=session,
+            origin=origin.upper(),
+            depart_from=depart_from,
+            depart_to=depart_to,
+            min_nights=min_nights,
+            max_nights=max_nights,
+            destination=destination.upper() if destination else None,
+            direct_only=direct_only,
+            max_results=max_results,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No round trip found from {origin}")
+
+    def _leg(o: FlightOffer) -> LegOut:
+        return LegOut(
+            from_airport=o.origin,
+            to_airport=o.destination,
+            price_per_person_eur=o.price_eur,
+            airline=o.airline,
+            departure=o.departure,
+            duration_minutes=o.duration_minutes,
+            direct=o.direct,
+        )
+
+    return RoundTripSearchOut(
+        origin=origin.upper(),
+        results=[
+            RoundTripOut(
+                destination=r["destination"],
+                destination_city=r["destination_city"],
+                latitude=r["latitude"],
+                longitude=r["longitude"],
+                nights=r["nights"],
+                total_price_eur=r["total_price_eur"],
+                outbound=_leg(r["outbound"]),
+                inbound=_leg(r["inbound"]),
+            )
+            for r in results
+        ],
+        cached=cached,
+        provider_status=provider_status,
+    )
+
+
+@router.post("/meet-in-the-middle", response_model=MeetInTheMiddleOut)
+async def search_meet_in_the_middle(
+    session: SessionDep,
+    background_tasks: BackgroundTasks,
+    body: MeetInTheMiddleIn,
+) -> MeetInTheMiddleOut:
     """
-    Smart Multi-City: given origin, duration, budget, and dates, 
-    returns the top 5 optimized multi-city itineraries with real prices
+    Meet-in-the-Middle: given 2-5 origins and a date window, returns the
+    destinations with the lowest combined (or worst single) fare for the group.
     """
+    origins = [o.upper() for o in body.origins]
+
+    #Validation area -------------------------------------------
+    if not 2 <= len(origins) <= 5:
+        raise HTTPException(status_code=422, detail="origins has to contain between 2 and 5 airports")
+    if any(len(o) != 3 for o in origins):
+        raise HTTPException(status_code=422, detail="origins must be IATA codes")
+    if len(set(origins)) != len(origins):
+        raise HTTPException(status_code=422, detail="origins must be distinct")
+    if body.rank_by not in ("total", "max"):
+        raise HTTPException(status_code=422, detail="rank_by has to be 'total' or 'max'")
+    if body.date_from > body.date_to:
+        raise HTTPException(status_code=422, detail="date_from has to be <= date_to")
+    if (body.date_to - body.date_from).days > 6:
+        raise HTTPException(status_code=422, detail="Max range is 7 days")
+    if not 1 <= body.max_results <= 100:
+        raise HTTPException(status_code=422, detail="max_results has to be between 1 and 100")
     #Validation area -------------------------------------------
+
+    background_tasks.add_task(record_search, "meet", {
+        "origins": origins,
+        "date_from": body.date_from.isoformat(),
+        "date_to": body.date_to.isoformat(),
+        "rank_by": body.rank_by,
+    })
+
+    try:
+        results, cached, provider_status = await meet_in_the_middle_search(
+            session=session,
+            origins=origins,
+            date_from=body.date_from,
+            date_to=body.date_to,
+            rank_by=body.rank_by,
+            direct_only=body.direct_only,
+            max_results=body.max_results,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+    if not results:
+        raise HTTPException(status_code=404, detail="No destination reachable from every origin")
+
+    return MeetInTheMiddleOut(
+        origins=origins,
+        rank_by=body.rank_by,
+        results=results,
+        cached=cached,
+        provider_status=provider_status,
+    )
+
+
+def _validate_smart_multi(body: SmartMultiIn) -> None:
     if body.trip_duration_days < 5 or body.trip_duration_days > 25:
         raise HTTPException(status_code=422, detail="trip_duration_days has to be between 5 and 25")
     if body.budget_per_person_eur <= 0:
@@ -119,36 +378,124 @@ async def search_smart_multi(
         raise HTTPException(status_code=422, detail="travelers has to be almost 1")
     if body.date_from >= body.date_to:
         raise HTTPException(status_code=422, detail="date_from has to be < date_to")
-    #Validation area -------------------------------------------
+    if body.engine not in ("llm", "graph"):
+        raise HTTPException(status_code=422, detail="engine has to be 'llm' or 'graph'")
+    if not 0 <= body.flex_days <= 3:
+        raise HTTPException(status_code=422, detail="flex_days has to be between 0 and 3")
+
 
+def _smart_multi_params(body: SmartMultiIn) -> dict:
+    return {
+        "origin": body.origin.upper(),
+        "trip_duration_days": body.trip_duration_days,
+        "budget_per_person_eur": body.budget_per_person_eur,
+        "travelers": body.travelers,
+        "date_from": body.date_from,
+        "date_to": body.date_to,
+        "direct_only": body.direct_only,
+        "engine": body.engine,
+        "flex_days": body.flex_days,
+    }
 
 
+def _record_smart_multi(background_tasks: BackgroundTasks, body: SmartMultiIn) -> None:
+    background_tasks.add_task(record_search, "smart_multi", {
+        "origin": body.origin.upper(),
+        "date_from": body.date_from.isoformat(),
+        "date_to": body.date_to.isoformat(),
+        "trip_duration_days": body.trip_duration_days,
+        "budget_per_person_eur": body.budget_per_person_eur,
+        "travelers": body.travelers,
+        "engine": body.engine,
+        "flex_days": body.flex_days,
+    })
+
+
+# Request deadline: the pipeline splits it between its steps and, when pricing
+# runs out of time, answers with the itineraries priced so far (partial=true)
+_SMART_MULTI_DEADLINE_S = 55
+_SMART_MULTI_TIMEOUT_DETAIL = (
+    "La ricerca ha impiegato troppo tempo. "
+    "Riprova tra qualche secondo — i provider di voli sono temporaneamente lenti."
+)
+
+
+@router.post("/smart-multi", response_model=SmartMultiOut)
+async def search_smart_multi(
+    session: SessionDep,
+    background_tasks: BackgroundTasks,
+    body: SmartMultiIn,
+) -> SmartMultiOut:
+    """
+    Smart Multi-City: given origin, duration, budget, and dates, 
+    returns the top 5 optimized multi-city itineraries with real prices
+    """
+    _validate_smart_multi(body)
+    _record_smart_multi(background_tasks, body)
 
     try:
-        result = await asyncio.wait_for(
-            run_smart_multi(
-                session=session,
-                origin=body.origin.upper(),
-                trip_duration_days=body.trip_duration_days,
-                budget_per_person_eur=body.budget_per_person_eur,
-                travelers=body.travelers,
-                date_from=body.date_from,
-                date_to=body.date_to,
-                direct_only=body.direct_only,
-            ),
-            timeout=55,
-        )
-    except asyncio.TimeoutError:
-        raise HTTPException(
-            status_code=503,
-            detail=(
-                "La ricerca ha impiegato troppo tempo. "
-                "Riprova tra qualche secondo — i provider di voli sono temporaneamente lenti."
-            ),
+        result = await run_smart_multi(
+            session=session, **_smart_multi_params(body), deadline=Deadline(_SMART_MULTI_DEADLINE_S)
         )
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail=_SMART_MULTI_TIMEOUT_DETAIL)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc))
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc))
 
     return result
+
+
+"""
+Endpoint Smart Multi-City, streaming.
+
+POST /api/v1/search/smart-multi/stream   (same body as /smart-multi)
+
+application/x-ndjson, one JSON object per line:
+  {"event": "candidates", "routes": [[...], ...]}
+  {"event": "itinerary", "itinerary": {...}, "ranking": [{"route": [...], "total_price_per_person_eur": ...}]}
+  {"event": "done", "itineraries": [...], "provider_status": {...}}
+  {"event": "error", "status": 404|503, "detail": "..."}     instead of "done"
+
+Validation errors are still plain 422 responses: the stream starts only
+once the request is accepted.
+"""
+@router.post("/smart-multi/stream")
+async def search_smart_multi_stream(
+    background_tasks: BackgroundTasks,
+    body: SmartMultiIn,
+) -> StreamingResponse:
+    """
+    Smart Multi-City, progressive: candidate routes as soon as they are known,
+    then every itinerary as soon as it is priced, with the running top 5.
+    """
+    _validate_smart_multi(body)
+    _record_smart_multi(background_tasks, body)
+
+    async def events():
+        # own session: a Depends(get_session) one may be closed before the body is streamed
+        try:
+            async with async_session_maker() as session:
+                async for event, payload in stream_smart_multi(
+                    session=session, **_smart_multi_params(body), deadline=Deadline(_SMART_MULTI_DEADLINE_S)
+                ):
+                    if event == "candidates":
+                        line = {"event": event, "routes": payload}
+                    elif event == "itinerary":
+                        line = {
+                            "event": event,
+                            "itinerary": payload["itinerary"].model_dump(mode="json"),
+                            "ranking": payload["ranking"],
+                        }
+                    else:
+                        line = {"event": event, **payload.model_dump(mode="json")}
+                    yield json.dumps(line) + "\n"
+        except TimeoutError:
+            yield json.dumps({"event": "error", "status": 503, "detail": _SMART_MULTI_TIMEOUT_DETAIL}) + "\n"
+        except ValueError as exc:
+            yield json.dumps({"event": "error", "status": 404, "detail": str(exc)}) + "\n"
+        except RuntimeError as exc:
+            yield json.dumps({"event": "error", "status": 503, "detail": str(exc)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -25,7 +25,29 @@ class Settings(BaseSettings):
     # App
     app_env: str = "development"
     allowed_origins: str = "http://localhost:3000"
+    # Reference TTL (departures 2-4 weeks away); per-row TTL is adapted in db/cache_ttl.py
     cache_ttl_hours: int = 6
+    cache_ttl_min_hours: float = 1
+    cache_ttl_max_hours: float = 48
+    # In-process LRU in front of flight_cache (entries = origin/destination/date keys)
+    memory_cache_max_entries: int = 20000
+    # Format of new flight_cache rows: "jsonb", "packed" or "packed_zlib" (rows in any format stay readable)
+    cache_storage_format: str = "jsonb"
+    # flight_cache partitions (one per departure month) and expiry maintenance
+    cache_partition_months_ahead: int = 13
+    cache_maintenance_interval_minutes: int = 60
+    cache_purge_batch_size: int = 5000
+    # Monthly price_history partitions kept (older ones are dropped)
+    price_history_retention_months: int = 13
+    # Refresh-ahead of popular rows (services/prewarm.py): UTC "start-end" hours, "" disables it
+    prewarm_offpeak_hours: str = "1-6"
+    prewarm_interval_minutes: int = 30
+    prewarm_max_calls_per_cycle: int = 20
+    # Fraction of each provider's monthly limit pre-warming never spends
+    prewarm_quota_reserve: float = 0.5
+    prewarm_refresh_lead_minutes: int = 90
+    prewarm_history_days: int = 14
+    prewarm_top_airports: int = 20
     max_airports_search: int = 300
 
     class Config:
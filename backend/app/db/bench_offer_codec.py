@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: JSONB storage vs packed binary storage of cached offers.
+
+For each format it measures the stored size of one flight_cache row and the
+CPU time to encode it (save_to_cache) and to decode it back into FlightOffer
+objects (every cache read). The JSONB path is simulated as asyncpg runs it:
+json.dumps on write, json.loads + FlightOffer(**item) on read.
+
+No DB or network needed: offers are synthetic but shaped like provider data.
+
+CMD: docker compose exec backend python -m app.db.bench_offer_codec [--offers 10] [--rows 2000]
+"""
+import argparse
+import json
+import random
+import time
+from dataclasses import asdict
+
+from app.db.offer_codec import decode_offers, encode_offers
+from app.services.providers.base import FlightOffer
+
+_AIRLINES = ["Ryanair", "easyJet", "Wizz Air", "ITA Airways", "Vueling", "Lufthansa"]
+
+
+def _synthetic_row(rng: random.Random, n_offers: int) -> list[FlightOffer]:
+    return [
+        FlightOffer(
+            origin="FCO",
+            destination="CTA",
+            departure=f"2026-06-01T{rng.randint(5, 22):02d}:{rng.choice([0, 15, 30, 45]):02d}:00",
+            price_eur=round(rng.uniform(19, 250), 2),
+            airline=rng.choice(_AIRLINES),
+            direct=rng.random() < 0.7,
+            duration_minutes=rng.randint(60, 400),
+        )
+        for _ in range(n_offers)
+    ]
+
+
+def _timed(fn, rows) -> tuple[float, list]:
+    start = time.perf_counter()
+    out = [fn(r) for r in rows]
+    return (time.perf_counter() - start) * 1_000_000 / len(rows), out
+
+
+def run(n_offers: int, n_rows: int) -> None:
+    rng = random.Random(42)
+    rows = [_synthetic_row(rng, n_offers) for _ in range(n_rows)]
+
+    formats = {
+        "jsonb": (
+            lambda offers: json.dumps([asdict(o) for o in offers]).encode(),
+            lambda blob: [FlightOffer(**item) for item in json.loads(blob)],
+        ),
+        "packed": (encode_offers, decode_offers),
+        "packed_zlib": (lambda offers: encode_offers(offers, compress=True), decode_offers),
+    }
+
+    print(f"{n_rows} rows × {n_offers} offers")
+    print(f"{'format':<12} {'bytes/row':>10} {'encode µs':>10} {'decode µs':>10}")
+    for name, (encode, decode) in formats.items():
+        encode_us, blobs = _timed(encode, rows)
+        decode_us, decoded = _timed(decode, blobs)
+        assert decoded == rows, f"{name}: round trip mismatch"
+        size = sum(len(b) for b in blobs) / n_rows
+        print(f"{name:<12} {size:>10.0f} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--offers", type=int, default=10, help="offers per cache row")
+    parser.add_argument("--rows", type=int, default=2000, help="cache rows to encode/decode")
+    args = parser.parse_args()
+    run(args.offers, args.rows)
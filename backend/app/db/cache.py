@@ -4,30 +4,92 @@ Cache layer for flight results (PostgreSQL flight_cache).
 flow:
     1. get_cached()  → hit? returns (offers, fetched_at) without calling the provider
     2. save_to_cache() → after each provider call, saves the results
-    3. TTL is defined by CACHE_TTL_HOURS in the .env file (default 6h)
+    3. TTL is per row (expires_at), computed at write time by db/cache_ttl.py
+       from days to departure and the route's observed price volatility
+
+get_cached_many() / save_to_cache_many() do the same for any number of
+(origin, destination, departure_date) keys in a single query.
+missing_runs() turns the days a search found cached into the provider calls
+still needed: one per run of consecutive uncached days.
+earliest_expiry() tells when the first of a set of rows expires (derived
+results built on them, e.g. db/result_cache.py, must not outlive it).
+
+Reads go through the in-process LRU first (db/memory_cache.py); every write
+refreshes the local LRU and publishes an invalidation for the other workers.
+
+Offers are stored either as JSONB (raw_response) or in the packed binary
+format of db/offer_codec.py (raw_packed), depending on CACHE_STORAGE_FORMAT.
+offers_from_row() decodes both: every reader goes through it.
 
 The flight_cache table has a UNIQUE constraint on (origin, destination, departure_date):
 each tuple has only one record, updated in-place when the cache expires.
+It is partitioned by departure month; expired rows and past months are
+removed by db/cache_maintenance.py.
 """
+import logging
 from dataclasses import asdict
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, datetime, timezone
 
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import Date, String, and_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
+from app.db.cache_maintenance import storable_range
+from app.db.cache_ttl import ttl_for, update_volatility
+from app.db.memory_cache import CacheKey, offer_lru, publish_invalidation
+from app.db.offer_codec import decode_offers, encode_offers
+from app.db.price_history import record_prices
 from app.models.flight_cache import FlightCache
 from app.services.providers.base import FlightOffer
 
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
-def _cutoff() -> datetime:
-    """I'm using this to set the cutoff separately and having this allow to verify
-    if the FlightCache.fetched_at(see below async def get_cached ) is later of our cutoff.
-    If FlightCache.fetched_at >= _cutoff() it means that the data is still valid and usable.
+
+def is_fresh(table=FlightCache):
+    """
+    SQL condition "this flight_cache row is still valid". Every reader uses it,
+    so the per-row TTL is honoured everywhere. `table` may be an aliased FlightCache.
     """
-    delta = timedelta(hours=settings.cache_ttl_hours)
-    return (datetime.now(timezone.utc) - delta).replace(tzinfo=None)
+    return table.expires_at > _utcnow()
+
+
+def _keys_table(keys: list[CacheKey]):
+    """(origin, destination, departure_date) keys as a derived table: unnest() of three parallel arrays."""
+    return func.unnest(
+        bindparam("origins", [k[0] for k in keys], type_=ARRAY(String)),
+        bindparam("destinations", [k[1] for k in keys], type_=ARRAY(String)),
+        bindparam("departure_dates", [k[2] for k in keys], type_=ARRAY(Date)),
+    ).table_valued("origin", "destination", "departure_date").render_derived(name="wanted")
+
+
+def _join_keys(wanted):
+    return and_(
+        FlightCache.origin == wanted.c.origin,
+        FlightCache.destination == wanted.c.destination,
+        FlightCache.departure_date == wanted.c.departure_date,
+    )
+
+
+def offers_from_row(row: FlightCache) -> list[FlightOffer]:
+    """Decodes the offers of a flight_cache row, whichever format it was stored in."""
+    if row.raw_packed is not None:
+        return decode_offers(row.raw_packed)
+    return [FlightOffer(**item) for item in (row.raw_response or [])]
+
+
+def _encode_for_storage(offers: list[FlightOffer]) -> tuple[list[dict] | None, bytes | None]:
+    """(raw_response, raw_packed) for a new row, according to CACHE_STORAGE_FORMAT."""
+    storage_format = settings.cache_storage_format
+    if storage_format == "packed":
+        return None, encode_offers(offers)
+    if storage_format == "packed_zlib":
+        return None, encode_offers(offers, compress=True)
+    return [asdict(o) for o in offers], None
 
 
 ########################################################################
@@ -46,29 +108,135 @@ async def get_cached(
         (list of FlightOffer, fetched_at) if the cache is valid or
         None if doesn't exist or expired.
     """
+    key = (origin, destination, departure_date)
+    entry = offer_lru.get(key)
+    if entry is not None:
+        if entry.offers is None:
+            return None
+        return list(entry.offers), entry.fetched_at
+
     stmt = select(FlightCache).where(
         FlightCache.origin == origin,
         FlightCache.destination == destination,
         FlightCache.departure_date == departure_date,
-        FlightCache.fetched_at >= _cutoff(),
+        is_fresh(),
     )
     result = await session.execute(stmt)
     # scalar_one_or_none: returns one result or None (simple cache logic)
     row = result.scalar_one_or_none()
 
     if row is None:
+        offer_lru.put_negative(key)
         return None
 
-    offers = []
-    data = row.raw_response or []
-    for item in data:
-        offer = FlightOffer(**item)#expecting k v pair
-        offers.append(offer)
-    #Convert cached DICTs back to FlightOffer obj
+    offers = offers_from_row(row)
 
+    offer_lru.put(key, offers, row.fetched_at, row.expires_at)
     return offers, row.fetched_at
 
 
+async def get_cached_many(
+    session: AsyncSession,
+    keys: list[CacheKey] | set[CacheKey],
+) -> dict[CacheKey, tuple[list[FlightOffer], datetime]]:
+    """
+    get_cached() for many (origin, destination, departure_date) keys at once.
+
+    Keys not served by the in-process LRU are resolved in ONE query: the keys
+    are passed as three parallel arrays, unnest()-ed into a derived table and
+    joined to flight_cache. Same TTL as get_cached(); misses are remembered
+    in the LRU as negative entries.
+
+    Returns:
+        {key: (list of FlightOffer, fetched_at)} — only keys with a valid row.
+    """
+    found: dict[CacheKey, tuple[list[FlightOffer], datetime]] = {}
+    to_query: list[CacheKey] = []
+    for key in dict.fromkeys(keys):
+        entry = offer_lru.get(key)
+        if entry is None:
+            to_query.append(key)
+        elif entry.offers is not None:
+            found[key] = (list(entry.offers), entry.fetched_at)
+
+    if not to_query:
+        return found
+
+    wanted = _keys_table(to_query)
+    stmt = (
+        select(FlightCache)
+        .join(wanted, _join_keys(wanted))
+        .where(
+            is_fresh(),
+            # literal bounds let the planner prune the monthly partitions
+            FlightCache.departure_date.between(
+                min(k[2] for k in to_query), max(k[2] for k in to_query)
+            ),
+        )
+    )
+    result = await session.execute(stmt)
+
+    for row in result.scalars():
+        key = (row.origin, row.destination, row.departure_date)
+        offers = offers_from_row(row)
+        offer_lru.put(key, offers, row.fetched_at, row.expires_at)
+        found[key] = (offers, row.fetched_at)
+
+    for key in to_query:
+        if key not in found:
+            offer_lru.put_negative(key)
+    return found
+
+
+async def earliest_expiry(session: AsyncSession, keys: list[CacheKey] | set[CacheKey]) -> datetime | None:
+    """First expires_at among the valid rows of `keys` (one query), None if none is valid."""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return None
+    wanted = _keys_table(keys)
+    stmt = (
+        select(func.min(FlightCache.expires_at))
+        .select_from(FlightCache)
+        .join(wanted, _join_keys(wanted))
+        .where(
+            is_fresh(),
+            FlightCache.departure_date.between(min(k[2] for k in keys), max(k[2] for k in keys)),
+        )
+    )
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+def split_by_departure_date(
+    offers: list[FlightOffer],
+    date_list: list[date],
+) -> dict[date, list[FlightOffer]]:
+    """
+    Groups a date-range provider answer into one bucket per departure day,
+    which is the granularity of flight_cache rows. Days without offers are omitted.
+    """
+    buckets: dict[date, list[FlightOffer]] = {}
+    for single_date in date_list:
+        day_offers = [o for o in offers if o.departure.startswith(single_date.isoformat())]
+        if day_offers:
+            buckets[single_date] = day_offers
+    return buckets
+
+
+def missing_runs(date_list: list[date], cached: set[date], max_days: int = 7) -> list[tuple[date, date]]:
+    """
+    (first, last) day of each run of consecutive days of date_list not in
+    `cached`, at most max_days long (the providers' range cap): one provider
+    call each, so only the uncached days of a partly cached window are fetched.
+    """
+    runs: list[list[date]] = []
+    for day in sorted(set(date_list) - cached):
+        if runs and (day - runs[-1][-1]).days == 1 and len(runs[-1]) < max_days:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return [(run[0], run[-1]) for run in runs]
+
+
 ########################################################################
 #       TO SAVE CACHE
 ########################################################################
@@ -82,38 +250,110 @@ async def save_to_cache(
     """
     Salva i risultati in cache.
     Se esiste già un record per (origin, destination, departure_date), lo sovrascrive.
+    Le date fuori dalle partizioni mensili gestite (mesi passati o troppo lontani) non vengono salvate.
     """
-    if not offers:
+    await save_to_cache_many(session, {(origin, destination, departure_date): offers})
+
+
+async def save_to_cache_many(
+    session: AsyncSession,
+    entries: dict[CacheKey, list[FlightOffer]],
+) -> None:
+    """
+    save_to_cache() for many keys: one multi-row upsert (+ the matching
+    price_history append), one commit, one invalidation message. Empty offer lists and dates outside the managed
+    partitions are skipped, like in save_to_cache(). The history append runs
+    in a savepoint: if it fails (e.g. a missing partition) only it is lost.
+    Shares of a multi-city ticket (FlightOffer.ticket_share) are not one-way
+    fares: they are left out of both tables.
+    """
+    first_storable, end_storable = storable_range()
+    entries = {
+        key: [o for o in offers if not o.ticket_share] for key, offers in entries.items()
+        if first_storable <= key[2] < end_storable
+    }
+    entries = {key: offers for key, offers in entries.items() if offers}
+    if not entries:
         return
 
-    cheapest = min(offers, key=lambda o: o.price_eur)
-    raw = [asdict(o) for o in offers]
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    previous = await _previous_observations(session, list(entries))
 
-    stmt = (
-        insert(FlightCache)
-        .values(
-            origin=origin,
-            destination=destination,
-            departure_date=departure_date,
-            price_eur=cheapest.price_eur,
-            airline=cheapest.airline,
-            direct_flight=cheapest.direct,
-            flight_duration_minutes=cheapest.duration_minutes,
-            fetched_at=now,
-            raw_response=raw,
-        )
-        .on_conflict_do_update(
-            index_elements=["origin", "destination", "departure_date"],
-            set_={
-                "price_eur": cheapest.price_eur,
-                "airline": cheapest.airline,
-                "direct_flight": cheapest.direct,
-                "flight_duration_minutes": cheapest.duration_minutes,
-                "fetched_at": now,
-                "raw_response": raw,
-            },
-        )
+    now = _utcnow()
+    today = now.date()
+    rows: list[dict] = []
+    for key, offers in entries.items():
+        origin, destination, departure_date = key
+        cheapest = min(offers, key=lambda o: o.price_eur)
+        raw, packed = _encode_for_storage(offers)
+        previous_price, previous_volatility = previous.get(key, (None, None))
+        volatility = update_volatility(previous_volatility, previous_price, cheapest.price_eur)
+        rows.append({
+            "origin": origin,
+            "destination": destination,
+            "departure_date": departure_date,
+            "price_eur": cheapest.price_eur,
+            "airline": cheapest.airline,
+            "direct_flight": cheapest.direct,
+            "flight_duration_minutes": cheapest.duration_minutes,
+            "fetched_at": now,
+            "expires_at": now + ttl_for(departure_date, volatility, today),
+            "price_volatility": volatility,
+            "raw_response": raw,
+            "raw_packed": packed,
+        })
+
+    stmt = insert(FlightCache)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["origin", "destination", "departure_date"],
+        set_={
+            column: stmt.excluded[column]
+            for column in (
+                "price_eur", "airline", "direct_flight", "flight_duration_minutes",
+                "fetched_at", "expires_at", "price_volatility", "raw_response", "raw_packed",
+            )
+        },
     )
-    await session.execute(stmt)
+    # list of parameter sets → batched multi-row VALUES (insertmanyvalues)
+    await session.execute(stmt, rows)
+    # the overwritten prices survive in price_history (same transaction, own
+    # savepoint: a history failure must not roll back the cache write)
+    try:
+        async with session.begin_nested():
+            await record_prices(session, entries, now)
+    except Exception as exc:
+        logger.warning("Price history append failed: %s: %s", type(exc).__name__, exc)
     await session.commit()
+
+    for row, offers in zip(rows, entries.values()):
+        offer_lru.put(
+            (row["origin"], row["destination"], row["departure_date"]),
+            list(offers), now, row["expires_at"],
+        )
+    await publish_invalidation(list(entries))
+
+
+async def _previous_observations(
+    session: AsyncSession,
+    keys: list[CacheKey],
+) -> dict[CacheKey, tuple[float | None, float | None]]:
+    """
+    (cheapest price, volatility) currently stored for these keys, expired rows
+    included: they are the previous observation the volatility is learned from.
+    """
+    wanted = _keys_table(keys)
+    result = await session.execute(
+        select(
+            FlightCache.origin,
+            FlightCache.destination,
+            FlightCache.departure_date,
+            FlightCache.price_eur,
+            FlightCache.price_volatility,
+        ).join(wanted, _join_keys(wanted))
+    )
+    return {
+        (origin, destination, departure_date): (
+            float(price) if price is not None else None,
+            volatility,
+        )
+        for origin, destination, departure_date, price, volatility in result.all()
+    }
@@ -0,0 +1,249 @@
+"""
+Maintenance of the partitioned flight_cache and price_history tables.
+
+flight_cache is range-partitioned by departure_date, one partition per month
+(flight_cache_YYYYMM). A periodic task keeps it bounded:
+
+    1. ensure_partitions()       creates the partitions for the current month
+                                 and the next CACHE_PARTITION_MONTHS_AHEAD months
+    2. drop_past_partitions()    drops partitions whose month is over: O(1),
+                                 no DELETE, no dead tuples, no vacuum work
+    3. purge_expired_rows()      deletes long-expired rows (and past departure days)
+                                 inside the live partitions, in small batches
+                                 committed one by one, through idx_cache_expiry
+
+price_history (append-only, partitioned by fetched_at month) only needs
+the first two steps: ensure_history_partitions() keeps the current and next
+month ready, drop_old_history_partitions() drops months older than
+PRICE_HISTORY_RETENTION_MONTHS.
+
+partition_stats() reports row counts, dead tuples and table/index sizes per
+partition of both tables (GET /api/v1/metrics/partitions).
+
+Only one worker runs a maintenance cycle per interval: the others find the
+Redis lock taken and skip it.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.database import async_session_maker
+from app.db.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+_PARENT = "flight_cache"
+_HISTORY_PARENT = "price_history"
+_PARTITION_NAME = re.compile(r"^(\w+)_(\d{4})(\d{2})$")
+_LOCK_KEY = "flight_cache:maintenance"
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date, parent: str = _PARENT) -> str:
+    return f"{parent}_{month.year}{month.month:02d}"
+
+
+def storable_range(today: date | None = None) -> tuple[date, date]:
+    """[first, last) departure dates that have a partition once maintenance has run."""
+    current = _month_start(today or date.today())
+    return current, _add_months(current, settings.cache_partition_months_ahead + 1)
+
+
+async def _is_partitioned(session: AsyncSession, parent: str = _PARENT) -> bool:
+    """False on databases created before partitioning (see SETUP.md for the migration)."""
+    kind = await session.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": parent},
+    )
+    return kind.scalar_one_or_none() == "p"
+
+
+async def _list_partitions(session: AsyncSession, parent: str = _PARENT) -> dict[str, date]:
+    """{partition name: first day of its month}"""
+    rows = await session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name"
+    ), {"name": parent})
+    partitions: dict[str, date] = {}
+    for (name,) in rows.all():
+        match = _PARTITION_NAME.match(name)
+        if match and match[1] == parent:
+            partitions[name] = date(int(match[2]), int(match[3]), 1)
+    return partitions
+
+
+async def _ensure_monthly(session: AsyncSession, parent: str, first: date, end: date) -> list[str]:
+    """CREATE TABLE IF NOT EXISTS for every month partition in [first, end)."""
+    names: list[str] = []
+    month = first
+    while month < end:
+        name = partition_name(month, parent)
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        ))
+        names.append(name)
+        month = _add_months(month, 1)
+    return names
+
+
+async def _drop_before(session: AsyncSession, parent: str, before: date) -> list[str]:
+    dropped: list[str] = []
+    for name, month in sorted((await _list_partitions(session, parent)).items()):
+        if month < before:
+            await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+async def ensure_partitions(session: AsyncSession, today: date | None = None) -> list[str]:
+    """
+    Creates the monthly partitions of the storable range (idempotent, no commit).
+
+    Returns:
+        names of the partitions of the range (created now or already present),
+        [] if flight_cache is not partitioned yet.
+    """
+    if not await _is_partitioned(session):
+        logger.warning("flight_cache is not partitioned: maintenance disabled until migrated (see SETUP.md)")
+        return []
+
+    first, end = storable_range(today)
+    return await _ensure_monthly(session, _PARENT, first, end)
+
+
+async def drop_past_partitions(session: AsyncSession, today: date | None = None) -> list[str]:
+    """Drops the partitions of months already over (no commit). Returns their names."""
+    return await _drop_before(session, _PARENT, _month_start(today or date.today()))
+
+
+async def ensure_history_partitions(session: AsyncSession, today: date | None = None) -> list[str]:
+    """price_history partitions for the current and the next fetched_at month (no commit)."""
+    current = _month_start(today or date.today())
+    return await _ensure_monthly(session, _HISTORY_PARENT, current, _add_months(current, 2))
+
+
+async def drop_old_history_partitions(session: AsyncSession, today: date | None = None) -> list[str]:
+    """Drops price_history months older than PRICE_HISTORY_RETENTION_MONTHS (no commit)."""
+    current = _month_start(today or date.today())
+    before = _add_months(current, -settings.price_history_retention_months)
+    return await _drop_before(session, _HISTORY_PARENT, before)
+
+
+async def purge_expired_rows(session: AsyncSession, today: date | None = None) -> int:
+    """
+    Deletes rows no reader can use any more: expired for more than
+    CACHE_TTL_MAX_HOURS (recently expired rows are kept: their price is the
+    previous observation the route volatility is learned from), or departure
+    day already gone. One partition at a time, in batches of
+    CACHE_PURGE_BATCH_SIZE rows, each batch committed on its own so locks
+    and WAL bursts stay short and autovacuum can keep up.
+
+    Returns:
+        number of deleted rows.
+    """
+    today = today or date.today()
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=settings.cache_ttl_max_hours)).replace(tzinfo=None)
+    batch = settings.cache_purge_batch_size
+    deleted = 0
+
+    for name in sorted(await _list_partitions(session, _PARENT)):
+        while True:
+            result = await session.execute(text(
+                f"DELETE FROM {name} WHERE ctid = ANY(ARRAY("
+                f"SELECT ctid FROM {name} WHERE expires_at < :cutoff OR departure_date < :today LIMIT :batch))"
+            ), {"cutoff": cutoff, "today": today, "batch": batch})
+            await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch:
+                break
+            await asyncio.sleep(0)
+    return deleted
+
+
+async def partition_stats(session: AsyncSession) -> list[dict]:
+    """Row counts, dead tuples and sizes per partition of both tables, oldest month first."""
+    rows = await session.execute(text(
+        "SELECT p.relname, c.relname, s.n_live_tup, s.n_dead_tup, "
+        "pg_table_size(c.oid), pg_indexes_size(c.oid), s.last_vacuum, s.last_autovacuum "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid "
+        "WHERE p.relname IN (:cache, :history) "
+        "ORDER BY p.relname, c.relname"
+    ), {"cache": _PARENT, "history": _HISTORY_PARENT})
+
+    stats: list[dict] = []
+    for parent, name, live, dead, table_bytes, index_bytes, last_vacuum, last_autovacuum in rows.all():
+        live, dead = live or 0, dead or 0
+        stats.append({
+            "table": parent,
+            "partition": name,
+            "live_rows": live,
+            "dead_rows": dead,
+            "dead_ratio": round(dead / (live + dead), 4) if live + dead else 0.0,
+            "table_bytes": table_bytes,
+            "index_bytes": index_bytes,
+            "last_vacuum": last_vacuum or last_autovacuum,
+        })
+    return stats
+
+
+async def run_maintenance(session: AsyncSession, today: date | None = None) -> dict:
+    """One full maintenance cycle. Logs and returns a summary."""
+    t0 = time.perf_counter()
+    await ensure_history_partitions(session, today)
+    history_dropped = await drop_old_history_partitions(session, today)
+    await session.commit()
+
+    ensured = await ensure_partitions(session, today)
+    if not ensured:
+        return {"skipped": "not_partitioned", "history_dropped": history_dropped}
+    dropped = await drop_past_partitions(session, today)
+    await session.commit()
+    purged = await purge_expired_rows(session, today)
+
+    summary = {
+        "event": "flight_cache_maintenance",
+        "partitions": len(ensured),
+        "dropped": dropped,
+        "purged_rows": purged,
+        "history_dropped": history_dropped,
+        "duration_ms": round((time.perf_counter() - t0) * 1000),
+    }
+    logger.info(json.dumps(summary))
+    return summary
+
+
+async def run_maintenance_loop() -> None:
+    """Long-running task started in the FastAPI lifespan: one cycle per interval, one worker at a time."""
+    interval = settings.cache_maintenance_interval_minutes * 60
+    while True:
+        try:
+            redis = await get_redis()
+            if await redis.set(_LOCK_KEY, "1", nx=True, ex=interval):
+                async with async_session_maker() as session:
+                    await run_maintenance(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("flight_cache maintenance failed: %s: %s", type(exc).__name__, exc)
+        await asyncio.sleep(interval)
@@ -0,0 +1,242 @@
+"""
+Export / restore of flight_cache snapshots.
+
+After a DB rebuild, or on a fresh staging environment, the cache starts
+empty and refilling it burns provider quota. A snapshot carries it over:
+
+    export  → server-side cursor over flight_cache, streamed to a
+              gzip-compressed NDJSON file (one row per line, header line first)
+    restore → the file is read line by line; chunks of _CHUNK_ROWS rows are
+              COPY-ed (binary) into a temporary staging table and upserted
+              into flight_cache from there. A row never overwrites a more
+              recent one already in the table.
+
+Neither direction holds more than one chunk in memory, so tens of millions
+of rows are fine. Both accept the same filters: departure date range and
+destinations. Expired rows are skipped unless --include-expired is given.
+
+raw_response travels as JSON text (no decode/encode on either side),
+raw_packed as base64.
+
+CMD: docker compose exec backend python -m app.db.cache_snapshot export /tmp/cache.ndjson.gz \
+         [--from 2026-11-01] [--to 2026-12-31] [--destination CTA,FCO] [--include-expired]
+     docker compose exec backend python -m app.db.cache_snapshot restore /tmp/cache.ndjson.gz [same filters]
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import Text, cast, select
+
+from app.db.cache_maintenance import storable_range
+from app.db.database import engine
+from app.models.flight_cache import FlightCache
+
+SNAPSHOT_FORMAT = "hopcraft-flight-cache"
+SNAPSHOT_VERSION = 1
+
+_CHUNK_ROWS = 10_000
+_STAGING = "flight_cache_restore"
+
+# Order of the staging table columns (COPY records are tuples in this order)
+_COLUMNS = [
+    "origin", "destination", "departure_date", "price_eur", "airline", "direct_flight",
+    "flight_duration_minutes", "fetched_at", "expires_at", "price_volatility",
+    "raw_response", "raw_packed",
+]
+
+_CREATE_STAGING = f"""
+CREATE TEMP TABLE IF NOT EXISTS {_STAGING} (
+    origin text, destination text, departure_date date, price_eur numeric,
+    airline text, direct_flight boolean, flight_duration_minutes integer,
+    fetched_at timestamp, expires_at timestamp, price_volatility float8,
+    raw_response text, raw_packed bytea
+) ON COMMIT DELETE ROWS
+"""
+
+# Keeps the most recent observation when the key already exists
+_UPSERT_FROM_STAGING = f"""
+INSERT INTO flight_cache ({", ".join(_COLUMNS)})
+SELECT {", ".join(c if c != "raw_response" else "raw_response::jsonb" for c in _COLUMNS)}
+FROM {_STAGING}
+ON CONFLICT (origin, destination, departure_date) DO UPDATE SET
+    {", ".join(f"{c} = EXCLUDED.{c}" for c in _COLUMNS[3:])}
+WHERE flight_cache.fetched_at < EXCLUDED.fetched_at
+"""
+
+
+@dataclass
+class SnapshotFilter:
+    date_from: date | None = None
+    date_to: date | None = None
+    destinations: set[str] | None = None
+    include_expired: bool = False
+
+    def matches(self, departure_date: date, destination: str, expires_at: datetime, now: datetime) -> bool:
+        if self.date_from and departure_date < self.date_from:
+            return False
+        if self.date_to and departure_date > self.date_to:
+            return False
+        if self.destinations and destination not in self.destinations:
+            return False
+        return self.include_expired or expires_at > now
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+########################################################################
+#       EXPORT
+########################################################################
+def _row_to_line(row) -> str:
+    return json.dumps({
+        "origin": row.origin,
+        "destination": row.destination,
+        "departure_date": row.departure_date.isoformat(),
+        "price_eur": str(row.price_eur) if row.price_eur is not None else None,
+        "airline": row.airline,
+        "direct_flight": row.direct_flight,
+        "flight_duration_minutes": row.flight_duration_minutes,
+        "fetched_at": row.fetched_at.isoformat(),
+        "expires_at": row.expires_at.isoformat(),
+        "price_volatility": row.price_volatility,
+        "raw_response": row.raw_response,
+        "raw_packed": base64.b64encode(row.raw_packed).decode() if row.raw_packed is not None else None,
+    }, separators=(",", ":"))
+
+
+def _export_query(flt: SnapshotFilter):
+    columns = [getattr(FlightCache, c) for c in _COLUMNS if c != "raw_response"]
+    # JSON text as stored: no decode into Python objects and re-encode
+    stmt = select(*columns, cast(FlightCache.raw_response, Text).label("raw_response"))
+    if flt.date_from:
+        stmt = stmt.where(FlightCache.departure_date >= flt.date_from)
+    if flt.date_to:
+        stmt = stmt.where(FlightCache.departure_date <= flt.date_to)
+    if flt.destinations:
+        stmt = stmt.where(FlightCache.destination.in_(flt.destinations))
+    if not flt.include_expired:
+        stmt = stmt.where(FlightCache.expires_at > _utcnow())
+    return stmt
+
+
+async def export_snapshot(path: str, flt: SnapshotFilter) -> int:
+    """Streams the matching flight_cache rows to `path` (gzip NDJSON). Returns the row count."""
+    exported = 0
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        out.write(json.dumps({
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "exported_at": _utcnow().isoformat(),
+        }) + "\n")
+        async with engine.connect() as conn:
+            # stream() → server-side cursor, rows arrive _CHUNK_ROWS at a time
+            result = await conn.stream(_export_query(flt).execution_options(yield_per=_CHUNK_ROWS))
+            async for rows in result.partitions():
+                out.writelines(_row_to_line(row) + "\n" for row in rows)
+                exported += len(rows)
+                print(f"  exported {exported} rows...")
+    return exported
+
+
+########################################################################
+#       RESTORE
+########################################################################
+def _line_to_record(line: str) -> tuple:
+    """NDJSON line → tuple in _COLUMNS order, typed for the binary COPY."""
+    item = json.loads(line)
+    return (
+        item["origin"],
+        item["destination"],
+        date.fromisoformat(item["departure_date"]),
+        Decimal(item["price_eur"]) if item["price_eur"] is not None else None,
+        item["airline"],
+        item["direct_flight"],
+        item["flight_duration_minutes"],
+        datetime.fromisoformat(item["fetched_at"]),
+        datetime.fromisoformat(item["expires_at"]),
+        item["price_volatility"],
+        item["raw_response"],
+        base64.b64decode(item["raw_packed"]) if item["raw_packed"] is not None else None,
+    )
+
+
+def read_snapshot(path: str, flt: SnapshotFilter):
+    """
+    Yields lists of at most _CHUNK_ROWS records passing the filter.
+    Departure dates without a flight_cache partition are dropped.
+
+    Raises:
+        ValueError: the file is not a flight cache snapshot of a known version.
+    """
+    first_storable, end_storable = storable_range()
+    now = _utcnow()
+    with gzip.open(path, "rt", encoding="utf-8") as src:
+        header = json.loads(src.readline() or "{}")
+        if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a flight cache snapshot (v{SNAPSHOT_VERSION})")
+
+        chunk: list[tuple] = []
+        for line in src:
+            record = _line_to_record(line)
+            departure_date, destination, expires_at = record[2], record[1], record[8]
+            if not first_storable <= departure_date < end_storable:
+                continue
+            if not flt.matches(departure_date, destination, expires_at, now):
+                continue
+            chunk.append(record)
+            if len(chunk) >= _CHUNK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+async def restore_snapshot(path: str, flt: SnapshotFilter) -> int:
+    """COPY-loads the snapshot into flight_cache, chunk by chunk. Returns the rows read."""
+    restored = 0
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection      # asyncpg connection: COPY is not exposed by SQLAlchemy
+        await pg.execute(_CREATE_STAGING)
+        for chunk in read_snapshot(path, flt):
+            async with pg.transaction():
+                await pg.copy_records_to_table(_STAGING, records=chunk, columns=_COLUMNS)
+                await pg.execute(_UPSERT_FROM_STAGING)
+            restored += len(chunk)
+            print(f"  restored {restored} rows...")
+    return restored
+
+
+def _parse_args(argv: list[str] | None = None) -> tuple[argparse.Namespace, SnapshotFilter]:
+    parser = argparse.ArgumentParser(description="Export / restore flight_cache snapshots")
+    parser.add_argument("command", choices=["export", "restore"])
+    parser.add_argument("path", help="snapshot file (.ndjson.gz)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="min departure date")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="max departure date")
+    parser.add_argument("--destination", help="comma-separated IATA codes")
+    parser.add_argument("--include-expired", action="store_true", help="also carry expired rows")
+    args = parser.parse_args(argv)
+    destinations = {d.strip().upper() for d in args.destination.split(",")} if args.destination else None
+    return args, SnapshotFilter(args.date_from, args.date_to, destinations, args.include_expired)
+
+
+async def main(argv: list[str] | None = None) -> None:
+    args, flt = _parse_args(argv)
+    if args.command == "export":
+        n = await export_snapshot(args.path, flt)
+        print(f"Export complete: {n} rows written to {args.path}.")
+    else:
+        n = await restore_snapshot(args.path, flt)
+        print(f"Restore complete: {n} rows loaded from {args.path}.")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+Per-row TTL of flight_cache.
+
+A single global TTL is too long for next week's flights (prices move every
+hour) and too short for flights three months out (prices barely move). Each
+row gets its own expires_at, computed when it is written from:
+
+  1. days to departure — a step curve, expressed as multiples of
+     CACHE_TTL_HOURS (the reference TTL for departures 2-4 weeks away):
+
+         ≤ 3 days  ×0.25     ≤ 7 days  ×0.5     ≤ 30 days ×1
+         ≤ 90 days ×2        beyond    ×4
+
+  2. observed volatility of the route — exponentially weighted average of
+     the relative change of the cheapest price between successive refreshes
+     (flight_cache.price_volatility). Stable routes stretch the TTL up to
+     ×1.5, routes moving ~20% per refresh shrink it to ×0.5. Unknown
+     volatility (first fetch) leaves it unchanged.
+
+The result is clamped to [CACHE_TTL_MIN_HOURS, CACHE_TTL_MAX_HOURS].
+"""
+from datetime import date, timedelta
+
+from app.config import settings
+
+# (max days to departure, multiplier of CACHE_TTL_HOURS)
+_HORIZON_STEPS: list[tuple[int, float]] = [(3, 0.25), (7, 0.5), (30, 1.0), (90, 2.0)]
+_FAR_FUTURE_FACTOR = 4.0
+
+# Weight of the newest observation in the volatility average
+_VOLATILITY_ALPHA = 0.3
+
+
+def _horizon_factor(days_to_departure: int) -> float:
+    for max_days, factor in _HORIZON_STEPS:
+        if days_to_departure <= max_days:
+            return factor
+    return _FAR_FUTURE_FACTOR
+
+
+def _volatility_factor(volatility: float | None) -> float:
+    if volatility is None:
+        return 1.0
+    return max(0.5, min(1.5, 1.5 - 5 * volatility))
+
+
+def ttl_for(departure_date: date, volatility: float | None, today: date | None = None) -> timedelta:
+    """TTL of a row written now for this departure date and route volatility."""
+    days = (departure_date - (today or date.today())).days
+    hours = settings.cache_ttl_hours * _horizon_factor(days) * _volatility_factor(volatility)
+    hours = max(settings.cache_ttl_min_hours, min(settings.cache_ttl_max_hours, hours))
+    return timedelta(hours=hours)
+
+
+def update_volatility(
+    previous_volatility: float | None,
+    previous_price: float | None,
+    new_price: float,
+) -> float | None:
+    """
+    Folds one refresh into the route volatility.
+
+    Returns:
+        the new average, or None while there is no previous price to compare to.
+    """
+    if not previous_price:
+        return previous_volatility
+    change = abs(new_price - previous_price) / previous_price
+    if previous_volatility is None:
+        return round(change, 4)
+    return round(_VOLATILITY_ALPHA * change + (1 - _VOLATILITY_ALPHA) * previous_volatility, 4)
@@ -0,0 +1,219 @@
+"""
+In-process LRU of decoded flight offers — first cache tier, in front of flight_cache.
+
+Every Postgres cache read costs a round trip plus JSONB decoding into
+FlightOffer objects. Hot routes are served from this LRU instead:
+
+    key   → (origin, destination, departure_date)
+    value → decoded list[FlightOffer] (or None = "no valid row in the DB"),
+            fetched_at, expires_at
+
+Rules:
+  - entries expire at the same instant as the DB row (its per-row expires_at),
+    so the LRU never serves data the DB would consider stale
+  - size is bounded by MEMORY_CACHE_MAX_ENTRIES (least recently used evicted);
+    the memory it takes is approximated as _APPROX_OFFER_BYTES per offer held
+  - "scan markers" remember that every valid row for (destination, date) is
+    in memory: reverse_search can then skip the DB query for that date
+  - cross-worker consistency: every cache write publishes its keys on the Redis
+    channel INVALIDATION_CHANNEL; the other workers drop those keys
+    (run_invalidation_listener, started in the FastAPI lifespan)
+
+Hit ratio and memory usage are exposed via stats() → GET /api/v1/metrics/cache.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from app.config import settings
+from app.db.redis import get_redis
+from app.services.providers.base import FlightOffer
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[str, str, date]
+
+INVALIDATION_CHANNEL = "flight_cache:invalidate"
+
+# "Row not in the DB" entries are short-lived: they only absorb bursts of
+# identical misses, the pub/sub message covers the normal case.
+_NEGATIVE_TTL = timedelta(minutes=5)
+
+# Identifies this worker on the invalidation channel (own messages are ignored)
+_WORKER_ID = uuid.uuid4().hex
+
+# Rough footprint of one decoded FlightOffer (instance, its __dict__, the
+# departure string and the price float; IATA codes and airlines mostly shared).
+# A constant keeps put() cheap on the read path and unable to fail.
+_APPROX_OFFER_BYTES = 450
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class CachedOffers:
+    offers: list[FlightOffer] | None
+    fetched_at: datetime | None
+    expires_at: datetime
+    # approximate memory footprint of the offers
+    size_bytes: int = 0
+
+
+class OfferLRU:
+    """Size-bounded LRU of decoded offers with per-entry expiry."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, CachedOffers] = OrderedDict()
+        # (destination, date) → origins whose valid rows are all in _entries
+        self._scans: dict[tuple[str, date], set[str]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: CacheKey) -> CachedOffers | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= _utcnow():
+            self._pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        key: CacheKey,
+        offers: list[FlightOffer] | None,
+        fetched_at: datetime | None,
+        expires_at: datetime,
+    ) -> None:
+        """Stores an entry; already expired data is ignored."""
+        if expires_at <= _utcnow():
+            return
+        self._pop(key)
+        size = len(offers) * _APPROX_OFFER_BYTES if offers else 0
+        self._entries[key] = CachedOffers(offers, fetched_at, expires_at, size)
+        self._bytes += size
+        origin, destination, day = key
+        scan = self._scans.get((destination, day))
+        if scan is not None and offers:
+            scan.add(origin)
+        while len(self._entries) > self.max_entries:
+            evicted, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size_bytes
+            self.evictions += 1
+            self._scans.pop((evicted[1], evicted[2]), None)
+
+    def _pop(self, key: CacheKey) -> CachedOffers | None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size_bytes
+        return entry
+
+    def put_negative(self, key: CacheKey) -> None:
+        self.put(key, None, None, _utcnow() + _NEGATIVE_TTL)
+
+    def invalidate(self, key: CacheKey) -> None:
+        if self._pop(key) is not None:
+            self.invalidations += 1
+        self._scans.pop((key[1], key[2]), None)
+
+    def mark_scanned(self, destination: str, day: date, origins: set[str]) -> None:
+        """
+        Records that all valid rows for (destination, day) are now in memory.
+        Skipped if some of them did not fit (evicted or already expired).
+        """
+        if all((o, destination, day) in self._entries for o in origins):
+            self._scans[(destination, day)] = set(origins)
+
+    def scanned_origins(self, destination: str, day: date) -> set[str] | None:
+        """Origins with valid rows for (destination, day), or None if never scanned."""
+        return self._scans.get((destination, day))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._scans.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "offers_in_memory": sum(len(e.offers or []) for e in self._entries.values()),
+            "approx_bytes": self._bytes,
+            "scan_markers": len(self._scans),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Global instance used by the cache layer and the search engines
+offer_lru = OfferLRU(settings.memory_cache_max_entries)
+
+
+########################################################################
+#       CROSS-WORKER INVALIDATION (Redis pub/sub)
+########################################################################
+async def publish_invalidation(keys: list[CacheKey]) -> None:
+    """Tells the other workers that these rows were rewritten. Never raises."""
+    if not keys:
+        return
+    payload = json.dumps({
+        "sender": _WORKER_ID,
+        "keys": [[o, d, day.isoformat()] for o, d, day in keys],
+    })
+    try:
+        redis = await get_redis()
+        await redis.publish(INVALIDATION_CHANNEL, payload)
+    except Exception as exc:
+        logger.warning("Cache invalidation publish failed: %s: %s", type(exc).__name__, exc)
+
+
+def _apply_invalidation(raw: str) -> None:
+    payload = json.loads(raw)
+    if payload.get("sender") == _WORKER_ID:
+        return
+    for origin, destination, day in payload.get("keys", []):
+        offer_lru.invalidate((origin, destination, date.fromisoformat(day)))
+
+
+async def run_invalidation_listener() -> None:
+    """
+    Long-running task: applies invalidations published by the other workers.
+
+    While disconnected, messages are lost: the LRU is cleared on every
+    reconnect so no stale entry survives a Redis outage.
+    """
+    while True:
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        _apply_invalidation(message["data"])
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Cache invalidation listener error: %s: %s — reconnecting", type(exc).__name__, exc)
+            offer_lru.clear()
+            await asyncio.sleep(5)
@@ -0,0 +1,167 @@
+"""
+Compact binary encoding of cached FlightOffer lists (flight_cache.raw_packed).
+
+The JSONB format repeats every key name and stores departures as ISO strings;
+reading it means JSON parsing plus dict → dataclass conversion. The packed
+format stores the same data in fixed-size structs:
+
+    header   "HC" | version (u8) | flags (u8)          flags bit0 = body zlib-compressed
+    body     string table: count (u16), then length (u16) + UTF-8 bytes per string
+             offers:       count (u16), then one _OFFER struct per offer
+
+    _OFFER   origin idx (u16) | destination idx (u16) | departure, epoch minutes (i32)
+             | price in cents (u32) | airline idx (u16) | bits (u8) | duration (u16)
+             | raw departure idx (u16)
+
+IATA codes and airline names are interned in the string table, so a list of
+50 offers from the same route stores "FCO", "CTA" and "Ryanair" once.
+
+Departures in the providers' usual "YYYY-MM-DDTHH:MM[:SS]" form are stored as
+epoch minutes (bit1 of `bits` remembers the short form without seconds). Any
+other shape (timezone offsets, seconds ≠ 0, empty string) is kept verbatim in
+the string table, so decoding always returns the original string.
+Prices are stored to the cent.
+
+Zstandard is not part of the standard library: compression uses zlib, which
+only pays off on long offer lists (see bench_offer_codec.py).
+"""
+import struct
+import zlib
+from datetime import date
+
+from app.services.providers.base import FlightOffer
+
+FORMAT_VERSION = 1
+
+_MAGIC = b"HC"
+_HEADER = struct.Struct("<2sBB")
+_COUNT = struct.Struct("<H")
+_OFFER = struct.Struct("<HHiIHBHH")
+
+_FLAG_ZLIB = 0x01
+_BIT_DIRECT = 0x01
+_BIT_SHORT_TIME = 0x02
+
+_NO_MINUTES = -(2 ** 31)
+_NO_STRING = 0xFFFF
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _departure_to_minutes(departure: str) -> tuple[int, bool] | None:
+    """Epoch minutes + "no seconds" flag, or None if the string can't be rebuilt exactly."""
+    # Hand-rolled instead of strptime: this runs once per offer on every write
+    if len(departure) not in (16, 19) or departure[10] != "T" or departure[13] != ":":
+        return None
+    if len(departure) == 19 and departure[16:] != ":00":
+        return None
+    hh, mm = departure[11:13], departure[14:16]
+    if not (hh.isdigit() and mm.isdigit()):
+        return None
+    try:
+        day = date.fromisoformat(departure[:10])
+    except ValueError:
+        return None
+    hours, minutes = int(hh), int(mm)
+    if hours > 23 or minutes > 59 or day.isoformat() != departure[:10]:
+        return None
+    return (day.toordinal() - _EPOCH_ORDINAL) * 1440 + hours * 60 + minutes, len(departure) == 16
+
+
+def encode_offers(offers: list[FlightOffer], compress: bool = False) -> bytes:
+    """Packs a list of offers into the versioned binary format."""
+    strings: list[str] = []
+    index: dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    packed_offers: list[bytes] = []
+    for o in offers:
+        bits = _BIT_DIRECT if o.direct else 0
+        as_minutes = _departure_to_minutes(o.departure)
+        if as_minutes is None:
+            minutes, raw_idx = _NO_MINUTES, intern(o.departure)
+        else:
+            minutes, short = as_minutes
+            raw_idx = _NO_STRING
+            if short:
+                bits |= _BIT_SHORT_TIME
+        packed_offers.append(_OFFER.pack(
+            intern(o.origin),
+            intern(o.destination),
+            minutes,
+            round(o.price_eur * 100),
+            intern(o.airline),
+            bits,
+            o.duration_minutes,
+            raw_idx,
+        ))
+
+    body = bytearray(_COUNT.pack(len(strings)))
+    for value in strings:
+        encoded = value.encode("utf-8")
+        body += _COUNT.pack(len(encoded)) + encoded
+    body += _COUNT.pack(len(packed_offers))
+    for chunk in packed_offers:
+        body += chunk
+
+    flags = 0
+    payload = bytes(body)
+    if compress:
+        flags |= _FLAG_ZLIB
+        payload = zlib.compress(payload)
+    return _HEADER.pack(_MAGIC, FORMAT_VERSION, flags) + payload
+
+
+def decode_offers(blob: bytes) -> list[FlightOffer]:
+    """
+    Unpacks a blob produced by encode_offers().
+
+    Raises:
+        ValueError: unknown magic or unsupported version.
+    """
+    magic, version, flags = _HEADER.unpack_from(blob, 0)
+    if magic != _MAGIC:
+        raise ValueError("Not a packed offer blob")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed offer version {version}")
+
+    body = bytes(blob[_HEADER.size:])
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    (n_strings,) = _COUNT.unpack_from(body, 0)
+    pos = _COUNT.size
+    strings: list[str] = []
+    for _ in range(n_strings):
+        (length,) = _COUNT.unpack_from(body, pos)
+        pos += _COUNT.size
+        strings.append(body[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    (n_offers,) = _COUNT.unpack_from(body, pos)
+    pos += _COUNT.size
+    # Offers of one row share a handful of departure days: format each day once
+    days: dict[int, str] = {}
+    offers: list[FlightOffer] = []
+    for origin, destination, minutes, cents, airline, bits, duration, raw_idx in _OFFER.iter_unpack(
+        body[pos:pos + n_offers * _OFFER.size]
+    ):
+        if minutes == _NO_MINUTES:
+            departure = strings[raw_idx]
+        else:
+            day_number, minute_of_day = divmod(minutes, 1440)
+            day = days.get(day_number)
+            if day is None:
+                day = days[day_number] = date.fromordinal(day_number + _EPOCH_ORDINAL).isoformat()
+            hours, mins = divmod(minute_of_day, 60)
+            departure = f"{day}T{hours:02d}:{mins:02d}" if bits & _BIT_SHORT_TIME else f"{day}T{hours:02d}:{mins:02d}:00"
+        # positional: same field order as the FlightOffer dataclass, cheaper than kwargs
+        offers.append(FlightOffer(
+            strings[origin], strings[destination], departure, cents / 100,
+            strings[airline], bool(bits & _BIT_DIRECT), duration,
+        ))
+    return offers
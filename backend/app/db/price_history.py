@@ -0,0 +1,160 @@
+"""
+Append-only price history (price_history table).
+
+flight_cache keeps only the latest observation of each route/date: every
+refresh overwrites the row. price_history keeps them all, compactly:
+
+    origin, destination, departure_date, fetched_at, min_price_eur, airline, sample_count
+
+Write path: save_to_cache_many() calls record_prices() with the same batch
+it upserts, in the same transaction — one extra multi-row INSERT, no extra
+commit. It runs in a savepoint: a failed append is logged and dropped, the
+cache write goes through. The table has a single index and is never updated, so inserts stay
+cheap; partitions (by fetched_at month) are created ahead of time and old
+months dropped by db/cache_maintenance.py.
+
+Read helpers:
+    price_trend()   → daily min/avg of the observed cheapest price
+    cheapest_seen() → lowest price ever observed for a route (optionally per date)
+    cheapest_seen_many() → the same for many routes at once, price only (one query)
+"""
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import Date, cast, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.memory_cache import CacheKey
+from app.models.flight_cache import PriceHistory
+from app.services.providers.base import FlightOffer
+
+
+async def record_prices(
+    session: AsyncSession,
+    entries: dict[CacheKey, list[FlightOffer]],
+    fetched_at: datetime,
+) -> None:
+    """Appends one observation per key (no commit: the caller commits with the cache upsert)."""
+    rows = []
+    for (origin, destination, departure_date), offers in entries.items():
+        cheapest = min(offers, key=lambda o: o.price_eur)
+        rows.append({
+            "origin": origin,
+            "destination": destination,
+            "departure_date": departure_date,
+            "fetched_at": fetched_at,
+            "min_price_eur": cheapest.price_eur,
+            "airline": cheapest.airline,
+            "sample_count": min(len(offers), 32767),
+        })
+    if rows:
+        await session.execute(insert(PriceHistory), rows)
+
+
+def _route_filter(origin: str, destination: str, departure_date: date | None, days: int | None) -> list:
+    conditions = [PriceHistory.origin == origin, PriceHistory.destination == destination]
+    if departure_date is not None:
+        conditions.append(PriceHistory.departure_date == departure_date)
+    if days is not None:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+        # also prunes the fetched_at partitions outside the window
+        conditions.append(PriceHistory.fetched_at >= since)
+    return conditions
+
+
+async def price_trend(
+    session: AsyncSession,
+    origin: str,
+    destination: str,
+    departure_date: date | None = None,
+    days: int = 30,
+) -> list[dict]:
+    """
+    Daily evolution of the cheapest observed price over the last `days` days.
+
+    Args:
+        departure_date: a single flight date, or None for the whole route
+
+    Returns:
+        [{"day", "min_price_eur", "avg_price_eur", "observations"}], oldest day first.
+    """
+    day = cast(func.date_trunc("day", PriceHistory.fetched_at), Date).label("day")
+    stmt = (
+        select(
+            day,
+            func.min(PriceHistory.min_price_eur),
+            func.avg(PriceHistory.min_price_eur),
+            func.count(),
+        )
+        .where(*_route_filter(origin, destination, departure_date, days))
+        .group_by(day)
+        .order_by(day)
+    )
+    rows = (await session.execute(stmt)).all()
+    return [
+        {
+            "day": d,
+            "min_price_eur": float(min_price),
+            "avg_price_eur": round(float(avg_price), 2),
+            "observations": n,
+        }
+        for d, min_price, avg_price, n in rows
+    ]
+
+
+async def cheapest_seen(
+    session: AsyncSession,
+    origin: str,
+    destination: str,
+    departure_date: date | None = None,
+    days: int | None = None,
+) -> dict | None:
+    """
+    Lowest price ever observed for the route (or one of its dates), within
+    the last `days` days if given. Ties go to the most recent observation.
+
+    Returns:
+        {"price_eur", "airline", "departure_date", "fetched_at"} or None if never observed.
+    """
+    stmt = (
+        select(PriceHistory)
+        .where(*_route_filter(origin, destination, departure_date, days))
+        .order_by(PriceHistory.min_price_eur, PriceHistory.fetched_at.desc())
+        .limit(1)
+    )
+    row = (await session.execute(stmt)).scalar_one_or_none()
+    if row is None:
+        return None
+    return {
+        "price_eur": float(row.min_price_eur),
+        "airline": row.airline,
+        "departure_date": row.departure_date,
+        "fetched_at": row.fetched_at,
+    }
+
+
+async def cheapest_seen_many(
+    session: AsyncSession,
+    pairs: list[tuple[str, str]],
+    days: int | None = None,
+) -> dict[tuple[str, str], float]:
+    """
+    Lowest price observed for each (origin, destination) pair, any departure
+    date, within the last `days` days if given — one grouped query.
+
+    Returns:
+        {(origin, destination): price_eur}; pairs never observed are absent.
+    """
+    if not pairs:
+        return {}
+    conditions = [tuple_(PriceHistory.origin, PriceHistory.destination).in_(pairs)]
+    if days is not None:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+        conditions.append(PriceHistory.fetched_at >= since)
+    stmt = (
+        select(PriceHistory.origin, PriceHistory.destination, func.min(PriceHistory.min_price_eur))
+        .where(*conditions)
+        .group_by(PriceHistory.origin, PriceHistory.destination)
+    )
+    rows = (await session.execute(stmt)).all()
+    return {(o, d): float(price) for o, d, price in rows}
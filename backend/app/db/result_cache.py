@@ -0,0 +1,102 @@
+"""
+Result cache of Smart Multi-City searches (Redis).
+
+The LLM call and the pricing of a dozen routes take 5-45 s, and popular
+searches repeat: same origin, duration and month, with a slightly different
+budget or number of travelers. Their priced itineraries are kept in Redis:
+
+    key     smart_multi:result:{origin}:{days}:{date_from}:{date_to}:{direct}:{engine}:{flex}
+            (engine and flex_days change the candidate routes, so they are part of it)
+    value   JSON: the budget the search ran with and every itinerary priced
+            within it (route, AI notes, offers, total per person), cheapest first
+    TTL     until the first flight_cache row behind those offers expires
+            (db/cache.earliest_expiry): the entry never outlives its prices
+
+Budget and travelers are not part of the key. A request with a budget up to
+the stored one is answered from the entry: itineraries above its budget are
+filtered out and the totals re-scaled to its travelers. That is exact, as the
+entry holds every route within the stored budget except those pruned for
+ranking below a 5th best that is itself within it. A higher budget is a miss:
+the pipeline runs again and stores the larger entry.
+
+Partial results (deadline hit during pricing) are never stored. Redis
+errors only cost a log line: the search then runs normally.
+"""
+import json
+import logging
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
+
+from app.db.redis import get_redis
+from app.services.llm.base import SuggestedItinerary
+from app.services.providers.base import FlightOffer
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "smart_multi:result"
+
+
+@dataclass
+class CachedItinerary:
+    suggested: SuggestedItinerary
+    offers: list[FlightOffer]
+    total_per_person: float
+
+
+@dataclass
+class CachedResult:
+    # complete for any budget up to this one
+    budget_per_person_eur: float
+    # every itinerary priced within that budget, cheapest first
+    itineraries: list[CachedItinerary]
+
+
+def result_key(
+    origin: str,
+    trip_duration_days: int,
+    date_from: date,
+    date_to: date,
+    direct_only: bool,
+    engine: str,
+    flex_days: int,
+) -> str:
+    return (
+        f"{_KEY_PREFIX}:{origin.upper()}:{trip_duration_days}:{date_from.isoformat()}:"
+        f"{date_to.isoformat()}:{int(direct_only)}:{engine}:{flex_days}"
+    )
+
+
+async def get_result(key: str) -> CachedResult | None:
+    """The stored entry, or None (missing, expired, unreadable or Redis down)."""
+    try:
+        redis = await get_redis()
+        raw = await redis.get(key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CachedResult(
+            budget_per_person_eur=data["budget_per_person_eur"],
+            itineraries=[
+                CachedItinerary(
+                    suggested=SuggestedItinerary(**item["suggested"]),
+                    offers=[FlightOffer(**o) for o in item["offers"]],
+                    total_per_person=item["total_per_person"],
+                )
+                for item in data["itineraries"]
+            ],
+        )
+    except Exception as exc:
+        logger.warning("Smart multi result cache read failed: %s: %s", type(exc).__name__, exc)
+        return None
+
+
+async def save_result(key: str, result: CachedResult, expires_at: datetime) -> None:
+    """Stores the entry until `expires_at` (naive UTC, like flight_cache.expires_at)."""
+    ttl_ms = int((expires_at - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() * 1000)
+    if ttl_ms <= 0:
+        return
+    try:
+        redis = await get_redis()
+        await redis.set(key, json.dumps(asdict(result)), px=ttl_ms)
+    except Exception as exc:
+        logger.warning("Smart multi result cache write failed: %s: %s", type(exc).__name__, exc)
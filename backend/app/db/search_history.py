@@ -0,0 +1,59 @@
+"""
+Search log (search_history table) and the demand ranking built on it.
+
+Every search endpoint schedules record_search() as a FastAPI background task:
+the row is written after the response is sent, on its own session, and a
+failure only costs a log line.
+
+    search_type   'reverse' | 'forward' | 'round_trip' | 'meet' | 'smart_multi'
+    params        the request parameters; airports as upper-case IATA codes
+
+demand_ranking() turns the recent rows into "how often was this airport
+searched as destination / as origin", which services/prewarm.py uses to
+decide which cache rows are worth refreshing before they expire.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import async_session_maker
+from app.models.flight_cache import SearchHistory
+
+logger = logging.getLogger(__name__)
+
+
+async def record_search(search_type: str, params: dict) -> None:
+    """Appends one search_history row. Never raises: it runs after the response."""
+    try:
+        async with async_session_maker() as session:
+            session.add(SearchHistory(search_type=search_type, params=params))
+            await session.commit()
+    except Exception as exc:
+        logger.warning("search_history not recorded (%s): %s: %s", search_type, type(exc).__name__, exc)
+
+
+async def _ranked(session: AsyncSession, field: str, since: datetime, limit: int) -> dict[str, int]:
+    airport = SearchHistory.params[field].astext
+    stmt = (
+        select(airport, func.count())
+        .where(SearchHistory.created_at >= since, airport.is_not(None))
+        .group_by(airport)
+        .order_by(func.count().desc())
+        .limit(limit)
+    )
+    return {code: n for code, n in (await session.execute(stmt)).all()}
+
+
+async def demand_ranking(session: AsyncSession, days: int, limit: int) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Most searched airports over the last `days` days.
+
+    Returns:
+        (destinations, origins) — {iata: searches}, at most `limit` each, most searched first.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+    destinations = await _ranked(session, "destination", since, limit)
+    origins = await _ranked(session, "origin", since, limit)
+    return destinations, origins
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -5,8 +6,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.db.database import engine, Base
+from app.db.database import engine, Base, async_session_maker
+from app.db.cache_maintenance import ensure_history_partitions, ensure_partitions, run_maintenance_loop
 from app.db.redis import get_redis, close_redis
+from app.db.memory_cache import run_invalidation_listener
+from app.services.prewarm import run_prewarm_loop
 from app.api.v1.router import api_router
 import app.models  # noqa: F401 — registra tutti i modelli con Base
 
@@ -14,6 +18,7 @@ logging.basicConfig(
     level=logging.DEBUG if settings.app_env == "development" else logging.INFO,
     format="%(asctime)s %(levelname)-8s %(name)s — %(message)s",
 )
+logger = logging.getLogger(__name__)
 
 ###############---############
 # REMEMBER TO SWITCH TO Alembic migrations IN PROD
@@ -24,12 +29,32 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    # flight_cache / price_history only accept rows whose month has a partition
+    try:
+        async with async_session_maker() as session:
+            await ensure_partitions(session)
+            await ensure_history_partitions(session)
+            await session.commit()
+    except Exception as exc:
+        # another worker creating the same partitions: the maintenance loop retries
+        logger.warning("flight_cache partitions not ensured at startup: %s", exc)
+
     redis = await get_redis()
     await redis.ping()  # verifica connessione Redis all'avvio
 
+    # Drops in-process cache entries rewritten by the other workers
+    invalidation_task = asyncio.create_task(run_invalidation_listener())
+    # Creates/drops flight_cache partitions and purges expired rows
+    maintenance_task = asyncio.create_task(run_maintenance_loop())
+    # Off-peak refresh of the most searched routes, before their rows expire
+    prewarm_task = asyncio.create_task(run_prewarm_loop())
+
     yield
 
     # Shutdown
+    invalidation_task.cancel()
+    maintenance_task.cancel()
+    prewarm_task.cancel()
     await close_redis()
 
 
@@ -2,4 +2,4 @@
 # SQLAlchemy deve conoscere tutte le tabelle prima di poter
 # chiamare create_all() o generare migrazioni Alembic.
 from app.models.airport import Airport  # noqa: F401
-from app.models.flight_cache import FlightCache, SearchHistory  # noqa: F401
+from app.models.flight_cache import FlightCache, PriceHistory, SearchHistory  # noqa: F401
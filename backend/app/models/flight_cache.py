@@ -1,6 +1,18 @@
 from datetime import date, datetime
 
-from sqlalchemy import Boolean, Date, Index, Integer, Numeric, String, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Date,
+    Float,
+    Index,
+    Integer,
+    LargeBinary,
+    Numeric,
+    SmallInteger,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -9,23 +21,64 @@ from app.db.database import Base
 
 
 class FlightCache(Base):
+    """
+    Range-partitioned by departure_date, one partition per month
+    (flight_cache_YYYYMM, managed by app/db/cache_maintenance.py).
+    Postgres requires the partition key in every unique constraint,
+    hence the (id, departure_date) primary key.
+    """
     __tablename__ = "flight_cache"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     origin: Mapped[str] = mapped_column(String(3), nullable=False)
     destination: Mapped[str] = mapped_column(String(3), nullable=False)
-    departure_date: Mapped[date] = mapped_column(Date, nullable=False)
+    departure_date: Mapped[date] = mapped_column(Date, primary_key=True)
     price_eur: Mapped[float | None] = mapped_column(Numeric(10, 2))
     airline: Mapped[str | None] = mapped_column(String(100))
     direct_flight: Mapped[bool | None] = mapped_column(Boolean)
     flight_duration_minutes: Mapped[int | None] = mapped_column(Integer)
     fetched_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    # Per-row TTL (db/cache_ttl.py): a row is valid while expires_at > now
+    expires_at: Mapped[datetime] = mapped_column(nullable=False)
+    # Average relative change of the cheapest price between refreshes (None = first fetch)
+    price_volatility: Mapped[float | None] = mapped_column(Float)
     raw_response: Mapped[dict | None] = mapped_column(JSONB)
+    # Same offers in the packed binary format (app/db/offer_codec.py).
+    # Exactly one of raw_response / raw_packed is set, see CACHE_STORAGE_FORMAT.
+    raw_packed: Mapped[bytes | None] = mapped_column(LargeBinary)
 
     __table_args__ = (
         UniqueConstraint("origin", "destination", "departure_date"),
-        Index("idx_cache_lookup", "destination", "departure_date", "fetched_at"),
-        Index("idx_cache_expiry", "fetched_at"),
+        Index("idx_cache_lookup", "destination", "departure_date", "expires_at"),
+        # Origin-leading twin of idx_cache_lookup, used by forward ("X → anywhere") scans
+        Index("idx_cache_origin_lookup", "origin", "departure_date", "expires_at"),
+        Index("idx_cache_expiry", "expires_at"),
+        {"postgresql_partition_by": "RANGE (departure_date)"},
+    )
+
+
+class PriceHistory(Base):
+    """
+    Append-only: one row per cache refresh of a route/date, written in the
+    same transaction as the flight_cache upsert (db/price_history.py).
+    Range-partitioned by fetched_at month (price_history_YYYYMM); old months
+    are dropped after PRICE_HISTORY_RETENTION_MONTHS.
+    """
+    __tablename__ = "price_history"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(3), nullable=False)
+    destination: Mapped[str] = mapped_column(String(3), nullable=False)
+    departure_date: Mapped[date] = mapped_column(Date, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(primary_key=True)
+    min_price_eur: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    airline: Mapped[str | None] = mapped_column(String(100))
+    # number of offers the provider returned in this refresh
+    sample_count: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+    __table_args__ = (
+        Index("idx_price_history_route", "origin", "destination", "departure_date", "fetched_at"),
+        {"postgresql_partition_by": "RANGE (fetched_at)"},
     )
 
 
@@ -33,7 +86,7 @@ class SearchHistory(Base):
     __tablename__ = "search_history"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    # 'reverse' or 'smart_multi'
+    # 'reverse', 'forward', 'round_trip', 'meet' or 'smart_multi' (written by db/search_history.py)
     search_type: Mapped[str] = mapped_column(String(20), nullable=False)
     params: Mapped[dict] = mapped_column(JSONB, nullable=False)
     results: Mapped[dict | None] = mapped_column(JSONB)
@@ -64,6 +64,30 @@ class ReverseSearchOut(BaseModel):
     provider_status: ProviderStatus | None = None
 
 
+# ---------------------------------------------------------------------------
+# forward search answer (one origin → every destination)
+# ---------------------------------------------------------------------------
+
+class DestinationOfferOut(BaseModel):
+    destination: str
+    destination_city: str
+    price_eur: float
+    airline: str
+    departure: datetime
+    direct: bool
+    duration_minutes: int
+    latitude: float
+    longitude: float
+
+
+class ForwardSearchOut(BaseModel):
+    origin: str
+    results: list[DestinationOfferOut]
+    cached: bool
+    fetched_at: datetime
+    provider_status: ProviderStatus | None = None
+
+
 # ---------------------------------------------------------------------------
 # smart multi-city answere (strutture nidificate)
 # ---------------------------------------------------------------------------
@@ -96,9 +120,77 @@ class SmartMultiIn(BaseModel):
     date_from: date
     date_to: date
     direct_only: bool = False
+    # "llm" (AI-generated candidates) or "graph" (deterministic graph search, no LLM call)
+    engine: str = "llm"
+    # ±days each leg may move within date_from..date_to (0 = evenly split fixed dates)
+    flex_days: int = 0
 
 
 class SmartMultiOut(BaseModel):
     origin: str
     itineraries: list[ItineraryOut]
     provider_status: ProviderStatus | None = None
+    # the request deadline stopped pricing: other routes might have ranked in
+    partial: bool = False
+    # answered from the result cache (db/result_cache.py), no LLM or provider call
+    cached: bool = False
+
+
+# ---------------------------------------------------------------------------
+# round-trip answer (outbound + inbound one-way legs)
+# ---------------------------------------------------------------------------
+
+class RoundTripOut(BaseModel):
+    destination: str
+    destination_city: str
+    latitude: float
+    longitude: float
+    nights: int
+    total_price_eur: float
+    outbound: LegOut
+    inbound: LegOut
+
+
+class RoundTripSearchOut(BaseModel):
+    origin: str
+    results: list[RoundTripOut]
+    cached: bool
+    provider_status: ProviderStatus | None = None
+
+
+# ---------------------------------------------------------------------------
+# meet-in-the-middle (N origins → one shared destination)
+# ---------------------------------------------------------------------------
+
+class MeetInTheMiddleIn(BaseModel):
+    origins: list[str]
+    date_from: date
+    date_to: date
+    rank_by: str = "total"      # "total" | "max"
+    direct_only: bool = False
+    max_results: int = 20
+
+
+class MeetFareOut(BaseModel):
+    origin: str
+    price_eur: float
+    airline: str
+    departure_date: date
+
+
+class MeetDestinationOut(BaseModel):
+    destination: str
+    destination_city: str
+    latitude: float
+    longitude: float
+    total_price_eur: float
+    max_price_eur: float
+    fares: list[MeetFareOut]
+
+
+class MeetInTheMiddleOut(BaseModel):
+    origins: list[str]
+    rank_by: str
+    results: list[MeetDestinationOut]
+    cached: bool
+    provider_status: ProviderStatus | None = None
@@ -14,6 +14,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.airport import Airport
+from app.utils.deadline import Deadline
 from app.utils.geo import estimate_radius_km, estimate_stops, haversine_km
 
 
@@ -35,10 +36,16 @@ class AreaResult:
     airports: list[ReachableAirport]
 
 
+def _check(deadline: Deadline) -> None:
+    if deadline.expired():
+        raise TimeoutError("deadline expired")
+
+
 async def calculate_area(
     session: AsyncSession,
     origin_iata: str,
     trip_duration_days: int,
+    deadline: Deadline | None = None,
 ) -> AreaResult:
     """
     Computes the explorable area for the Smart Multi-City pipeline.
@@ -47,6 +54,9 @@ async def calculate_area(
         session:            async DB session
         origin_iata:        IATA code of the departure/return airport
         trip_duration_days: total trip duration in days
+        deadline:           request deadline, checked before each query (None = no limit).
+                            A query is never cancelled mid-flight: that would leave
+                            the shared session's connection in an undefined state.
 
     Returns:
         AreaResult with radius, number of stops, and list of reachable airports
@@ -54,8 +64,12 @@ async def calculate_area(
 
     Raises:
         ValueError: if the origin airport does not exist in the DB or is inactive.
+        TimeoutError: if the deadline has expired before a query.
     """
+    deadline = deadline or Deadline.never()
+
     # Fetch the coordinates of the origin airport
+    _check(deadline)
     result = await session.execute(
         select(Airport).where(
             Airport.iata_code == origin_iata,
@@ -70,6 +84,7 @@ async def calculate_area(
     num_stops = estimate_stops(trip_duration_days)
 
     # Load all active airports (excluding the origin)
+    _check(deadline)
     all_result = await session.execute(
         select(Airport).where(
             Airport.is_active.is_(True),
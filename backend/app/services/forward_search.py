@@ -0,0 +1,205 @@
+"""
+Core logic for Forward Search ("X → anywhere").
+
+Mirror image of search_engine.reverse_search: one fixed origin, every
+reachable destination.
+
+Flow:
+  1. Loads the origin airport + all active destinations (optional radius
+     filter around the origin).
+  2. Single aggregated query on flight_cache (served by idx_cache_origin_lookup):
+     DISTINCT ON (destination) keeps only the cheapest valid row per destination,
+     so the offers of only one row per destination are decoded; a second,
+     column-only query lists which days each destination has cached.
+  3. The uncached days are fetched through the provider cascade, one call per
+     run of consecutive missing days: destinations with nothing cached first,
+     nearest first (short hops are the most likely to have direct flights),
+     then the gaps of partly cached ones, max _MAX_NEW_CALLS_PER_SEARCH per search.
+  4. Saves new results to cache and returns them enriched with coordinates
+     for the map.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import distinct_on
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.cache import is_fresh, missing_runs, offers_from_row, save_to_cache_many, split_by_departure_date
+from app.models.airport import Airport
+from app.models.flight_cache import FlightCache
+from app.models.schemas import ProviderStatus
+from app.services.providers.base import FlightOffer
+from app.services.providers.factory import (
+    PROVIDER_NOTES,
+    get_provider_quotas,
+    get_providers_in_order,
+    search_one_way_cascade,
+)
+from app.utils.geo import haversine_km
+
+# Maximum new provider calls per single search (same budget as reverse search)
+_MAX_NEW_CALLS_PER_SEARCH = 50
+
+
+async def forward_search(
+    session: AsyncSession,
+    origin: str,
+    date_from: date,
+    date_to: date,
+    direct_only: bool = False,
+    max_results: int = 100,
+    radius_km: int | None = None,
+) -> tuple[list[dict], bool, datetime, ProviderStatus]:
+    """
+    Forward search: finds the cheapest flight from origin to every reachable destination.
+
+    Args:
+        radius_km: optional cap on the distance between origin and destination.
+
+    Returns:
+        (results list, all_from_cache, fetched_at, provider_status)
+
+    Raises:
+        ValueError: if the origin airport does not exist in the DB or is inactive.
+    """
+
+    # --- 1. Origin + candidate destinations
+    airport_rows = await session.execute(select(Airport).where(Airport.is_active.is_(True)))
+    airport_map: dict[str, Airport] = {a.iata_code: a for a in airport_rows.scalars().all()}
+
+    origin_airport = airport_map.pop(origin, None)
+    if origin_airport is None:
+        raise ValueError(f"Origin airport '{origin}' not found or inactive.")
+
+    distances: dict[str, float] = {
+        code: haversine_km(
+            origin_airport.latitude, origin_airport.longitude, a.latitude, a.longitude
+        )
+        for code, a in airport_map.items()
+    }
+    if radius_km is not None:
+        airport_map = {code: a for code, a in airport_map.items() if distances[code] <= radius_km}
+
+    # --- 2. Date range (max 7 days, like reverse search)
+    date_list: list[date] = []
+    current = date_from
+    while current <= date_to and len(date_list) < 7:
+        date_list.append(current)
+        current += timedelta(days=1)
+
+    # --- 3. Best valid cache row per destination, aggregated in SQL
+    cache_filters = (
+        FlightCache.origin == origin,
+        FlightCache.departure_date.in_(date_list),
+        is_fresh(),
+    )
+    stmt_cache = (
+        select(FlightCache)
+        .where(*cache_filters)
+        .ext(distinct_on(FlightCache.destination))
+        .order_by(
+            FlightCache.destination,
+            FlightCache.price_eur.asc().nulls_last(),
+            FlightCache.fetched_at.desc(),
+        )
+    )
+    cache_rows = await session.execute(stmt_cache)
+
+    cache_best: dict[str, tuple[FlightOffer, datetime]] = {}
+    for row in cache_rows.scalars():
+        offers = offers_from_row(row)
+        if offers:
+            cache_best[row.destination] = (min(offers, key=lambda o: o.price_eur), row.fetched_at)
+
+    # Days covered per destination (key columns only, no offers decoded)
+    coverage_rows = await session.execute(
+        select(FlightCache.destination, FlightCache.departure_date).where(*cache_filters)
+    )
+    cached_days: dict[str, set[date]] = {}
+    for destination, departure_date in coverage_rows.all():
+        cached_days.setdefault(destination, set()).add(departure_date)
+
+    # --- 4. Missing days per destination: uncached destinations first, nearest first
+    to_fetch: list[tuple[str, date, date]] = [
+        (destination, run_from, run_to)
+        for destination in sorted(
+            airport_map, key=lambda code: (code in cached_days, distances[code])
+        )
+        for run_from, run_to in missing_runs(date_list, cached_days.get(destination, set()))
+    ][:_MAX_NEW_CALLS_PER_SEARCH]
+
+    # --- 5. Provider fan-out
+    providers_in_order = await get_providers_in_order()
+    active_provider = providers_in_order[0][0] if providers_in_order else "none"
+
+    answers = await asyncio.gather(*[
+        search_one_way_cascade(
+            providers_in_order, origin, destination, run_from, run_to,
+            direct_only=direct_only, max_results=10,
+        )
+        for destination, run_from, run_to in to_fetch
+    ])
+
+    # Cache writes happen once, after the gather: an AsyncSession must not be shared by concurrent tasks
+    fresh_best: dict[str, FlightOffer] = {}
+    to_save: dict[tuple[str, str, date], list[FlightOffer]] = {}
+    for (destination, run_from, run_to), (_, offers) in zip(to_fetch, answers):
+        if not offers:
+            continue
+        run_days = [d for d in date_list if run_from <= d <= run_to]
+        for single_date, day_offers in split_by_departure_date(offers, run_days).items():
+            to_save[(origin, destination, single_date)] = day_offers
+        cheapest = min(offers, key=lambda o: o.price_eur)
+        if destination not in fresh_best or cheapest.price_eur < fresh_best[destination].price_eur:
+            fresh_best[destination] = cheapest
+    await save_to_cache_many(session, to_save)
+
+    # --- 6. Assembling the answer: cheapest of the cached and fresh days per destination
+    results: list[dict] = []
+    now = datetime.now(timezone.utc)
+    for destination in cache_best.keys() | fresh_best.keys():
+        airport = airport_map.get(destination)
+        if not airport:
+            continue
+        cached = cache_best.get(destination)
+        fresh = fresh_best.get(destination)
+        if fresh is not None and (cached is None or fresh.price_eur < cached[0].price_eur):
+            results.append(_build_result(fresh, airport, now))
+        else:
+            results.append(_build_result(cached[0], airport, cached[1]))
+
+    results.sort(key=lambda r: r["price_eur"])
+    results = results[:max_results]
+
+    all_from_cache = len(fresh_best) == 0
+    fetched_at = results[0]["_fetched_at"] if results else now
+
+    for r in results:
+        r.pop("_fetched_at")
+
+    # --- 7. Provider status
+    quotas = await get_provider_quotas()
+    provider_status = ProviderStatus(
+        active_provider=active_provider,
+        serpapi_remaining=quotas.get("serpapi", 0),
+        amadeus_remaining=quotas.get("amadeus", 0),
+        note=PROVIDER_NOTES.get(active_provider, ""),
+    )
+
+    return results, all_from_cache, fetched_at, provider_status
+
+
+def _build_result(offer: FlightOffer, airport: Airport, fetched_at: datetime) -> dict:
+    return {
+        "destination": offer.destination,
+        "destination_city": airport.city,
+        "price_eur": offer.price_eur,
+        "airline": offer.airline,
+        "departure": offer.departure,
+        "direct": offer.direct,
+        "duration_minutes": offer.duration_minutes,
+        "latitude": airport.latitude,
+        "longitude": airport.longitude,
+        "_fetched_at": fetched_at,
+    }
@@ -0,0 +1,214 @@
+"""
+Graph Planner — deterministic alternative to the LLM step of Smart Multi-City.
+
+Step 2 of run_smart_multi() normally asks an LLM for candidate routes
+(5–20 s, and it can fail). With engine="graph" the candidates come from a
+search over a weighted graph instead:
+
+    nodes   the origin + the _MAX_AIRPORTS_FOR_GRAPH closest reachable airports
+            from calculate_area()
+    edges   every ordered pair; the weight of leg i (departing on its own date)
+            is the cheapest fresh flight_cache price for that pair and date,
+            or a distance-based fare estimate when nothing is cached
+
+The cheapest closed tours origin → num_stops distinct airports → origin are
+found with a bounded DP over (legs flown, last airport): every state keeps
+only its _BEAM_WIDTH cheapest partial paths. The result is exact whenever the
+optimal path survives the beam (always, in practice, for the top few tours)
+and costs O(num_stops × n² × _BEAM_WIDTH) — about 15 ms for 50 airports
+and 4 stops.
+
+The tours are returned as SuggestedItinerary, so Step 3 (real prices) and
+everything after it is unchanged.
+"""
+import heapq
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.cache import is_fresh
+from app.models.flight_cache import FlightCache
+from app.services.area_calculator import AreaResult
+from app.services.llm.base import SuggestedItinerary
+from app.utils.geo import haversine_km
+
+# Airports used as graph nodes (the closest ones, like the LLM prompt)
+_MAX_AIRPORTS_FOR_GRAPH = 50
+
+# Partial paths kept per (legs flown, last airport)
+_BEAM_WIDTH = 8
+
+# Fare estimate for legs without a cached price: base + per-km component
+_BASE_FARE_EUR = 30.0
+_EUR_PER_KM = 0.06
+
+EdgePrices = dict[tuple[str, str, date], float]
+
+
+@dataclass
+class PlannedTour:
+    route: list[str]            # origin, stops..., origin
+    estimated_cost_eur: float
+    cached_legs: int            # legs priced from flight_cache (the others are estimates)
+
+
+def estimated_fare(distance_km: float) -> float:
+    return _BASE_FARE_EUR + _EUR_PER_KM * distance_km
+
+
+def distance_matrix(area: AreaResult, max_airports: int = _MAX_AIRPORTS_FOR_GRAPH) -> dict[tuple[str, str], float]:
+    """
+    Km between every ordered pair of graph nodes: the origin (its distances
+    come with the AreaResult) and the `max_airports` closest reachable airports.
+    """
+    airports = area.airports[:max_airports]
+    distance: dict[tuple[str, str], float] = {}
+    for a in airports:
+        distance[(area.origin_iata, a.iata_code)] = distance[(a.iata_code, area.origin_iata)] = a.distance_km
+        for b in airports:
+            if a.iata_code != b.iata_code:
+                distance[(a.iata_code, b.iata_code)] = haversine_km(
+                    a.latitude, a.longitude, b.latitude, b.longitude
+                )
+    return distance
+
+
+def plan_tours(
+    origin: str,
+    distance: dict[tuple[str, str], float],
+    num_stops: int,
+    leg_dates: list[date],
+    known_prices: EdgePrices,
+    limit: int = 10,
+    beam_width: int = _BEAM_WIDTH,
+) -> list[PlannedTour]:
+    """
+    Cheapest closed tours with exactly `num_stops` distinct intermediate airports.
+
+    Args:
+        distance:     km per ordered pair of nodes (see distance_matrix)
+        leg_dates:    departure date of each leg (num_stops + 1 of them)
+        known_prices: cheapest cached price per (from, to, date)
+
+    Returns:
+        at most `limit` tours, cheapest estimated cost first.
+    """
+    stops = sorted({b for a, b in distance if a == origin})
+    if num_stops < 1 or len(stops) < num_stops:
+        return []
+
+    # Nodes as indexes (the origin is the last one) and one weight matrix per leg:
+    # the inner loop only does list indexing and float additions.
+    nodes = stops + [origin]
+    n = len(stops)
+    weights: list[list[list[float]]] = []
+    cached_flags: list[list[list[int]]] = []
+    for leg_date in leg_dates[: num_stops + 1]:
+        w_leg, c_leg = [], []
+        for a in nodes:
+            w_row, c_row = [], []
+            for b in nodes:
+                price = known_prices.get((a, b, leg_date)) if a != b else None
+                if price is not None:
+                    w_row.append(price)
+                    c_row.append(1)
+                else:
+                    w_row.append(estimated_fare(distance[(a, b)]) if a != b else 0.0)
+                    c_row.append(0)
+            w_leg.append(w_row)
+            c_leg.append(c_row)
+        weights.append(w_leg)
+        cached_flags.append(c_leg)
+
+    # layer[last] = [(cost, visited bitmask, path, cached_legs)] — path holds stop indexes only
+    first_w, first_c = weights[0][n], cached_flags[0][n]
+    layer: list[list[tuple[float, int, tuple[int, ...], int]]] = [
+        [(first_w[i], 1 << i, (i,), first_c[i])] for i in range(n)
+    ]
+
+    for leg in range(1, num_stops):
+        # bounded max-heaps (negated cost): the _BEAM_WIDTH cheapest partials per last stop
+        heaps: list[list[tuple[float, int, tuple[int, ...], int]]] = [[] for _ in range(n)]
+        for last in range(n):
+            w_row, c_row = weights[leg][last], cached_flags[leg][last]
+            for cost, visited, path, cached in layer[last]:
+                for nxt in range(n):
+                    if visited >> nxt & 1:
+                        continue
+                    new_cost = cost + w_row[nxt]
+                    heap = heaps[nxt]
+                    if len(heap) < beam_width:
+                        heapq.heappush(heap, (-new_cost, visited | 1 << nxt, path + (nxt,), cached + c_row[nxt]))
+                    elif new_cost < -heap[0][0]:
+                        heapq.heapreplace(heap, (-new_cost, visited | 1 << nxt, path + (nxt,), cached + c_row[nxt]))
+        layer = [[(-c, v, p, k) for c, v, p, k in heap] for heap in heaps]
+
+    closing_w, closing_c = weights[num_stops], cached_flags[num_stops]
+    tours = [
+        (cost + closing_w[last][n], path, cached + closing_c[last][n])
+        for last in range(n)
+        for cost, _, path, cached in layer[last]
+    ]
+    return [
+        PlannedTour(
+            route=[origin, *(stops[i] for i in path), origin],
+            estimated_cost_eur=round(cost, 2),
+            cached_legs=cached,
+        )
+        for cost, path, cached in heapq.nsmallest(limit, tours)
+    ]
+
+
+async def cached_edge_prices(
+    session: AsyncSession,
+    airports: list[str],
+    leg_dates: list[date],
+    direct_only: bool = False,
+) -> EdgePrices:
+    """Cheapest fresh price of every cached (from, to, date) between the given airports — one query."""
+    stmt = select(
+        FlightCache.origin,
+        FlightCache.destination,
+        FlightCache.departure_date,
+        FlightCache.price_eur,
+    ).where(
+        FlightCache.origin.in_(airports),
+        FlightCache.destination.in_(airports),
+        FlightCache.departure_date.in_(set(leg_dates)),
+        is_fresh(),
+    )
+    if direct_only:
+        stmt = stmt.where(FlightCache.direct_flight.is_(True))
+    rows = (await session.execute(stmt)).all()
+    return {(o, d, day): float(price) for o, d, day, price in rows if price is not None}
+
+
+async def suggest_itineraries(
+    session: AsyncSession,
+    area: AreaResult,
+    leg_dates: list[date],
+    direct_only: bool = False,
+    limit: int = 10,
+) -> list[SuggestedItinerary]:
+    """
+    Graph-search replacement for generate_with_fallback(): the `limit`
+    cheapest tours over the reachable area, as SuggestedItinerary.
+    """
+    distance = distance_matrix(area)
+    nodes = [area.origin_iata] + [a.iata_code for a in area.airports[:_MAX_AIRPORTS_FOR_GRAPH]]
+    known_prices = await cached_edge_prices(session, nodes, leg_dates, direct_only)
+    tours = plan_tours(area.origin_iata, distance, area.num_stops, leg_dates, known_prices, limit)
+    return [
+        SuggestedItinerary(
+            route=tour.route,
+            reasoning=(
+                f"Graph search: estimated €{tour.estimated_cost_eur:.0f}/person "
+                f"({tour.cached_legs}/{len(tour.route) - 1} legs from cached prices)"
+            ),
+            estimated_difficulty="medium",
+            best_season=[],
+        )
+        for tour in tours
+    ]
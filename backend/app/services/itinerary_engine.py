@@ -4,30 +4,62 @@ Itinerary Engine — Smart Multi-City pipeline (2.3).
 Orchestrates the full multi-city search in 5 steps:
   Step 1: calculate_area()         → radius, num_stops, reachable airports
   Step 2: generate_with_fallback() → candidate itineraries via AI (JSON)
-  Step 3: real price check via FlightProvider cascade (parallel async calls)
-  Step 4: budget filtering + ranking by price
+          or, with engine="graph", suggest_itineraries() → cheapest tours
+          from a graph search over cached prices (services/graph_planner.py).
+          While the AI answers, the first and last legs via the closest
+          airports are priced speculatively; Step 3 adopts the calls it needs.
+          AI routes then go through screen_routes() (services/route_validator.py):
+          unknown / out-of-radius airports dropped, zig-zag tours re-ordered
+  Step 3: real price check — every unique (origin, destination, date) leg
+          priced once: flight_cache first, FlightProvider cascade for the misses
+          (fresh offers written back), itineraries assembled from the leg table.
+          A first provider pricing multi-city tickets (max_legs_per_call > 1)
+          gets one ticket per route instead, valid for that route only.
+          With flex_days each leg has ±flex_days candidate dates and a DP picks
+          the cheapest feasible date combination per route
+  Step 4: budget filtering + ranking by price, route by route as legs get
+          priced: a route is dropped (and its pending provider calls cancelled)
+          as soon as its lower bound exceeds the budget or the current 5th best
   Step 5: return top 5 as SmartMultiOut
+
+Repeat searches (same origin, duration, dates, direct_only, engine, flex_days)
+are answered from the result cache (db/result_cache.py) without Steps 1-4:
+budget and travelers are applied to the stored itineraries.
+
+stream_smart_multi() runs the same steps as a sequence of events (candidate
+routes, each itinerary as soon as it is priced, final result) for the
+streaming endpoint; run_smart_multi() just waits for the final one.
 """
 import asyncio
 import json
 import logging
+import math
 import time
+from collections.abc import AsyncIterator
 from datetime import date, timedelta
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.cache import earliest_expiry, get_cached_many, save_to_cache_many, split_by_departure_date
+from app.db.price_history import cheapest_seen_many
+from app.db.result_cache import CachedItinerary, CachedResult, get_result, result_key, save_result
 from app.models.schemas import ItineraryOut, LegOut, ProviderStatus, SmartMultiOut
 from app.services.area_calculator import AreaResult, calculate_area
+from app.services.graph_planner import suggest_itineraries
 from app.services.llm.base import SuggestedItinerary
 from app.services.llm.factory import generate_with_fallback
 from app.services.providers.base import FlightOffer, Leg
+from app.services.route_validator import screen_routes
 from app.services.providers.factory import (
     MONTHLY_WINDOW,
     PROVIDER_LIMITS,
     PROVIDER_NOTES,
     get_provider_quotas,
     get_providers_in_order,
+    quota_units,
 )
+from app.utils.adaptive_limiter import get_limiter
+from app.utils.deadline import Deadline
 from app.utils.rate_limiter import check_rate_limit
 
 logger = logging.getLogger(__name__)
@@ -47,8 +79,33 @@ _AMADEUS_PROVIDER_HINT = (
 # Maximum airports sent to the LLM (the closest ones, already sorted by distance)
 _MAX_AIRPORTS_FOR_LLM = 50
 
-# Maximum concurrent pricing tasks
-_MAX_CONCURRENT_PRICING = 3
+
+# Flex mode: each leg may move ±flex_days around its even-split date, every
+# stop lasting at least _MIN_STAY_DAYS and within ±flex_days of its planned length
+_MIN_STAY_DAYS = 1
+
+# Longest date range priced with a single provider call (providers query at most 7 days)
+_MAX_DAYS_PER_CALL = 7
+
+# Lower bound of a leg not priced yet: this fraction of the lowest price_history
+# observation of its pair over the last _FLOOR_HISTORY_DAYS days (0 if never seen).
+# Loose on purpose: a fare below half the 90-day low is the only way to lose a route.
+_FLOOR_HISTORY_RATIO = 0.5
+_FLOOR_HISTORY_DAYS = 90
+
+# Speculative pricing while the LLM answers: first leg to / last leg from the
+# _PREFETCH_AIRPORTS closest airports, at most _PREFETCH_MAX_CALLS provider calls,
+# and only through providers with more than _PREFETCH_QUOTA_RESERVE of their
+# monthly quota left (guesses must not eat the quota of real legs)
+_PREFETCH_AIRPORTS = 3
+_PREFETCH_MAX_CALLS = 6
+_PREFETCH_QUOTA_RESERVE = 0.5
+
+# Request deadline split: Step 2 may use this share of the time left after
+# Step 1; pricing gets the rest minus the reserve kept to save the fetched
+# offers and build the response.
+_PLAN_DEADLINE_SHARE = 0.6
+_RESPONSE_RESERVE_S = 1.5
 
 
 # ---------------------------------------------------------------------------
@@ -95,64 +152,648 @@ def _is_valid_route(route: list[str], origin: str) -> bool:
 
 
 # ---------------------------------------------------------------------------
-# Step 3 helper — pricing a single itinerary with cascade provider
+# Step 3 helpers — per-request leg table priced with the cascade provider
 # ---------------------------------------------------------------------------
 
-async def _price_itinerary(
+LegKey = tuple[str, str, date]
+# one provider call of search_one_way: (origin, destination) over a run of consecutive days
+LegRun = tuple[tuple[str, str], list[date]]
+
+
+def _itinerary_legs(
     suggested: SuggestedItinerary,
     origin: str,
     date_from: date,
     trip_duration_days: int,
-    direct_only: bool,
-    semaphore: asyncio.Semaphore,
-    providers_in_order: list,
-) -> tuple[SuggestedItinerary, list[FlightOffer]] | None:
-    """
-    Fetches the cheapest price for each leg of the suggested itinerary
-    using the provider cascade (SerpAPI → Amadeus).
-    """
+) -> list[Leg] | None:
+    """Legs of the suggested itinerary with their dates, None if the route is invalid."""
     if not _is_valid_route(suggested.route, origin):
         return None
 
     route = suggested.route
     num_legs = len(route) - 1
     dates = _leg_dates(date_from, trip_duration_days, num_legs)
-
-    legs = [
+    return [
         Leg(origin=route[i], destination=route[i + 1], date=dates[i])
         for i in range(num_legs)
     ]
 
+
+def _candidate_dates(
+    legs: list[Leg],
+    date_from: date,
+    date_to: date,
+    flex_days: int,
+) -> list[list[date]]:
+    """
+    Departure dates considered for each leg: the planned one, or with flex_days > 0
+    every day within ±flex_days of it that falls inside date_from..date_to.
+    """
+    if flex_days <= 0:
+        return [[leg.date] for leg in legs]
+    candidates = []
+    for leg in legs:
+        days = [leg.date + timedelta(days=delta) for delta in range(-flex_days, flex_days + 1)]
+        candidates.append([d for d in days if date_from <= d <= date_to] or [leg.date])
+    return candidates
+
+
+def _stay_bounds(legs: list[Leg], flex_days: int) -> list[tuple[int, int]]:
+    """(min, max) days between consecutive legs, i.e. the length of each stop."""
+    bounds = []
+    for prev, nxt in zip(legs, legs[1:]):
+        planned = (nxt.date - prev.date).days
+        bounds.append((max(_MIN_STAY_DAYS, planned - flex_days), planned + flex_days))
+    return bounds
+
+
+def _cheapest_date_combination(
+    daily_prices: list[dict[date, float]],
+    stay_bounds: list[tuple[int, int]],
+) -> list[date] | None:
+    """
+    DP over the per-leg daily price arrays: best[i][d] is the cheapest way to fly
+    legs 0..i with leg i on day d, each stop length within its bounds.
+
+    Returns:
+        the departure date of each leg, None if no combination is feasible.
+    """
+    best: list[dict[date, tuple[float, date | None]]] = [
+        {d: (price, None) for d, price in daily_prices[0].items()}
+    ]
+    for i in range(1, len(daily_prices)):
+        low, high = stay_bounds[i - 1]
+        layer: dict[date, tuple[float, date | None]] = {}
+        for d, price in daily_prices[i].items():
+            reachable = [
+                (cost, prev_day)
+                for prev_day, (cost, _) in best[-1].items()
+                if low <= (d - prev_day).days <= high
+            ]
+            if reachable:
+                cost, prev_day = min(reachable)
+                layer[d] = (cost + price, prev_day)
+        if not layer:
+            return None
+        best.append(layer)
+
+    if not best[-1]:
+        return None
+    day = min(best[-1], key=lambda d: best[-1][d])
+    dates = [day]
+    for layer in reversed(best[1:]):
+        day = layer[day][1]
+        dates.append(day)
+    return dates[::-1]
+
+
+def _date_runs(days: list[date], max_len: int = _MAX_DAYS_PER_CALL) -> list[list[date]]:
+    """Splits dates into runs of consecutive days (at most max_len each): one provider call per run."""
+    runs: list[list[date]] = []
+    for day in sorted(set(days)):
+        if runs and (day - runs[-1][-1]).days == 1 and len(runs[-1]) < max_len:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _route_lower_bound(
+    leg_keys: list[list[LegKey]],
+    leg_table: dict[LegKey, list[FlightOffer]],
+    resolved: set[LegKey],
+    floors: dict[tuple[str, str], float],
+) -> float:
+    """
+    Lower bound of a route's total per person while its legs are being priced.
+
+    Each leg counts its cheapest candidate date: a priced key its cheapest
+    offer (inf if it has none), a key still pending the floor of its pair.
+    inf means some leg has been fully priced without any offer.
+    """
+    total = 0.0
+    for keys in leg_keys:
+        best = math.inf
+        for key in keys:
+            if key in resolved:
+                offers = leg_table.get(key)
+                price = min(o.price_eur for o in offers) if offers else math.inf
+            else:
+                price = floors.get(key[:2], 0.0)
+            best = min(best, price)
+        total += best
+    return total
+
+
+async def _price_leg(
+    origin: str,
+    destination: str,
+    days: list[date],
+    direct_only: bool,
+    semaphore: asyncio.Semaphore,
+    providers_in_order: list,
+    deadline: Deadline,
+) -> dict[LegKey, list[FlightOffer]]:
+    """
+    Offers for one leg over a run of consecutive days using the provider
+    cascade (SerpAPI → Amadeus): the first provider answering with at least
+    one offer wins. Keyed per departure day, the granularity of flight_cache
+    rows; days without offers are omitted.
+
+    Raises:
+        TimeoutError: the deadline expired (the leg is unpriced, not empty).
+    """
     async with semaphore:
-        offers: list[FlightOffer] = []
         for provider_name, provider in providers_in_order:
+            if deadline.expired():
+                # checked before check_rate_limit: no quota for a call nobody waits for
+                raise TimeoutError("pricing deadline expired")
             rate_key = f"{provider_name}:monthly"
             allowed = await check_rate_limit(
-                rate_key, PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW
+                rate_key, PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW,
+                cost=quota_units(provider_name, days[0], days[-1]),
             )
             if not allowed:
                 continue
             try:
-                offers = await provider.search_multi_city(legs)
+                offers = await deadline.run(provider.search_one_way(
+                    origin, destination, days[0], days[-1],
+                    direct_only=direct_only, max_results=10 * len(days),
+                ))
                 if offers:
-                    break
+                    return {
+                        (origin, destination, day): day_offers
+                        for day, day_offers in split_by_departure_date(offers, days).items()
+                    }
+            except TimeoutError:
+                raise
             except Exception as exc:
                 logger.warning(
-                    "Provider %s failed for itinerary %s: %s", provider_name, route, exc
+                    "Provider %s failed for leg %s→%s %s..%s: %s",
+                    provider_name, origin, destination, days[0], days[-1], exc,
                 )
                 continue
+    return {}
+
+
+async def _price_ticket(
+    keys: list[LegKey],
+    direct_only: bool,
+    semaphore: asyncio.Semaphore,
+    providers_in_order: list,
+    deadline: Deadline,
+) -> tuple[dict[LegKey, list[FlightOffer]], dict[LegKey, list[FlightOffer]]]:
+    """
+    The legs of one route (travel order) priced together as a multi-city
+    ticket by the first provider's search_legs(): one quota unit per upstream
+    call (see FlightProvider.max_legs_per_call). The legs it leaves without
+    offers — all of them if it is out of quota or fails — are priced one way
+    through the whole cascade, the same provider first, as in _price_leg().
+
+    Returns:
+        (ticket offers, valid for this route only; one-way offers)
+
+    Raises:
+        TimeoutError: the deadline expired.
+    """
+    provider_name, provider = providers_in_order[0]
+    ticket: dict[LegKey, list[FlightOffer]] = {}
+    async with semaphore:
+        if deadline.expired():
+            raise TimeoutError("pricing deadline expired")
+        allowed = await check_rate_limit(
+            f"{provider_name}:monthly", PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW,
+            cost=math.ceil(len(keys) / provider.max_legs_per_call),
+        )
+        if allowed:
+            try:
+                found = await deadline.run(provider.search_legs(
+                    [Leg(origin=o, destination=d, date=day) for o, d, day in keys], direct_only=direct_only,
+                ))
+                ticket = {key: found[key] for key in keys if found.get(key)}
+            except TimeoutError:
+                raise
+            except Exception as exc:
+                logger.warning("Provider %s failed for a ticket of %d legs: %s", provider_name, len(keys), exc)
+
+    results = await asyncio.gather(*[
+        _price_leg(o, d, [day], direct_only, semaphore, providers_in_order, deadline)
+        for o, d, day in keys
+        if (o, d, day) not in ticket
+    ])
+    return ticket, {key: offers for entries in results for key, offers in entries.items()}
+
+
+def _provider_calls(
+    suggestions: list[SuggestedItinerary],
+    origin: str,
+    date_from: date,
+    date_to: date,
+    trip_duration_days: int,
+    flex_days: int,
+) -> int:
+    """Provider calls pricing `suggestions` would take with an empty cache (one per run of days per pair)."""
+    days_by_pair: dict[tuple[str, str], set[date]] = {}
+    for suggested in suggestions:
+        legs = _itinerary_legs(suggested, origin, date_from, trip_duration_days)
+        if not legs:
+            continue
+        for leg, days in zip(legs, _candidate_dates(legs, date_from, date_to, flex_days)):
+            days_by_pair.setdefault((leg.origin, leg.destination), set()).update(days)
+    return sum(len(_date_runs(list(days))) for days in days_by_pair.values())
+
+
+def _prefetch_runs(
+    area: AreaResult,
+    origin: str,
+    date_from: date,
+    date_to: date,
+    trip_duration_days: int,
+    flex_days: int,
+) -> list[LegRun]:
+    """
+    Provider calls worth making before the candidate routes are known: every
+    route leaves from and returns to the origin, mostly via its closest
+    airports. First leg to and last leg from each of the _PREFETCH_AIRPORTS
+    closest ones, on the dates of a route with area.num_stops stops.
+    """
+    dates = _leg_dates(date_from, trip_duration_days, area.num_stops + 1)
+    runs: list[LegRun] = []
+    for airport in area.airports[:_PREFETCH_AIRPORTS]:
+        legs = [
+            Leg(origin=origin, destination=airport.iata_code, date=dates[0]),
+            Leg(origin=airport.iata_code, destination=origin, date=dates[-1]),
+        ]
+        for leg, days in zip(legs, _candidate_dates(legs, date_from, date_to, flex_days)):
+            runs.extend(((leg.origin, leg.destination), run) for run in _date_runs(days))
+    return runs
+
+
+async def _start_prefetch(
+    session: AsyncSession,
+    runs: list[LegRun],
+    direct_only: bool,
+    providers_in_order: list,
+    deadline: Deadline,
+) -> dict[asyncio.Task, list[LegKey]]:
+    """
+    Starts the speculative calls of `runs` not already answered by flight_cache,
+    within the quota budget. Returns the running tasks (see _iter_leg_prices).
+    """
+    if not runs:
+        return {}
+    quotas = await get_provider_quotas()
+    spare = [
+        (name, provider)
+        for name, provider in providers_in_order
+        if quotas.get(name, 0) > math.ceil(PROVIDER_LIMITS[name] * _PREFETCH_QUOTA_RESERVE)
+    ]
+    if not spare:
+        return {}
+
+    cached = await get_cached_many(session, [(o, d, day) for (o, d), run in runs for day in run])
+    missing: list[LegRun] = [
+        ((o, d), days)
+        for (o, d), run in runs
+        for days in _date_runs([day for day in run if (o, d, day) not in cached])
+    ][:_PREFETCH_MAX_CALLS]
+
+    # the session stays with the caller: _price_leg only talks to providers and Redis
+    semaphore = asyncio.Semaphore(get_limiter(spare[0][0]).limit)
+    return {
+        asyncio.create_task(_price_leg(o, d, days, direct_only, semaphore, spare, deadline)): [
+            (o, d, day) for day in days
+        ]
+        for (o, d), days in missing
+    }
+
+
+def _cancel_all(tasks) -> None:
+    for task in tasks:
+        task.cancel()
+
+
+async def _iter_leg_prices(
+    session: AsyncSession,
+    keys: list[LegKey],
+    direct_only: bool,
+    providers_in_order: list,
+    needed: set[LegKey] | None = None,
+    deadline: Deadline | None = None,
+    started: dict[asyncio.Task, list[LegKey]] | None = None,
+    tickets: dict[int, list[LegKey]] | None = None,
+) -> AsyncIterator[tuple[int | None, set[LegKey], dict[LegKey, list[FlightOffer]], bool]]:
+    """
+    Prices every unique leg of the request once. Itineraries suggested by the
+    LLM share many legs (same origin, same first date): each one is fetched a
+    single time and reused by all the itineraries containing it.
+
+    Read-through / write-through on flight_cache: legs already cached (e.g. by
+    a reverse search minutes ago) cost no provider call, and the offers fetched
+    here are saved for the other search engines. Lookups are batched across
+    dates: one cache query for every key, one provider call per run of
+    consecutive missing days of the same origin/destination pair.
+
+    `tickets` ({route: its leg keys, in travel order}, one date per leg) are
+    used when the first provider prices several legs per call
+    (max_legs_per_call > 1: Apify multi-city runs, Amadeus multi-city POSTs):
+    the missing legs of each route are priced as one multi-city ticket of that
+    route (_price_ticket). A ticket price belongs to its route only, so a leg
+    shared by two routes is in both tickets; it is never cached.
+
+    Yields, as soon as they are known:
+        (route, keys resolved, {key: offers} for the resolved keys with offers, from_cache)
+        — first the cache hits, then the provider calls as they complete.
+        route is None for one-way offers, valid for every route, or the route
+        a ticket was priced for.
+
+    `needed`, if given, is updated by the consumer between items: provider
+    calls are started only for the keys still in it, and calls whose keys all
+    left it are cancelled (queued ones before they cost any quota).
+
+    When `deadline` expires the calls still running are cancelled and their
+    keys are never yielded: they stay unpriced.
+
+    `started` are _price_leg() calls already running (the speculative ones of
+    Step 2), with the keys they cover: they are awaited like the others instead
+    of calling again for their keys, and all their offers are saved, route or not.
+    """
+    deadline = deadline or Deadline.never()
+    # the started calls are this generator's from here: cancelled on any exit
+    calls: dict[asyncio.Task, list[LegKey]] = dict(started or {})
+    to_save: dict[LegKey, list[FlightOffer]] = {}
+    try:
+        cached: dict[LegKey, list[FlightOffer]] = {}
+        for key, (offers, _) in (await get_cached_many(session, keys)).items():
+            if direct_only:
+                offers = [o for o in offers if o.direct]
+            if offers:
+                cached[key] = offers
+        yield None, set(cached), cached, True
+
+        in_flight = {key for run_keys in calls.values() for key in run_keys}
+
+        def _missing(candidates: list[LegKey]) -> list[LegKey]:
+            return [
+                key for key in candidates
+                if key not in cached and key not in in_flight and (needed is None or key in needed)
+            ]
+
+        # Leg calls in flight for this request: as many as the first provider's adaptive
+        # limit right now. The limiter gates the HTTP calls themselves; this cap keeps
+        # the quota spent ahead of pruning to what the upstream can serve anyway.
+        first_provider = providers_in_order[0][0] if providers_in_order else None
+        semaphore = asyncio.Semaphore(get_limiter(first_provider).limit if first_provider else 1)
+        batch_size = providers_in_order[0][1].max_legs_per_call if providers_in_order else 1
+        ticket_routes: dict[asyncio.Task, int] = {}
+        in_tickets: set[LegKey] = set()
+        if tickets and batch_size > 1:
+            for route, route_keys in tickets.items():
+                ticket_keys = _missing(route_keys)
+                if not ticket_keys:
+                    continue
+                task = asyncio.create_task(
+                    _price_ticket(ticket_keys, direct_only, semaphore, providers_in_order, deadline)
+                )
+                calls[task] = ticket_keys
+                ticket_routes[task] = route
+                in_tickets.update(ticket_keys)
+
+        missing_days: dict[tuple[str, str], list[date]] = {}
+        for origin, destination, day in _missing(keys):
+            if (origin, destination, day) not in in_tickets:
+                missing_days.setdefault((origin, destination), []).append(day)
+        for (o, d), days in missing_days.items():
+            for run in _date_runs(days):
+                calls[asyncio.create_task(
+                    _price_leg(o, d, run, direct_only, semaphore, providers_in_order, deadline)
+                )] = [(o, d, day) for day in run]
+
+        while calls:
+            if needed is not None:
+                for task, run_keys in list(calls.items()):
+                    if not task.done() and not any(key in needed for key in run_keys):
+                        task.cancel()
+                        del calls[task]
+                        ticket_routes.pop(task, None)
+                if not calls:
+                    break
+            done, _ = await asyncio.wait(calls, timeout=deadline.timeout(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                run_keys = calls.pop(task)
+                route = ticket_routes.pop(task, None)
+                if isinstance(task.exception(), TimeoutError):
+                    continue
+                if route is None:
+                    entries = task.result() if task.exception() is None else {}
+                    to_save.update(entries)
+                    yield None, set(run_keys), entries, False
+                    continue
+                ticket: dict[LegKey, list[FlightOffer]] = {}
+                if task.exception() is None:
+                    ticket, one_way = task.result()
+                    # the legs missing from the ticket were priced one way
+                    to_save.update(one_way)
+                    yield None, set(run_keys) - set(ticket), one_way, False
+                yield route, set(run_keys), ticket, False
+    finally:
+        # deadline reached or consumer gone early (e.g. streaming client
+        # disconnected): no orphan provider calls
+        _cancel_all(calls)
+
+    await save_to_cache_many(session, to_save)
+
+
+def _assemble_itinerary(
+    legs: list[Leg],
+    leg_table: dict[LegKey, list[FlightOffer]],
+    candidates: list[list[date]] | None = None,
+    flex_days: int = 0,
+) -> list[FlightOffer] | None:
+    """
+    Cheapest offer for each leg of the itinerary, on the cheapest feasible
+    combination of candidate dates. None if some leg has no offer on any usable date.
+    """
+    candidates = candidates or [[leg.date] for leg in legs]
+    cheapest: list[dict[date, FlightOffer]] = []
+    for leg, days in zip(legs, candidates):
+        per_day = {}
+        for day in days:
+            leg_offers = leg_table.get((leg.origin, leg.destination, day))
+            if leg_offers:
+                per_day[day] = min(leg_offers, key=lambda o: o.price_eur)
+        if not per_day:
+            return None
+        cheapest.append(per_day)
 
-    if len(offers) < num_legs:
+    dates = _cheapest_date_combination(
+        [{day: o.price_eur for day, o in per_day.items()} for per_day in cheapest],
+        _stay_bounds(legs, flex_days),
+    )
+    if dates is None:
         return None
+    return [per_day[day] for per_day, day in zip(cheapest, dates)]
+
+
+def _itinerary_out(
+    rank: int,
+    suggested: SuggestedItinerary,
+    offers: list[FlightOffer],
+    total_per_person: float,
+    travelers: int,
+    trip_duration_days: int,
+    flex_days: int,
+) -> ItineraryOut:
+    legs_out = [
+        LegOut(
+            from_airport=o.origin,
+            to_airport=o.destination,
+            price_per_person_eur=o.price_eur,
+            airline=o.airline,
+            departure=o.departure,
+            duration_minutes=o.duration_minutes,
+            direct=o.direct,
+        )
+        for o in offers
+    ]
+    num_stops_in_route = len(suggested.route) - 2
+    if flex_days > 0:
+        # stop lengths follow the dates actually picked
+        leg_days = [date.fromisoformat(o.departure[:10]) for o in offers]
+        days_per_stop = [(b - a).days for a, b in zip(leg_days, leg_days[1:])]
+    else:
+        days_per_stop = _days_per_stop(trip_duration_days, num_stops_in_route)
+    return ItineraryOut(
+        rank=rank,
+        route=suggested.route,
+        total_price_per_person_eur=round(total_per_person, 2),
+        total_price_all_travelers_eur=round(total_per_person * travelers, 2),
+        legs=legs_out,
+        ai_notes=suggested.reasoning,
+        suggested_days_per_stop=days_per_stop,
+    )
+
+
+def _no_results_error(
+    n_no_data: int,
+    n_over_budget: int,
+    budget_per_person_eur: float,
+    engine: str,
+    num_stops: int,
+) -> ValueError:
+    """The error explaining why no itinerary survived Steps 3-4."""
+    if n_no_data > 0 and n_over_budget == 0:
+        return ValueError(
+            f"Il provider non ha trovato voli per le rotte suggerite dall'AI "
+            f"({n_no_data} itinerari senza copertura). "
+            "Prova date diverse, un'origine con più connessioni, o cambia provider."
+        )
+    if n_over_budget > 0 and n_no_data == 0:
+        return ValueError(
+            f"Trovati {n_over_budget} itinerari ma tutti oltre il budget di "
+            f"€{budget_per_person_eur:.0f}/persona. "
+            "Prova ad aumentare il budget o la durata del viaggio."
+        )
+    if n_no_data > 0 and n_over_budget > 0:
+        return ValueError(
+            f"No valid itineraries: {n_no_data} without flight coverage, "
+            f"{n_over_budget} over the budget of €{budget_per_person_eur:.0f}/person. "
+            "Try different dates or increase the budget."
+        )
+    if engine == "graph":
+        return ValueError(
+            "Not enough reachable airports to build an itinerary with "
+            f"{num_stops} stops. Try a longer trip or a different origin."
+        )
+    return ValueError(
+        "The AI did not generate valid itineraries for the provided parameters. "
+        "Try a different origin or different dates."
+    )
 
-    return (suggested, offers)
+
+async def _provider_status(active_provider: str) -> ProviderStatus:
+    quotas = await get_provider_quotas()
+    return ProviderStatus(
+        active_provider=active_provider,
+        serpapi_remaining=quotas.get("serpapi", 0),
+        amadeus_remaining=quotas.get("amadeus", 0),
+        note=PROVIDER_NOTES.get(active_provider, ""),
+    )
+
+
+def _offer_keys(route: list[str], offers: list[FlightOffer]) -> list[LegKey]:
+    """flight_cache keys the offers of an itinerary were read from (actual departure days)."""
+    return [
+        (route[i], route[i + 1], date.fromisoformat(o.departure[:10]))
+        for i, o in enumerate(offers)
+    ]
+
+
+async def _replay_cached_result(
+    cached: CachedResult,
+    origin: str,
+    trip_duration_days: int,
+    budget_per_person_eur: float,
+    travelers: int,
+    engine: str,
+    flex_days: int,
+) -> AsyncIterator[tuple[str, object]]:
+    """The events of stream_smart_multi() rebuilt from a result cache entry."""
+    t_start = time.perf_counter()
+    within_budget = [it for it in cached.itineraries if it.total_per_person <= budget_per_person_eur]
+    top5 = within_budget[:5]
+
+    yield "candidates", [it.suggested.route for it in cached.itineraries]
+    for rank, it in enumerate(top5, start=1):
+        yield "itinerary", {
+            "itinerary": _itinerary_out(
+                rank, it.suggested, it.offers, it.total_per_person, travelers, trip_duration_days, flex_days
+            ),
+            "ranking": [
+                {"route": r.suggested.route, "total_price_per_person_eur": round(r.total_per_person, 2)}
+                for r in top5[:rank]
+            ],
+        }
+
+    providers_in_order = await get_providers_in_order()
+    active_provider = providers_in_order[0][0] if providers_in_order else "none"
+    logger.info(json.dumps({
+        "event": "smart_multi_timing",
+        "origin": origin,
+        "trip_duration_days": trip_duration_days,
+        "budget_eur": budget_per_person_eur,
+        "travelers": travelers,
+        "provider": active_provider,
+        "engine": engine,
+        "flex_days": flex_days,
+        "result_cache": "hit",
+        "routes_over_budget": len(cached.itineraries) - len(within_budget),
+        "routes_returned": len(top5),
+        "result": "success" if top5 else "no_results",
+        "total_ms": int((time.perf_counter() - t_start) * 1000),
+    }))
+
+    if not top5:
+        raise _no_results_error(0, len(cached.itineraries), budget_per_person_eur, engine, 0)
+
+    yield "done", SmartMultiOut(
+        origin=origin,
+        itineraries=[
+            _itinerary_out(rank, it.suggested, it.offers, it.total_per_person, travelers, trip_duration_days, flex_days)
+            for rank, it in enumerate(top5, start=1)
+        ],
+        provider_status=await _provider_status(active_provider),
+        cached=True,
+    )
 
 
 # ---------------------------------------------------------------------------
 # Public entry point
 # ---------------------------------------------------------------------------
 
-async def run_smart_multi(
+async def stream_smart_multi(
     session: AsyncSession,
     origin: str,
     trip_duration_days: int,
@@ -161,19 +802,55 @@ async def run_smart_multi(
     date_from: date,
     date_to: date,
     direct_only: bool = False,
-) -> SmartMultiOut:
+    engine: str = "llm",
+    flex_days: int = 0,
+    deadline: Deadline | None = None,
+) -> AsyncIterator[tuple[str, object]]:
     """
-    Full Smart Multi-City pipeline.
+    Full Smart Multi-City pipeline, as a sequence of progress events:
 
-    Returns:
-        SmartMultiOut with the top 5 itineraries sorted by price + provider_status.
+        ("candidates", [route, ...])          right after Step 2 (valid routes only)
+        ("itinerary",  {"itinerary": ItineraryOut, "ranking": [...]})
+                                              each time a route is fully priced and
+                                              within budget; rank and ranking are the
+                                              running top 5 at that moment
+        ("done",       SmartMultiOut)         final top 5 + provider_status; partial=True
+                                              if the deadline stopped the pricing
+
+    Args:
+        engine:    "llm" (candidates from the AI) or "graph" (deterministic graph search)
+        flex_days: each leg may move ±flex_days (within date_from..date_to); the
+                   cheapest date combination is picked per route. 0 = fixed dates.
+        deadline:  request deadline, split between the steps (None = no limit).
+                   When pricing runs out of time the itineraries priced so far
+                   are returned, flagged as partial.
+
+    Searches with the same origin, duration, dates, direct_only, engine and
+    flex_days and a budget up to a stored one are replayed from the result
+    cache: same events, SmartMultiOut.cached=True.
+
+    Raises:
+        ValueError:   origin unknown, or no itinerary survives pricing/budget.
+        RuntimeError: every LLM provider failed.
+        TimeoutError: the deadline expired before Step 2 finished, or before
+                      any itinerary could be priced.
     """
+    deadline = deadline or Deadline.never()
+
+    cache_key = result_key(origin, trip_duration_days, date_from, date_to, direct_only, engine, flex_days)
+    cached = await get_result(cache_key)
+    if cached is not None and budget_per_person_eur <= cached.budget_per_person_eur:
+        async for item in _replay_cached_result(
+            cached, origin, trip_duration_days, budget_per_person_eur, travelers, engine, flex_days
+        ):
+            yield item
+        return
 
     t_start = time.perf_counter()
 
     # ── Step 1: explorable area
     t1 = time.perf_counter()
-    explorable_area_details: AreaResult = await calculate_area(session, origin, trip_duration_days)
+    explorable_area_details: AreaResult = await calculate_area(session, origin, trip_duration_days, deadline)
     t_area_ms = int((time.perf_counter() - t1) * 1000)
 
     # ── Cascade provider setup (done before Step 2 to compute the provider_hint)
@@ -185,55 +862,197 @@ async def run_smart_multi(
     only_amadeus = provider_names == ["amadeus"]
     provider_hint = _AMADEUS_PROVIDER_HINT if only_amadeus else ""
 
-    # ── Step 2: itinerary generation via AI
-    allowed_num_legs = explorable_area_details.num_stops + 1
-    budget_per_leg = budget_per_person_eur / allowed_num_legs
-    season = _season_from_date(date_from)
+    # ── Step 2: candidate itineraries — graph search or AI
+    t2 = time.perf_counter()
+    plan_deadline = deadline.share(_PLAN_DEADLINE_SHARE)
+    prefetch: dict[asyncio.Task, list[LegKey]] = {}
+    if engine == "graph":
+        suggestions: list[SuggestedItinerary] = await plan_deadline.run(suggest_itineraries(
+            session,
+            explorable_area_details,
+            _leg_dates(date_from, trip_duration_days, explorable_area_details.num_stops + 1),
+            direct_only=direct_only,
+        ))
+    else:
+        allowed_num_legs = explorable_area_details.num_stops + 1
+        budget_per_leg = budget_per_person_eur / allowed_num_legs
+        season = _season_from_date(date_from)
 
-    airports_for_llm = explorable_area_details.airports[:_MAX_AIRPORTS_FOR_LLM]
-    available_airports = [f"{a.iata_code} ({a.city})" for a in airports_for_llm]
+        airports_for_llm = explorable_area_details.airports[:_MAX_AIRPORTS_FOR_LLM]
+        available_airports = [f"{a.iata_code} ({a.city})" for a in airports_for_llm]
 
-    t2 = time.perf_counter()
-    suggestions: list[SuggestedItinerary] = await generate_with_fallback(
-        origin=origin,
-        duration_days=trip_duration_days,
-        budget_per_leg=budget_per_leg,
-        season=season,
-        num_stops=explorable_area_details.num_stops,
-        available_airports=available_airports,
-        provider_hint=provider_hint,
-    )
-    t_llm_ms = int((time.perf_counter() - t2) * 1000)
+        # the AI takes seconds: meanwhile, price the legs most routes will start and end with
+        prefetch = await _start_prefetch(
+            session,
+            _prefetch_runs(explorable_area_details, origin, date_from, date_to, trip_duration_days, flex_days),
+            direct_only,
+            providers_in_order,
+            deadline,
+        )
+        try:
+            suggestions = await generate_with_fallback(
+                origin=origin,
+                duration_days=trip_duration_days,
+                budget_per_leg=budget_per_leg,
+                season=season,
+                num_stops=explorable_area_details.num_stops,
+                available_airports=available_airports,
+                provider_hint=provider_hint,
+                deadline=plan_deadline,
+            )
+        except BaseException:
+            _cancel_all(prefetch)
+            raise
+    t_plan_ms = int((time.perf_counter() - t2) * 1000)
 
-    # ── Step 3: real price check (parallel, with concurrency limit)
-    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_PRICING)
-    tasks = [
-        _price_itinerary(
-            s, origin, date_from, trip_duration_days, direct_only, semaphore, providers_in_order
+    # ── Step 2b: geographic sanity check of the AI routes, before any quota is spent on them
+    n_rejected = n_reordered = n_calls_saved = 0
+    if engine != "graph":
+        well_formed = [s for s in suggestions if _is_valid_route(s.route, origin)]
+        try:
+            screened = await screen_routes(session, well_formed, explorable_area_details)
+        except BaseException:
+            _cancel_all(prefetch)
+            raise
+        n_rejected = sum(screened.dropped.values())
+        n_reordered = screened.reordered
+        n_calls_saved = (
+            _provider_calls(well_formed, origin, date_from, date_to, trip_duration_days, flex_days)
+            - _provider_calls(screened.suggestions, origin, date_from, date_to, trip_duration_days, flex_days)
         )
-        for s in suggestions
-    ]
-    t3 = time.perf_counter()
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    t_pricing_ms = int((time.perf_counter() - t3) * 1000)
+        # malformed routes stay in: Step 4 counts them as before
+        suggestions = screened.suggestions + [s for s in suggestions if not _is_valid_route(s.route, origin)]
+
+    # ── Step 3: real price check — unique legs priced once (parallel, with concurrency limit)
+    plans: list[tuple[SuggestedItinerary, list[Leg] | None, list[list[date]] | None]] = []
+    unique_legs: dict[LegKey, None] = {}
+    for suggested in suggestions:
+        legs = _itinerary_legs(suggested, origin, date_from, trip_duration_days)
+        candidates = _candidate_dates(legs, date_from, date_to, flex_days) if legs else None
+        plans.append((suggested, legs, candidates))
+        for leg, days in zip(legs or [], candidates or []):
+            for day in days:
+                unique_legs[(leg.origin, leg.destination, day)] = None
+
+    # speculative calls: the finished ones are kept (their offers get saved), the
+    # running ones only if some route needs their legs
+    n_prefetch_calls = len(prefetch)
+    for task, run_keys in list(prefetch.items()):
+        if not task.done() and not any(key in unique_legs for key in run_keys):
+            task.cancel()
+            del prefetch[task]
+    n_prefetch_used = sum(1 for run_keys in prefetch.values() if any(key in unique_legs for key in run_keys))
 
-    # ── Step 4: budget filtering + ranking
-    n_no_data = 0
+    try:
+        yield "candidates", [suggested.route for suggested, legs, _ in plans if legs]
+    except BaseException:
+        # consumer gone before Step 3 adopted them
+        _cancel_all(prefetch)
+        raise
+
+    # ── Step 4: budget filtering + ranking, route by route as its legs get priced
+    n_no_data = sum(1 for _, legs, _ in plans if not legs)
     n_over_budget = 0
+    n_pruned = 0
+    n_legs_cached = 0
 
+    # keys of each leg (one per candidate date) of the routes still in play
+    live: dict[int, list[list[LegKey]]] = {
+        i: [[(leg.origin, leg.destination, day) for day in days] for leg, days in zip(legs, candidates)]
+        for i, (_, legs, candidates) in enumerate(plans)
+        if legs
+    }
+    needed: set[LegKey] = set(unique_legs)
+    resolved: set[LegKey] = set()
+    leg_table: dict[LegKey, list[FlightOffer]] = {}
+    # multi-city ticket offers, each valid for the route it was priced for only
+    ticket_tables: dict[int, dict[LegKey, list[FlightOffer]]] = {}
+    ticket_resolved: dict[int, set[LegKey]] = {}
+    # a multi-city ticket takes one date per leg
+    tickets = {i: [keys[0] for keys in leg_keys] for i, leg_keys in live.items()} if flex_days == 0 else None
     priced: list[tuple[SuggestedItinerary, list[FlightOffer], float]] = []
-    for res in results:
-        if res is None or isinstance(res, Exception):
-            n_no_data += 1
-            continue
-        suggested, offers = res
-        total_per_person = sum(o.price_eur for o in offers)
-        if total_per_person > budget_per_person_eur:
-            n_over_budget += 1
-            continue
-        priced.append((suggested, offers, total_per_person))
 
-    priced.sort(key=lambda x: x[2])
+    def _route_view(i: int) -> tuple[dict[LegKey, list[FlightOffer]], set[LegKey]]:
+        """Offers and resolved keys as seen by route i: one-way fares plus its own ticket."""
+        if i not in ticket_tables and i not in ticket_resolved:
+            return leg_table, resolved
+        return {**leg_table, **ticket_tables.get(i, {})}, resolved | ticket_resolved.get(i, set())
+
+    t3 = time.perf_counter()
+    try:
+        cheapest_seen = await cheapest_seen_many(
+            session, list({key[:2]: None for key in unique_legs}), _FLOOR_HISTORY_DAYS
+        )
+    except BaseException:
+        # last await before Step 3 adopts the speculative calls
+        _cancel_all(prefetch)
+        raise
+    floors = {pair: price * _FLOOR_HISTORY_RATIO for pair, price in cheapest_seen.items()}
+    pricing_deadline = deadline.share(1.0, reserve_s=_RESPONSE_RESERVE_S)
+    async for route, batch, entries, from_cache in _iter_leg_prices(
+        session, list(unique_legs), direct_only, providers_in_order, needed, pricing_deadline, prefetch, tickets
+    ):
+        if route is None:
+            leg_table.update(entries)
+            resolved |= batch
+        else:
+            ticket_tables.setdefault(route, {}).update(entries)
+            ticket_resolved.setdefault(route, set()).update(batch)
+        if from_cache:
+            n_legs_cached = len(entries)
+
+        # routes fully priced: exact total
+        for i in [
+            i for i, leg_keys in live.items()
+            if all(k in _route_view(i)[1] for keys in leg_keys for k in keys)
+        ]:
+            del live[i]
+            suggested, legs, candidates = plans[i]
+            offers = _assemble_itinerary(legs, _route_view(i)[0], candidates, flex_days)
+            if offers is None:
+                n_no_data += 1
+                continue
+            total_per_person = sum(o.price_eur for o in offers)
+            if total_per_person > budget_per_person_eur:
+                n_over_budget += 1
+                continue
+            priced.append((suggested, offers, total_per_person))
+            priced.sort(key=lambda x: x[2])
+            rank = next(r for r, p in enumerate(priced, start=1) if p[0] is suggested)
+            if rank <= 5:
+                yield "itinerary", {
+                    "itinerary": _itinerary_out(
+                        rank, suggested, offers, total_per_person, travelers, trip_duration_days, flex_days
+                    ),
+                    "ranking": [
+                        {"route": s.route, "total_price_per_person_eur": round(total, 2)}
+                        for s, _, total in priced[:5]
+                    ],
+                }
+
+        # routes still pricing: drop them as soon as they cannot make the top 5
+        fifth_best = priced[4][2] if len(priced) >= 5 else math.inf
+        for i, leg_keys in list(live.items()):
+            bound = _route_lower_bound(leg_keys, *_route_view(i), floors)
+            if bound == math.inf:
+                n_no_data += 1
+            elif bound > budget_per_person_eur:
+                n_over_budget += 1
+            elif bound > fifth_best:
+                n_pruned += 1
+            else:
+                continue
+            del live[i]
+
+        # what the surviving routes still wait for; the rest is cancelled
+        needed.clear()
+        needed.update(
+            k for i, leg_keys in live.items() for keys in leg_keys for k in keys if k not in _route_view(i)[1]
+        )
+    t_pricing_ms = int((time.perf_counter() - t3) * 1000)
+
+    # routes still live here were cut off by the deadline before being fully priced
+    partial = bool(live)
     top5 = priced[:5]
 
     total_ms = int((time.perf_counter() - t_start) * 1000)
@@ -244,75 +1063,87 @@ async def run_smart_multi(
         "budget_eur": budget_per_person_eur,
         "travelers": travelers,
         "provider": active_provider,
+        "result_cache": "miss",
         "step_area_ms": t_area_ms,
-        "step_llm_ms": t_llm_ms,
+        "engine": engine,
+        "step_llm_ms": t_plan_ms if engine != "graph" else 0,
+        "step_graph_ms": t_plan_ms if engine == "graph" else 0,
         "step_pricing_ms": t_pricing_ms,
-        "routes_suggested": len(suggestions),
+        "routes_suggested": len(suggestions) + n_rejected,
+        "routes_rejected": n_rejected,
+        "routes_reordered": n_reordered,
+        "provider_calls_saved": n_calls_saved,
+        "flex_days": flex_days,
+        "legs_total": sum(len(legs or []) for _, legs, _ in plans),
+        "legs_unique": len(unique_legs),
+        "legs_cached": n_legs_cached,
+        "prefetch_calls": n_prefetch_calls,
+        "prefetch_calls_used": n_prefetch_used,
         "routes_no_data": n_no_data,
         "routes_over_budget": n_over_budget,
+        "routes_pruned": n_pruned,
+        "routes_unpriced": len(live),
         "routes_returned": len(top5),
-        "result": "success" if top5 else "no_results",
+        "result": ("partial" if partial else "success") if top5 else ("timeout" if partial else "no_results"),
         "total_ms": total_ms,
     }))
 
+    if not top5 and partial:
+        raise TimeoutError("pricing deadline expired before any itinerary was priced")
     if not top5:
-        if n_no_data > 0 and n_over_budget == 0:
-            raise ValueError(
-                f"Il provider non ha trovato voli per le rotte suggerite dall'AI "
-                f"({n_no_data} itinerari senza copertura). "
-                "Prova date diverse, un'origine con più connessioni, o cambia provider."
-            )
-        if n_over_budget > 0 and n_no_data == 0:
-            raise ValueError(
-                f"Trovati {n_over_budget} itinerari ma tutti oltre il budget di "
-                f"€{budget_per_person_eur:.0f}/persona. "
-                "Prova ad aumentare il budget o la durata del viaggio."
-            )
-        if n_no_data > 0 and n_over_budget > 0:
-            raise ValueError(
-                f"No valid itineraries: {n_no_data} without flight coverage, "
-                f"{n_over_budget} over the budget of €{budget_per_person_eur:.0f}/person. "
-                "Try different dates or increase the budget."
-            )
-        raise ValueError(
-            "The AI did not generate valid itineraries for the provided parameters. "
-            "Try a different origin or different dates."
+        raise _no_results_error(
+            n_no_data, n_over_budget, budget_per_person_eur, engine, explorable_area_details.num_stops
         )
 
     # ── Step 5: build response
-    itineraries: list[ItineraryOut] = []
-    for rank, (suggested, offers, total_per_person) in enumerate(top5, start=1):
-        legs_out = [
-            LegOut(
-                from_airport=o.origin,
-                to_airport=o.destination,
-                price_per_person_eur=o.price_eur,
-                airline=o.airline,
-                departure=o.departure,
-                duration_minutes=o.duration_minutes,
-                direct=o.direct,
-            )
-            for o in offers
-        ]
-        num_stops_in_route = len(suggested.route) - 2
-        itineraries.append(
-            ItineraryOut(
-                rank=rank,
-                route=suggested.route,
-                total_price_per_person_eur=round(total_per_person, 2),
-                total_price_all_travelers_eur=round(total_per_person * travelers, 2),
-                legs=legs_out,
-                ai_notes=suggested.reasoning,
-                suggested_days_per_stop=_days_per_stop(trip_duration_days, num_stops_in_route),
-            )
+    itineraries = [
+        _itinerary_out(rank, suggested, offers, total_per_person, travelers, trip_duration_days, flex_days)
+        for rank, (suggested, offers, total_per_person) in enumerate(top5, start=1)
+    ]
+
+    if not partial:
+        # every route within budget that could rank is in `priced`: valid for any
+        # lower budget, until the first cache row behind its offers expires
+        expires_at = await earliest_expiry(
+            session, [k for suggested, offers, _ in priced for k in _offer_keys(suggested.route, offers)]
         )
+        if expires_at is not None:
+            await save_result(cache_key, CachedResult(
+                budget_per_person_eur=budget_per_person_eur,
+                itineraries=[CachedItinerary(suggested, offers, total) for suggested, offers, total in priced],
+            ), expires_at)
 
-    quotas = await get_provider_quotas()
-    provider_status = ProviderStatus(
-        active_provider=active_provider,
-        serpapi_remaining=quotas.get("serpapi", 0),
-        amadeus_remaining=quotas.get("amadeus", 0),
-        note=PROVIDER_NOTES.get(active_provider, ""),
+    yield "done", SmartMultiOut(
+        origin=origin,
+        itineraries=itineraries,
+        provider_status=await _provider_status(active_provider),
+        partial=partial,
     )
 
-    return SmartMultiOut(origin=origin, itineraries=itineraries, provider_status=provider_status)
+
+async def run_smart_multi(
+    session: AsyncSession,
+    origin: str,
+    trip_duration_days: int,
+    budget_per_person_eur: float,
+    travelers: int,
+    date_from: date,
+    date_to: date,
+    direct_only: bool = False,
+    engine: str = "llm",
+    flex_days: int = 0,
+    deadline: Deadline | None = None,
+) -> SmartMultiOut:
+    """
+    Full Smart Multi-City pipeline, answered in one piece (see stream_smart_multi).
+
+    Returns:
+        SmartMultiOut with the top 5 itineraries sorted by price + provider_status.
+    """
+    async for event, payload in stream_smart_multi(
+        session, origin, trip_duration_days, budget_per_person_eur, travelers,
+        date_from, date_to, direct_only=direct_only, engine=engine, flex_days=flex_days, deadline=deadline,
+    ):
+        if event == "done":
+            return payload
+    raise RuntimeError("Smart multi-city pipeline ended without a result")
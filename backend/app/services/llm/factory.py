@@ -16,6 +16,7 @@ from app.services.llm.base import SuggestedItinerary
 from app.services.llm.gemini import GeminiProvider
 from app.services.llm.groq import GroqProvider
 from app.services.llm.mistral import MistralProvider
+from app.utils.deadline import Deadline
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,7 @@ async def generate_with_fallback(
     num_stops: int,
     available_airports: list[str],
     provider_hint: str = "",
+    deadline: Deadline | None = None,
 ) -> list[SuggestedItinerary]:
     """
     Attempts the provider configured in LLM_PROVIDER; if it fails, falls back to backup providers.
@@ -43,16 +45,23 @@ async def generate_with_fallback(
     Args:
     provider_hint: optional constraint for the prompt (e.g., restrictions of the active provider).
                    Empty string = no additional constraint.
+    deadline:      time budget for the whole fallback chain (None = no limit):
+                   a slow provider is abandoned when it expires, and no backup
+                   is tried after that.
 
     Raises:
         RuntimeError: if all providers fail.
+        TimeoutError: if the deadline expires before any provider answers.
 """
+    deadline = deadline or Deadline.never()
     start = _FALLBACK_ORDER.index(settings.llm_provider)
 
     for name in _FALLBACK_ORDER[start:]:
+        if deadline.expired():
+            raise TimeoutError("LLM deadline expired")
         try:
             provider = _PROVIDERS[name]()
-            return await provider.generate_itineraries(
+            return await deadline.run(provider.generate_itineraries(
                 origin=origin,
                 duration_days=duration_days,
                 budget_per_leg=budget_per_leg,
@@ -60,9 +69,11 @@ async def generate_with_fallback(
                 num_stops=num_stops,
                 available_airports=available_airports,
                 provider_hint=provider_hint,
-            )
+            ))
         except Exception as exc:
             logger.warning("LLM provider '%s' failed: %s: %s", name, type(exc).__name__, exc)
             continue
 
+    if deadline.expired():
+        raise TimeoutError("LLM deadline expired")
     raise RuntimeError("None of the LLM providers are working.")
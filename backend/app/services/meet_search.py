@@ -0,0 +1,250 @@
+"""
+Core logic for Meet-in-the-Middle Search.
+
+A group travels from N different origins (typically 2-3) and wants the
+destination that minimises their combined fare (rank_by="total") or the
+fare of the unluckiest member (rank_by="max").
+
+Flow:
+  1. One aggregated query on flight_cache: DISTINCT ON (origin, destination)
+     returns the best valid row per route for all N origins at once — an
+     N×M fare matrix built from compact columns, no JSONB decoding.
+  2. Holes: destinations already reachable from some origins but not all.
+     The most promising ones (more origins covered, lower partial fare) are
+     completed through the provider cascade, max _MAX_NEW_CALLS_PER_SEARCH
+     calls per search. The budget left goes to destinations with no known
+     fare (a cold cache, a new set of origins), closest to the group first.
+  3. Destinations covered by every origin are scored and ranked.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import distinct_on
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.cache import is_fresh, save_to_cache_many, split_by_departure_date
+from app.models.airport import Airport
+from app.models.flight_cache import FlightCache
+from app.models.schemas import ProviderStatus
+from app.services.providers.base import FlightOffer
+from app.services.providers.factory import (
+    PROVIDER_NOTES,
+    get_provider_quotas,
+    get_providers_in_order,
+    search_one_way_cascade,
+)
+from app.utils.geo import haversine_km
+
+# Quota budget: maximum new provider calls per single search
+_MAX_NEW_CALLS_PER_SEARCH = 50
+
+
+@dataclass
+class RouteFare:
+    """Best known fare for one (origin, destination) route in the date window."""
+    price_eur: float
+    airline: str
+    departure_date: date
+
+
+def _score(fares: list[float], rank_by: str) -> float:
+    return max(fares) if rank_by == "max" else sum(fares)
+
+
+def _plan_holes(
+    origins: list[str],
+    matrix: dict[str, dict[str, RouteFare]],
+    rank_by: str,
+    limit: int,
+    unknown: list[str] = (),
+) -> list[tuple[str, str]]:
+    """
+    Chooses which (origin, destination) routes to fetch from the providers.
+
+    Destinations with at least one known fare come first, ordered by number
+    of missing origins (fewest first: cheapest to complete), then by the
+    score of the fares already known. Destinations with no known fare follow,
+    in the given order. Destinations are taken whole until the call budget is
+    exhausted: half-completing one wastes quota.
+
+    Args:
+        matrix:  {destination: {origin: RouteFare}}
+        unknown: destinations with no known fare, most promising first
+
+    Returns:
+        list of (origin, destination) routes, at most `limit`.
+    """
+    candidates: list[tuple[int, float, str, list[str]]] = []
+    for destination, by_origin in matrix.items():
+        missing = [o for o in origins if o not in by_origin]
+        if not missing:
+            continue
+        known = [f.price_eur for f in by_origin.values()]
+        candidates.append((len(missing), _score(known, rank_by), destination, missing))
+    candidates.sort(key=lambda c: (c[0], c[1]))
+    wanted = [(destination, missing) for _, _, destination, missing in candidates]
+    wanted += [(destination, origins) for destination in unknown if destination not in matrix]
+
+    plan: list[tuple[str, str]] = []
+    for destination, missing in wanted:
+        if len(plan) + len(missing) > limit:
+            break
+        plan.extend((o, destination) for o in missing)
+    return plan
+
+
+def _rank_destinations(
+    origins: list[str],
+    matrix: dict[str, dict[str, RouteFare]],
+    rank_by: str,
+    max_results: int,
+) -> list[tuple[str, float, dict[str, RouteFare]]]:
+    """Scores destinations reachable from every origin, best first."""
+    ranked = [
+        (destination, _score([by_origin[o].price_eur for o in origins], rank_by), by_origin)
+        for destination, by_origin in matrix.items()
+        if all(o in by_origin for o in origins)
+    ]
+    ranked.sort(key=lambda r: r[1])
+    return ranked[:max_results]
+
+
+async def meet_in_the_middle_search(
+    session: AsyncSession,
+    origins: list[str],
+    date_from: date,
+    date_to: date,
+    rank_by: str = "total",
+    direct_only: bool = False,
+    max_results: int = 20,
+) -> tuple[list[dict], bool, ProviderStatus]:
+    """
+    Finds the destinations that minimise the group fare from several origins.
+
+    Args:
+        origins: distinct IATA codes, one per travelling party
+        rank_by: "total" (sum of fares) or "max" (worst single fare)
+
+    Returns:
+        (results list, all_from_cache, provider_status)
+
+    Raises:
+        ValueError: if one of the origins is not an active airport.
+    """
+    # --- 1. Airports
+    airport_rows = await session.execute(select(Airport).where(Airport.is_active.is_(True)))
+    airport_map: dict[str, Airport] = {a.iata_code: a for a in airport_rows.scalars().all()}
+    unknown = [o for o in origins if o not in airport_map]
+    if unknown:
+        raise ValueError(f"Origin airport(s) {', '.join(unknown)} not found or inactive.")
+
+    date_list: list[date] = []
+    current = date_from
+    while current <= date_to and len(date_list) < 7:
+        date_list.append(current)
+        current += timedelta(days=1)
+
+    # --- 2. Best row per route for all origins, in one query
+    stmt = (
+        select(
+            FlightCache.origin,
+            FlightCache.destination,
+            FlightCache.price_eur,
+            FlightCache.airline,
+            FlightCache.departure_date,
+        )
+        .where(
+            FlightCache.origin.in_(origins),
+            FlightCache.destination.not_in(origins),
+            FlightCache.departure_date.in_(date_list),
+            is_fresh(),
+            FlightCache.price_eur.is_not(None),
+        )
+        .ext(distinct_on(FlightCache.origin, FlightCache.destination))
+        .order_by(FlightCache.origin, FlightCache.destination, FlightCache.price_eur)
+    )
+    if direct_only:
+        stmt = stmt.where(FlightCache.direct_flight.is_(True))
+
+    matrix: dict[str, dict[str, RouteFare]] = {}
+    for origin, destination, price, airline, departure_date in (await session.execute(stmt)).all():
+        if destination in airport_map:
+            matrix.setdefault(destination, {})[origin] = RouteFare(
+                float(price), airline or "", departure_date
+            )
+
+    # --- 3. Fill the holes of the most promising destinations, then try unknown
+    #        ones, those with the shortest total distance from the origins first
+    def _group_distance(code: str) -> float:
+        a = airport_map[code]
+        return sum(
+            haversine_km(airport_map[o].latitude, airport_map[o].longitude, a.latitude, a.longitude)
+            for o in origins
+        )
+
+    unknown = sorted(
+        (code for code in airport_map if code not in matrix and code not in origins),
+        key=_group_distance,
+    )
+    holes = _plan_holes(origins, matrix, rank_by, _MAX_NEW_CALLS_PER_SEARCH, unknown)
+
+    providers_in_order = await get_providers_in_order()
+    active_provider = providers_in_order[0][0] if providers_in_order else "none"
+
+    answers = await asyncio.gather(*[
+        search_one_way_cascade(
+            providers_in_order, origin, destination, date_from, date_to,
+            direct_only=direct_only, max_results=10,
+        )
+        for origin, destination in holes
+    ])
+
+    n_fresh = 0
+    to_save: dict[tuple[str, str, date], list[FlightOffer]] = {}
+    for (origin, destination), (_, offers) in zip(holes, answers):
+        if not offers:
+            continue
+        n_fresh += 1
+        for single_date, day_offers in split_by_departure_date(offers, date_list).items():
+            to_save[(origin, destination, single_date)] = day_offers
+        best = min(offers, key=lambda o: o.price_eur)
+        matrix.setdefault(destination, {})[origin] = RouteFare(
+            best.price_eur, best.airline, date.fromisoformat(best.departure[:10])
+        )
+    await save_to_cache_many(session, to_save)
+
+    # --- 4. Ranking
+    results: list[dict] = []
+    for destination, score, by_origin in _rank_destinations(origins, matrix, rank_by, max_results):
+        airport = airport_map[destination]
+        fares = [by_origin[o] for o in origins]
+        results.append({
+            "destination": destination,
+            "destination_city": airport.city,
+            "latitude": airport.latitude,
+            "longitude": airport.longitude,
+            "total_price_eur": round(sum(f.price_eur for f in fares), 2),
+            "max_price_eur": round(max(f.price_eur for f in fares), 2),
+            "fares": [
+                {
+                    "origin": o,
+                    "price_eur": f.price_eur,
+                    "airline": f.airline,
+                    "departure_date": f.departure_date,
+                }
+                for o, f in zip(origins, fares)
+            ],
+        })
+
+    # --- 5. Provider status
+    quotas = await get_provider_quotas()
+    provider_status = ProviderStatus(
+        active_provider=active_provider,
+        serpapi_remaining=quotas.get("serpapi", 0),
+        amadeus_remaining=quotas.get("amadeus", 0),
+        note=PROVIDER_NOTES.get(active_provider, ""),
+    )
+
+    return results, n_fresh == 0, provider_status
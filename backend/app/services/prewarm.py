@@ -0,0 +1,156 @@
+"""
+Background refresh-ahead of popular flight_cache rows.
+
+Without it every cache fill happens on a user request: the first search
+after a row expires pays the provider round-trip. During off-peak hours
+this task spends part of the spare provider quota re-fetching, shortly
+before they expire, the rows users are most likely to ask for next.
+
+Cycle (one worker at a time, Redis lock):
+    1. outside PREWARM_OFFPEAK_HOURS (UTC) → nothing to do
+    2. demand_ranking() on search_history: most searched destinations / origins
+    3. refresh_candidates(): future-departure rows of those airports whose
+       expires_at falls within the next PREWARM_REFRESH_LEAD_MINUTES,
+       highest demand first, soonest expiry first
+    4. one provider call at a time (never a burst competing with user
+       searches), at most PREWARM_MAX_CALLS_PER_CYCLE, and only through
+       providers with more than PREWARM_QUOTA_RESERVE of their monthly
+       limit left — the reserve is never touched by pre-warming
+    5. one save_to_cache_many() for everything fetched (new TTL, price_history, LRU invalidation)
+"""
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.cache import save_to_cache_many, split_by_departure_date
+from app.db.database import async_session_maker
+from app.db.memory_cache import CacheKey
+from app.db.redis import get_redis
+from app.db.search_history import demand_ranking
+from app.models.flight_cache import FlightCache
+from app.services.providers.base import FlightOffer, FlightProvider
+from app.services.providers.factory import (
+    PROVIDER_LIMITS,
+    get_provider_quotas,
+    get_providers_in_order,
+    search_one_way_cascade,
+)
+
+logger = logging.getLogger(__name__)
+
+_LOCK_KEY = "flight_cache:prewarm"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_offpeak(hour: int, window: str | None = None) -> bool:
+    """
+    True if `hour` (0-23, UTC) falls in the "start-end" window, end excluded.
+    The window may wrap midnight ("22-6"); "" disables pre-warming.
+    """
+    window = settings.prewarm_offpeak_hours if window is None else window
+    if not window:
+        return False
+    start, end = (int(h) for h in window.split("-"))
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+async def spare_providers() -> list[tuple[str, FlightProvider]]:
+    """Providers (cascade order) whose remaining quota is above the interactive reserve."""
+    quotas = await get_provider_quotas()
+    return [
+        (name, provider)
+        for name, provider in await get_providers_in_order()
+        if quotas.get(name, 0) > math.ceil(PROVIDER_LIMITS[name] * settings.prewarm_quota_reserve)
+    ]
+
+
+async def refresh_candidates(
+    session: AsyncSession,
+    destinations: dict[str, int],
+    origins: dict[str, int],
+    limit: int,
+) -> list[CacheKey]:
+    """
+    Keys of the rows about to expire on in-demand airports, best first.
+    A row scores the searches of its destination plus those of its origin.
+    """
+    if not destinations and not origins:
+        return []
+    now = _utcnow()
+    stmt = (
+        select(FlightCache.origin, FlightCache.destination, FlightCache.departure_date, FlightCache.expires_at)
+        .where(
+            FlightCache.departure_date >= now.date(),
+            FlightCache.expires_at > now,
+            FlightCache.expires_at <= now + timedelta(minutes=settings.prewarm_refresh_lead_minutes),
+            FlightCache.destination.in_(list(destinations)) | FlightCache.origin.in_(list(origins)),
+        )
+        .order_by(FlightCache.expires_at)
+        # more than needed: the demand ordering below picks the best of them
+        .limit(limit * 5)
+    )
+    rows = (await session.execute(stmt)).all()
+    ranked = sorted(
+        rows,
+        key=lambda r: (-(destinations.get(r.destination, 0) + origins.get(r.origin, 0)), r.expires_at),
+    )
+    return [(r.origin, r.destination, r.departure_date) for r in ranked[:limit]]
+
+
+async def run_prewarm_cycle(session: AsyncSession, now: datetime | None = None) -> dict:
+    """One refresh-ahead pass. Returns counters for the log."""
+    now = now or _utcnow()
+    if not is_offpeak(now.hour):
+        return {"skipped": "peak_hours"}
+
+    budget = settings.prewarm_max_calls_per_cycle
+    destinations, origins = await demand_ranking(
+        session, settings.prewarm_history_days, settings.prewarm_top_airports
+    )
+    candidates = await refresh_candidates(session, destinations, origins, budget)
+
+    calls = 0
+    to_save: dict[CacheKey, list[FlightOffer]] = {}
+    for origin, destination, departure_date in candidates:
+        # quotas re-read before every call: user searches keep consuming them meanwhile
+        providers = await spare_providers()
+        if not providers:
+            break
+        calls += 1
+        _, offers = await search_one_way_cascade(
+            providers, origin, destination, departure_date, departure_date, max_results=10,
+        )
+        for single_date, day_offers in split_by_departure_date(offers, [departure_date]).items():
+            to_save[(origin, destination, single_date)] = day_offers
+
+    await save_to_cache_many(session, to_save)
+    return {"candidates": len(candidates), "calls": calls, "refreshed": len(to_save)}
+
+
+async def run_prewarm_loop() -> None:
+    """Long-running task started in the FastAPI lifespan: one cycle per interval, one worker at a time."""
+    interval = settings.prewarm_interval_minutes * 60
+    while True:
+        try:
+            redis = await get_redis()
+            if settings.prewarm_offpeak_hours and await redis.set(_LOCK_KEY, "1", nx=True, ex=interval):
+                async with async_session_maker() as session:
+                    stats = await run_prewarm_cycle(session)
+                if "skipped" not in stats:
+                    logger.info("flight_cache pre-warm: %s", stats)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("flight_cache pre-warm failed: %s: %s", type(exc).__name__, exc)
+        await asyncio.sleep(interval)
+
@@ -11,8 +11,30 @@ level to avoid an extra POST /oauth2/token on every search.
 The async lock (_TOKEN_LOCK) serialises concurrent token requests,
 preventing burst calls to the auth endpoint.
 
-Rate limiting: the Amadeus test API has a limit of ~10 req/sec. On HTTP 429
-search_one_way retries with exponential backoff (1s, 2s, 4s).
+Multi-city: one POST /v2/shopping/flight-offers prices up to
+_MAX_ORIGIN_DESTINATIONS legs (several originDestinations in the body)
+instead of one GET per leg. search_legs() uses it for the legs of one
+Smart Multi-City route (max_legs_per_call, one quota unit per POST; the
+engine prices the legs left without a ticket with per-leg GETs);
+search_multi_city() does the same and falls back to per-leg GETs itself.
+The ticket price is split across its legs (_split_multi_city_offer): those
+offers are tagged ticket_share, only priced into the route they were searched
+for and never written to flight_cache.
+
+Date ranges: the API takes a single departureDate, so search_one_way() fans
+out one GET per day of date_from..date_to (at most _MAX_DAYS_IN_RANGE, like
+the SerpAPI provider) and merges the offers. Callers pass only uncached days.
+
+Rate limiting: the Amadeus test API has a limit of ~10 req/sec. Every request
+first takes a token from _BUCKET (utils/token_bucket.py, _REQUESTS_PER_SECOND
+per worker), so fan-outs are paced instead of bouncing off 429s. Concurrent
+calls also go through the "amadeus" adaptive limiter (utils/adaptive_limiter.py),
+which shrinks on 429s and timeouts; on HTTP 429 a day is retried with
+exponential backoff (1s, 2s, 4s). The OAuth token is taken before the limiter
+slot; the _BUCKET token inside it, right before the request (_send), so calls
+queued on the limiter cannot fire in a burst above the pace. The limiter
+measures latency from after the pacing wait. Each day queried costs one unit
+of the monthly quota.
 
 Documentation: https://developers.amadeus.com/self-service/category/flights
 """
@@ -20,11 +42,14 @@ import asyncio
 import logging
 import re
 import time
-from datetime import date
+from dataclasses import replace
+from datetime import date, timedelta
 
 import httpx
 
 from app.services.providers.base import FlightOffer, FlightProvider, Leg
+from app.utils.adaptive_limiter import get_limiter
+from app.utils.token_bucket import TokenBucket
 
 logger = logging.getLogger(__name__)
 
@@ -38,18 +63,19 @@ _TOKEN_CACHE: dict[str, tuple[str, float]] = {}
 # Prevents N parallel tasks from all requesting a token at the same time.
 _TOKEN_LOCK: asyncio.Lock | None = None
 
-# Global semaphore: caps total concurrent Amadeus search_one_way calls across
-# all itineraries. Amadeus free tier allows ~10 req/s; keep well below to
-# avoid 429 cascades that trigger exponential backoff and bust the 60s budget.
-_MAX_CONCURRENT_AMADEUS_CALLS = 5
-_AMADEUS_SEMAPHORE: asyncio.Semaphore | None = None
+# Concurrent Amadeus searches across the worker. Amadeus free tier allows
+# ~10 req/s: start at 5 and let AIMD find the real headroom (never above 10).
+_LIMITER = get_limiter("amadeus", initial=5, max_limit=10, latency_target_s=3.0)
 
+# originDestinations accepted by one flight-offers POST
+_MAX_ORIGIN_DESTINATIONS = 6
 
-def _get_amadeus_semaphore() -> asyncio.Semaphore:
-    global _AMADEUS_SEMAPHORE
-    if _AMADEUS_SEMAPHORE is None:
-        _AMADEUS_SEMAPHORE = asyncio.Semaphore(_MAX_CONCURRENT_AMADEUS_CALLS)
-    return _AMADEUS_SEMAPHORE
+# Days queried by one search_one_way() (one GET each)
+_MAX_DAYS_IN_RANGE = 7
+
+# Request pace per worker, below the ~10 req/s of the API
+_REQUESTS_PER_SECOND = 8
+_BUCKET = TokenBucket(rate_per_s=_REQUESTS_PER_SECOND, burst=_REQUESTS_PER_SECOND)
 
 
 def _parse_iso_duration(duration: str) -> int:
@@ -80,8 +106,34 @@ def _parse_offer(item: dict) -> FlightOffer | None:
         return None
 
 
+def _split_multi_city_offer(item: dict) -> list[FlightOffer] | None:
+    """
+    One offer per leg from a multi-city offer (one itinerary per originDestination).
+
+    Amadeus prices the ticket as a whole: price.total is shared across the
+    legs in proportion to their flight time, so the legs add up to the ticket.
+    The shares are not one-way fares: the offers are tagged ticket_share.
+    """
+    try:
+        total = float(item["price"]["total"])
+        legs = [_parse_offer({"itineraries": [itinerary], "price": item["price"]}) for itinerary in item["itineraries"]]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not legs or None in legs:
+        return None
+
+    durations = [leg.duration_minutes for leg in legs]
+    weights = durations if sum(durations) > 0 else [1] * len(legs)
+    shares = [round(total * w / sum(weights), 2) for w in weights]
+    shares[-1] = round(total - sum(shares[:-1]), 2)
+    return [replace(leg, price_eur=share, ticket_share=True) for leg, share in zip(legs, shares)]
+
+
 class AmadeusProvider(FlightProvider):
 
+    max_legs_per_call = _MAX_ORIGIN_DESTINATIONS
+    max_days_in_range = _MAX_DAYS_IN_RANGE
+
     def __init__(self, api_key: str, api_secret: str) -> None:
         self.api_key = api_key
         self.api_secret = api_secret
@@ -118,6 +170,37 @@ class AmadeusProvider(FlightProvider):
             _TOKEN_CACHE[self.api_key] = (token, now + expires_in)
             return token
 
+    async def _send(self, method: str, **kwargs) -> httpx.Response | None:
+        """
+        One request to the flight-offers endpoint; None on timeout.
+
+        The OAuth token is taken before the limiter slot; the pacing token
+        inside it, right before the request, whose latency alone is measured.
+        """
+        extra_headers = kwargs.pop("headers", {})
+        async with httpx.AsyncClient(timeout=30) as client:
+            try:
+                token = await self._get_token(client)
+            except httpx.TimeoutException:
+                return None
+            async with _LIMITER.slot() as call:
+                await _BUCKET.acquire()
+                call.started()
+                try:
+                    resp = await client.request(
+                        method,
+                        _SEARCH_URL,
+                        headers={"Authorization": f"Bearer {token}", **extra_headers},
+                        **kwargs,
+                    )
+                except httpx.TimeoutException:
+                    call.overloaded()
+                    return None
+                if resp.status_code == 429:
+                    call.overloaded()
+        # client closed here — resp.json() still accessible (body already read by httpx)
+        return resp
+
     async def search_one_way(
         self,
         origin: str,
@@ -127,13 +210,37 @@ class AmadeusProvider(FlightProvider):
         direct_only: bool = False,
         max_results: int = 50,
     ) -> list[FlightOffer]:
-        """Searches one-way flights with automatic retry on HTTP 429 (backoff 1s, 2s, 4s)."""
-        # Amadeus does not natively support date ranges:
-        # date_from is used as the primary departure date
+        """One GET per day of the range (in parallel, paced by _BUCKET); offers merged, cheapest first."""
+        days: list[date] = []
+        current = date_from
+        while current <= date_to and len(days) < _MAX_DAYS_IN_RANGE:
+            days.append(current)
+            current += timedelta(days=1)
+
+        results = await asyncio.gather(
+            *[self._search_day(origin, destination, day, direct_only, max_results) for day in days],
+            return_exceptions=True,
+        )
+        offers: list[FlightOffer] = []
+        for r in results:
+            if isinstance(r, list):
+                offers.extend(r)
+        offers.sort(key=lambda o: o.price_eur)
+        return offers[:max_results]
+
+    async def _search_day(
+        self,
+        origin: str,
+        destination: str,
+        day: date,
+        direct_only: bool,
+        max_results: int,
+    ) -> list[FlightOffer]:
+        """One-way offers for a single departure day, with retry on HTTP 429 (backoff 1s, 2s, 4s)."""
         params: dict = {
             "originLocationCode": origin,
             "destinationLocationCode": destination,
-            "departureDate": date_from.isoformat(),
+            "departureDate": day.isoformat(),
             "adults": 1,
             "currencyCode": "EUR",
             "max": min(max_results, 250),  # Amadeus max is 250
@@ -142,20 +249,11 @@ class AmadeusProvider(FlightProvider):
             params["nonStop"] = "true"
 
         for attempt in range(3):
-            try:
-                async with _get_amadeus_semaphore():
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        token = await self._get_token(client)
-                        resp = await client.get(
-                            _SEARCH_URL,
-                            params=params,
-                            headers={"Authorization": f"Bearer {token}"},
-                        )
-                # client closed here — resp.json() still accessible (body already read by httpx)
-            except httpx.TimeoutException:
+            resp = await self._send("GET", params=params)
+            if resp is None:
                 logger.warning(
                     "Amadeus %s→%s %s: timeout (attempt %d/3)",
-                    origin, destination, date_from, attempt + 1,
+                    origin, destination, day, attempt + 1,
                 )
                 if attempt == 2:
                     return []
@@ -165,7 +263,7 @@ class AmadeusProvider(FlightProvider):
                 wait = 2 ** attempt  # 1s, 2s, 4s
                 logger.warning(
                     "Amadeus %s→%s %s: HTTP 429 (attempt %d/3), retrying in %ds",
-                    origin, destination, date_from, attempt + 1, wait,
+                    origin, destination, day, attempt + 1, wait,
                 )
                 await asyncio.sleep(wait)
                 continue
@@ -175,35 +273,115 @@ class AmadeusProvider(FlightProvider):
             except httpx.HTTPStatusError as exc:
                 logger.warning(
                     "Amadeus %s→%s %s: HTTP %d — %s",
-                    origin, destination, date_from,
+                    origin, destination, day,
                     exc.response.status_code,
                     exc.response.text[:300],
                 )
                 return []
 
             data = resp.json().get("data", [])
-            logger.debug("Amadeus %s→%s %s: %d offers", origin, destination, date_from, len(data))
+            logger.debug("Amadeus %s→%s %s: %d offers", origin, destination, day, len(data))
             offers = [_parse_offer(item) for item in data]
             return [o for o in offers if o is not None]
 
         logger.warning(
             "Amadeus %s→%s %s: HTTP 429 after 3 attempts, leg skipped",
-            origin, destination, date_from,
+            origin, destination, day,
         )
         return []
 
+    async def _post_offers(self, body: dict) -> list[dict] | None:
+        """One flight-offers POST; the offers, or None on any error (timeout, HTTP error, bad payload)."""
+        resp = await self._send("POST", json=body, headers={"X-HTTP-Method-Override": "GET"})
+        if resp is None:
+            logger.warning("Amadeus multi-city POST: timeout")
+            return None
+        if resp.status_code != 200:
+            logger.warning("Amadeus multi-city POST: HTTP %d — %s", resp.status_code, resp.text[:300])
+            return None
+        data = resp.json().get("data")
+        return data if isinstance(data, list) else None
+
+    async def _search_multi_city_bulk(self, legs: list[Leg], direct_only: bool = False) -> list[FlightOffer] | None:
+        """
+        Cheapest multi-city ticket covering `legs`, split per leg: [] if there is
+        none (or none all direct with direct_only), None if the POST failed.
+        """
+        search_criteria: dict = {"maxFlightOffers": 5}
+        if direct_only:
+            search_criteria["flightFilters"] = {"connectionRestriction": {"maxNumberOfConnections": 0}}
+        body = {
+            "currencyCode": "EUR",
+            "originDestinations": [
+                {
+                    "id": str(i),
+                    "originLocationCode": leg.origin,
+                    "destinationLocationCode": leg.destination,
+                    "departureDateTimeRange": {"date": leg.date.isoformat()},
+                }
+                for i, leg in enumerate(legs, start=1)
+            ],
+            "travelers": [{"id": "1", "travelerType": "ADULT"}],
+            "sources": ["GDS"],
+            "searchCriteria": search_criteria,
+        }
+        data = await self._post_offers(body)
+        if data is None:
+            return None
+        tickets = [
+            t for t in (_split_multi_city_offer(item) for item in data)
+            if t and len(t) == len(legs) and (not direct_only or all(o.direct for o in t))
+        ]
+        if not tickets:
+            return []
+        return min(tickets, key=lambda t: sum(o.price_eur for o in t))
+
     async def search_multi_city(
         self,
         legs: list[Leg],
     ) -> list[FlightOffer]:
-        """Searches all legs in parallel and returns the cheapest offer per leg."""
-        tasks = [
-            self.search_one_way(leg.origin, leg.destination, leg.date, leg.date, max_results=5)
-            for leg in legs
-        ]
-        results = await asyncio.gather(*tasks)
+        """
+        Cheapest offer per leg: one POST per group of _MAX_ORIGIN_DESTINATIONS
+        legs (the groups in parallel); a group whose POST fails or finds no
+        ticket falls back to one search_one_way() per leg.
+        """
+        groups = [legs[i:i + _MAX_ORIGIN_DESTINATIONS] for i in range(0, len(legs), _MAX_ORIGIN_DESTINATIONS)]
+        results = await asyncio.gather(*[self._search_multi_city_bulk(group) for group in groups])
+
         offers: list[FlightOffer] = []
-        for leg_offers in results:
-            if leg_offers:
-                offers.append(min(leg_offers, key=lambda o: o.price_eur))
+        for group, bulk in zip(groups, results):
+            if bulk:
+                offers.extend(bulk)
+                continue
+            logger.info("Amadeus multi-city: bulk pricing unavailable, %d legs priced one by one", len(group))
+            per_leg = await asyncio.gather(*[
+                self.search_one_way(leg.origin, leg.destination, leg.date, leg.date, max_results=5)
+                for leg in group
+            ])
+            for leg_offers in per_leg:
+                if leg_offers:
+                    offers.append(min(leg_offers, key=lambda o: o.price_eur))
         return offers
+
+    async def search_legs(
+        self,
+        legs: list[Leg],
+        direct_only: bool = False,
+    ) -> dict[tuple[str, str, date], list[FlightOffer]]:
+        """
+        The legs of one itinerary, in travel order, priced as a multi-city
+        ticket: one POST per group of _MAX_ORIGIN_DESTINATIONS legs (the groups
+        in parallel), each leg getting its share of the cheapest ticket
+        (ticket_share). Legs of a group with no ticket are omitted, for the
+        caller to price one way; if every POST fails the error is raised.
+        """
+        groups = [legs[i:i + _MAX_ORIGIN_DESTINATIONS] for i in range(0, len(legs), _MAX_ORIGIN_DESTINATIONS)]
+        results = await asyncio.gather(*[self._search_multi_city_bulk(group, direct_only) for group in groups])
+        if groups and all(bulk is None for bulk in results):
+            raise RuntimeError(f"Amadeus multi-city POST failed for {len(legs)} legs")
+
+        return {
+            (leg.origin, leg.destination, leg.date): [offer]
+            for group, bulk in zip(groups, results) if bulk
+            for leg, offer in zip(group, bulk)
+        }
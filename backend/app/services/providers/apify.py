@@ -22,7 +22,9 @@ Confirmed input parameters (from README):
   gl            → country code ("it" for Italy)
   max_stops     → 0 = direct only, null = no limit
   max_pages     → int, use 1 to limit cost
-  multi_city_json → JSON string for multi-city (see search_multi_city below)
+  multi_city_json → JSON string for multi-city (see search_multi_city below);
+                    search_legs() prices the legs of one itinerary with it,
+                    up to _MAX_LEGS_PER_RUN per actor run
 
 Confirmed output structure (per dataset item = one page):
   {
@@ -40,12 +42,15 @@ Confirmed output structure (per dataset item = one page):
 import asyncio
 import json
 import logging
+from dataclasses import replace
 from datetime import date, timedelta
+from itertools import islice
 
 import httpx
 
 from app.config import settings
 from app.services.providers.base import FlightOffer, FlightProvider, Leg
+from app.utils.adaptive_limiter import get_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -61,16 +66,18 @@ _RUN_SYNC_URL = f"https://api.apify.com/v2/acts/{_ACTOR_ID}/run-sync-get-dataset
 # Actor timeout in seconds (Apify max is 300s)
 _ACTOR_TIMEOUT_SECONDS = 120
 
-# Limit concurrent runs to avoid exhausting the free-tier credit budget
-_MAX_CONCURRENT = 3
-_APIFY_SEMAPHORE: asyncio.Semaphore | None = None
+# Concurrent actor runs across the worker: adaptive (utils/adaptive_limiter.py),
+# kept low to avoid exhausting the free-tier credit budget. Actor runs are slow
+# by nature, hence the generous latency target.
+_LIMITER = get_limiter("apify", initial=3, max_limit=6, latency_target_s=90.0)
 
+# Legs packed into one multi_city_json actor run (Google Flights multi-city
+# accepts up to 6 flights; one kept as margin)
+_MAX_LEGS_PER_RUN = 5
 
-def _get_semaphore() -> asyncio.Semaphore:
-    global _APIFY_SEMAPHORE
-    if _APIFY_SEMAPHORE is None:
-        _APIFY_SEMAPHORE = asyncio.Semaphore(_MAX_CONCURRENT)
-    return _APIFY_SEMAPHORE
+# Dates of a range searched by search_one_way(), one actor run each
+# (kept low to preserve free-tier credits)
+_MAX_DAYS_IN_RANGE = 3
 
 
 def _parse_flight_entry(item: dict, origin: str, destination: str) -> FlightOffer | None:
@@ -145,7 +152,7 @@ async def _run_actor(actor_input: dict) -> list[dict]:
     }
     params = {"format": "json", "timeout": _ACTOR_TIMEOUT_SECONDS}
 
-    async with _get_semaphore():
+    async with _LIMITER.slot() as call:
         try:
             async with httpx.AsyncClient(timeout=_ACTOR_TIMEOUT_SECONDS + 10) as client:
                 resp = await client.post(
@@ -155,8 +162,11 @@ async def _run_actor(actor_input: dict) -> list[dict]:
                     params=params,
                 )
         except httpx.TimeoutException:
+            call.overloaded()
             logger.warning("Apify actor timeout after %ds (input: %s)", _ACTOR_TIMEOUT_SECONDS, actor_input)
             return []
+        if resp.status_code == 429:
+            call.overloaded()
 
     if resp.status_code == 400:
         logger.warning("Apify HTTP 400 — check actor input: %s", resp.text[:300])
@@ -179,8 +189,33 @@ async def _run_actor(actor_input: dict) -> list[dict]:
     return data
 
 
+def _multi_city_input(legs: list[Leg], direct_only: bool = False) -> dict:
+    """Actor input pricing `legs` in one run (multi_city_json, legs in date order)."""
+    actor_input: dict = {
+        "multi_city_json": json.dumps([
+            {
+                "departure_id": leg.origin,
+                "arrival_id": leg.destination,
+                "date": leg.date.isoformat(),
+            }
+            for leg in sorted(legs, key=lambda leg: leg.date)
+        ]),
+        "adults": 1,
+        "currency": "EUR",
+        "hl": "en",
+        "gl": "it",
+        "max_pages": 1,
+    }
+    if direct_only:
+        actor_input["max_stops"] = 0
+    return actor_input
+
+
 class ApifyProvider(FlightProvider):
 
+    max_legs_per_call = _MAX_LEGS_PER_RUN
+    max_days_in_range = _MAX_DAYS_IN_RANGE
+
     async def search_one_way(
         self,
         origin: str,
@@ -190,10 +225,9 @@ class ApifyProvider(FlightProvider):
         direct_only: bool = False,
         max_results: int = 50,
     ) -> list[FlightOffer]:
-        # Max 3 dates to preserve free-tier credits
         dates: list[date] = []
         current = date_from
-        while current <= date_to and len(dates) < 3:
+        while current <= date_to and len(dates) < _MAX_DAYS_IN_RANGE:
             dates.append(current)
             current += timedelta(days=1)
 
@@ -235,25 +269,7 @@ class ApifyProvider(FlightProvider):
         multi_city_json format:
         [{"departure_id":"CTA","arrival_id":"ATH","date":"2026-04-01"}, ...]
         """
-        multi_city_data = [
-            {
-                "departure_id": leg.origin,
-                "arrival_id": leg.destination,
-                "date": leg.date.isoformat(),
-            }
-            for leg in legs
-        ]
-
-        actor_input: dict = {
-            "multi_city_json": json.dumps(multi_city_data),
-            "adults": 1,
-            "currency": "EUR",
-            "hl": "en",
-            "gl": "it",
-            "max_pages": 1,
-        }
-
-        pages = await _run_actor(actor_input)
+        pages = await _run_actor(_multi_city_input(legs))
 
         # With multi-city the actor returns results grouped by leg.
         # Extract cheapest offer per leg by matching origin/destination.
@@ -269,3 +285,45 @@ class ApifyProvider(FlightProvider):
                 result.append(min(leg_offers, key=lambda o: o.price_eur))
 
         return result
+
+    async def search_legs(
+        self,
+        legs: list[Leg],
+        direct_only: bool = False,
+    ) -> dict[tuple[str, str, date], list[FlightOffer]]:
+        """
+        Prices the legs of one itinerary, in travel order, as multi-city
+        searches: _MAX_LEGS_PER_RUN legs per multi_city_json run, the runs
+        concurrent. Every offer is sent back to the leg with its origin,
+        destination and departure day; the others are discarded. The offers
+        are multi-city results, not one-way fares: they are tagged ticket_share.
+
+        A failed run only loses its legs: they are missing from the result,
+        like legs without offers, for the caller to price one way.
+        """
+        it = iter(legs)
+        chunks = list(iter(lambda: list(islice(it, _MAX_LEGS_PER_RUN)), []))
+        pages_per_run = await asyncio.gather(
+            *[_run_actor(_multi_city_input(chunk, direct_only)) for chunk in chunks],
+            return_exceptions=True,
+        )
+
+        wanted = {(leg.origin, leg.destination, leg.date) for leg in legs}
+        result: dict[tuple[str, str, date], list[FlightOffer]] = {}
+        for pages in pages_per_run:
+            if isinstance(pages, BaseException):
+                logger.warning("Apify multi-city run failed: %s: %s", type(pages).__name__, pages)
+                continue
+            for offer in _offers_from_pages(pages, "", ""):
+                if direct_only and not offer.direct:
+                    continue
+                try:
+                    key = (offer.origin, offer.destination, date.fromisoformat(offer.departure[:10]))
+                except ValueError:
+                    continue
+                if key in wanted:
+                    result.setdefault(key, []).append(replace(offer, ticket_share=True))
+
+        for offers in result.values():
+            offers.sort(key=lambda o: o.price_eur)
+        return result
@@ -4,6 +4,7 @@ Flight Provider Layer — abstract interface (Strategy Pattern).
 Application code (search_engine, itinerary_engine) depends only on these classes.
 The concrete provider is selected by the factory based on FLIGHT_PROVIDER in .env.
 """
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import date
@@ -27,10 +28,22 @@ class FlightOffer:
     airline: str
     direct: bool
     duration_minutes: int
+    # price_eur comes from a multi-city search (a share of the ticket), not a
+    # one-way fare: good for pricing the itinerary it came with only, never
+    # stored as a cache row
+    ticket_share: bool = False
 
 
 class FlightProvider(ABC):
 
+    # Legs search_legs() prices with a single upstream call (quota unit);
+    # 1 = no batching, callers use search_one_way() per leg
+    max_legs_per_call: int = 1
+
+    # Days of a date range search_one_way() queries, one upstream call (quota
+    # unit) each; 1 = the API answers a whole range with one call
+    max_days_in_range: int = 1
+
     @abstractmethod
     async def search_one_way(
         self,
@@ -57,3 +70,25 @@ class FlightProvider(ABC):
         Returns one FlightOffer per leg (the cheapest found).
         """
         ...
+
+    async def search_legs(
+        self,
+        legs: list[Leg],
+        direct_only: bool = False,
+    ) -> dict[tuple[str, str, date], list[FlightOffer]]:
+        """
+        Offers for the legs of one itinerary, in travel order, keyed by
+        (origin, destination, date); legs without offers are omitted. Providers
+        able to price several legs in one upstream call (a multi-city search)
+        override this, set max_legs_per_call and tag their offers ticket_share;
+        the default is one search_one_way() per leg.
+        """
+        results = await asyncio.gather(*[
+            self.search_one_way(leg.origin, leg.destination, leg.date, leg.date, direct_only=direct_only)
+            for leg in legs
+        ])
+        return {
+            (leg.origin, leg.destination, leg.date): offers
+            for leg, offers in zip(legs, results)
+            if offers
+        }
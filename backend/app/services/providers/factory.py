@@ -10,15 +10,22 @@ the counter resets automatically at the start of the next cycle.
 Exposed functions:
   get_providers_in_order() → list of (name, provider) with quota > 0
   get_provider_quotas()    → dict {name: remaining_balance} for all providers
+  search_one_way_cascade() → one-way search that walks the cascade until a provider answers
+  quota_units()            → quota units one search_one_way() over a date range costs
   PROVIDER_LIMITS          → dict with monthly limits (with safety margin)
   MONTHLY_WINDOW           → window duration in seconds (30 days)
 """
+import logging
+from datetime import date
+
 from app.config import settings
-from app.services.providers.base import FlightProvider
+from app.services.providers.base import FlightOffer, FlightProvider
 from app.services.providers.google_flights import GoogleFlightsProvider
 from app.services.providers.amadeus import AmadeusProvider
 from app.services.providers.apify import ApifyProvider
-from app.utils.rate_limiter import get_remaining
+from app.utils.rate_limiter import check_rate_limit, get_remaining
+
+logger = logging.getLogger(__name__)
 
 # Monthly window in seconds (also used by search_engine and itinerary_engine)
 MONTHLY_WINDOW: int = 30 * 24 * 3600
@@ -33,6 +40,14 @@ PROVIDER_LIMITS: dict[str, int] = {
     "apify": 180,
 }
 
+# Days of a range each provider queries one by one in search_one_way() (one
+# request, i.e. one unit of its monthly quota, per day)
+PROVIDER_MAX_DAYS: dict[str, int] = {
+    "serpapi": GoogleFlightsProvider.max_days_in_range,
+    "amadeus": AmadeusProvider.max_days_in_range,
+    "apify": ApifyProvider.max_days_in_range,
+}
+
 # Human-readable notes shown in the frontend badge for each active state
 PROVIDER_NOTES: dict[str, str] = {
     "serpapi": (
@@ -104,3 +119,50 @@ async def get_provider_quotas() -> dict[str, int]:
         name: await get_remaining(f"{name}:monthly", limit)
         for name, limit in PROVIDER_LIMITS.items()
     }
+
+
+def quota_units(provider_name: str, date_from: date, date_to: date) -> int:
+    """Monthly quota units one search_one_way() over date_from..date_to costs: one per day queried."""
+    return max(1, min((date_to - date_from).days + 1, PROVIDER_MAX_DAYS[provider_name]))
+
+
+async def search_one_way_cascade(
+    providers_in_order: list[tuple[str, FlightProvider]],
+    origin: str,
+    destination: str,
+    date_from: date,
+    date_to: date,
+    direct_only: bool = False,
+    max_results: int = 10,
+) -> tuple[str | None, list[FlightOffer]]:
+    """
+    One-way search through the provider cascade.
+
+    Each provider is tried in order: its monthly counter is incremented by the
+    days it will query (quota_units), and the first one returning at least one
+    offer wins. Failures are logged and the next provider is tried.
+
+    Returns:
+        (provider_name, offers) — (None, []) if no provider answered.
+    """
+    for provider_name, provider in providers_in_order:
+        allowed = await check_rate_limit(
+            f"{provider_name}:monthly", PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW,
+            cost=quota_units(provider_name, date_from, date_to),
+        )
+        if not allowed:
+            continue
+        try:
+            offers = await provider.search_one_way(
+                origin, destination, date_from, date_to,
+                direct_only=direct_only, max_results=max_results,
+            )
+        except Exception as exc:
+            logger.warning(
+                "Provider %s %s→%s failed: %s: %s",
+                provider_name, origin, destination, type(exc).__name__, exc,
+            )
+            continue
+        if offers:
+            return provider_name, offers
+    return None, []
@@ -17,12 +17,17 @@ import httpx
 
 from app.config import settings
 from app.services.providers.base import FlightOffer, FlightProvider, Leg
+from app.utils.adaptive_limiter import get_limiter
 
 _SERPAPI_URL = "https://serpapi.com/search.json"
 
 # Maximum number of days in the search range to query in parallel
 _MAX_DAYS_IN_RANGE = 7
 
+# Concurrent SerpAPI requests across the worker (one per date): adaptive,
+# see utils/adaptive_limiter.py
+_LIMITER = get_limiter("serpapi", initial=4, max_limit=12, latency_target_s=8.0)
+
 
 def _parse_offer(item: dict, origin: str, destination: str) -> FlightOffer | None:
     """
@@ -84,8 +89,15 @@ async def _fetch_for_date(
     if direct_only:
         params["stops"] = "0"   # 0=direct only, 1=max 1 stop, 2=any
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(_SERPAPI_URL, params=params)
+    async with _LIMITER.slot() as call:
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                resp = await client.get(_SERPAPI_URL, params=params)
+        except httpx.TimeoutException:
+            call.overloaded()
+            raise
+        if resp.status_code == 429:
+            call.overloaded()
         resp.raise_for_status()
         data = resp.json()
 
@@ -103,6 +115,8 @@ async def _fetch_for_date(
 
 class GoogleFlightsProvider(FlightProvider):
 
+    max_days_in_range = _MAX_DAYS_IN_RANGE
+
     async def search_one_way(
         self,
         origin: str,
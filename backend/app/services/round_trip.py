@@ -0,0 +1,338 @@
+"""
+Core logic for Round-Trip Search ("out Friday, back Sunday").
+
+HopCraft caches one-way legs only: a round trip is an outbound row
+(origin → X) joined with an inbound row (X → origin) whose departure falls
+min_nights..max_nights days after the outbound one.
+
+Flow:
+  1. Coverage query: which days of each direction (origin → X, X → origin)
+     already have valid cache rows in the outbound / return windows, with
+     their best price.
+  2. Missing directions are fetched through the provider cascade
+     (max _MAX_NEW_CALLS_PER_SEARCH calls per search, cheapest known half
+     first) and saved to cache. Without a destination and with fewer than
+     max_results destinations cached both ways (cold cache), the nearest
+     airports with nothing cached are tried too, both directions each.
+     The budget left then goes to the uncached days of partly cached
+     directions. Every call covers one run of consecutive uncached days.
+  3. The pairing runs entirely in SQL: self-join of flight_cache on the day
+     offset, ranked by outbound + inbound price with a window function
+     (max_per_destination combinations per destination), LIMIT max_results.
+     Only compact columns travel back.
+  4. Offers are decoded only for the rows of the winning combinations.
+"""
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.db.cache import is_fresh, missing_runs, offers_from_row, save_to_cache_many, split_by_departure_date
+from app.models.airport import Airport
+from app.models.flight_cache import FlightCache
+from app.models.schemas import ProviderStatus
+from app.services.providers.base import FlightOffer
+from app.services.providers.factory import (
+    PROVIDER_NOTES,
+    get_provider_quotas,
+    get_providers_in_order,
+    search_one_way_cascade,
+)
+from app.utils.geo import haversine_km
+
+# Maximum new provider calls per single search (same budget as reverse search)
+_MAX_NEW_CALLS_PER_SEARCH = 50
+
+
+def _date_range(date_from: date, date_to: date) -> list[date]:
+    days = (date_to - date_from).days
+    return [date_from + timedelta(days=i) for i in range(days + 1)]
+
+
+def _return_window(
+    depart_from: date, depart_to: date, min_nights: int, max_nights: int
+) -> tuple[date, date]:
+    """Earliest and latest inbound departure compatible with the outbound window."""
+    return depart_from + timedelta(days=min_nights), depart_to + timedelta(days=max_nights)
+
+
+def _plan_missing_directions(
+    origin: str,
+    coverage: dict[tuple[str, str], float],
+    candidates: list[str],
+    limit: int,
+) -> list[tuple[str, str]]:
+    """
+    Chooses which one-way directions to fetch from the providers.
+
+    A destination is worth completing when exactly one of its two halves is
+    cached: the cheaper the known half, the more promising the combination,
+    so those go first. Candidates with neither half cached come next, in the
+    given order, both directions each (taken whole: half of one wastes quota).
+
+    Args:
+        coverage:   {(from, to): best cached price} for the requested windows
+        candidates: destinations to consider
+
+    Returns:
+        list of (from, to) directions, at most `limit`.
+    """
+    halves: list[tuple[float, str, str]] = []
+    unknown: list[str] = []
+    for destination in candidates:
+        out_price = coverage.get((origin, destination))
+        in_price = coverage.get((destination, origin))
+        if out_price is not None and in_price is None:
+            halves.append((out_price, destination, origin))
+        elif in_price is not None and out_price is None:
+            halves.append((in_price, origin, destination))
+        elif out_price is None and in_price is None:
+            unknown.append(destination)
+    halves.sort(key=lambda p: p[0])
+
+    plan = [(frm, to) for _, frm, to in halves[:limit]]
+    for destination in unknown:
+        if len(plan) + 2 > limit:
+            break
+        plan += [(origin, destination), (destination, origin)]
+    return plan
+
+
+def _pairing_query(
+    origin: str,
+    depart_from: date,
+    depart_to: date,
+    min_nights: int,
+    max_nights: int,
+    destination: str | None,
+    direct_only: bool,
+    max_per_destination: int,
+    max_results: int,
+):
+    """Builds the outbound ⋈ inbound self-join, ranked per destination by total price."""
+    out = aliased(FlightCache)
+    inb = aliased(FlightCache)
+    total = (out.price_eur + inb.price_eur).label("total")
+
+    conditions = [
+        out.origin == origin,
+        out.departure_date.between(depart_from, depart_to),
+        is_fresh(out),
+        out.price_eur.is_not(None),
+        inb.price_eur.is_not(None),
+    ]
+    if destination is not None:
+        conditions.append(out.destination == destination)
+    if direct_only:
+        conditions += [out.direct_flight.is_(True), inb.direct_flight.is_(True)]
+
+    ranked = (
+        select(
+            out.id.label("out_id"),
+            inb.id.label("in_id"),
+            out.destination.label("destination"),
+            (inb.departure_date - out.departure_date).label("nights"),
+            total,
+            func.row_number().over(
+                partition_by=out.destination, order_by=total
+            ).label("rank_in_destination"),
+        )
+        .join(
+            inb,
+            and_(
+                inb.origin == out.destination,
+                inb.destination == out.origin,
+                inb.departure_date >= out.departure_date + min_nights,
+                inb.departure_date <= out.departure_date + max_nights,
+                is_fresh(inb),
+            ),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+
+    return (
+        select(ranked.c.out_id, ranked.c.in_id, ranked.c.destination, ranked.c.nights, ranked.c.total)
+        .where(ranked.c.rank_in_destination <= max_per_destination)
+        .order_by(ranked.c.total)
+        .limit(max_results)
+    )
+
+
+def _cheapest_offer(row: FlightCache) -> FlightOffer | None:
+    offers = offers_from_row(row)
+    return min(offers, key=lambda o: o.price_eur) if offers else None
+
+
+async def round_trip_search(
+    session: AsyncSession,
+    origin: str,
+    depart_from: date,
+    depart_to: date,
+    min_nights: int,
+    max_nights: int,
+    destination: str | None = None,
+    direct_only: bool = False,
+    max_results: int = 20,
+) -> tuple[list[dict], bool, ProviderStatus]:
+    """
+    Round-trip search: cheapest outbound + inbound combinations from origin.
+
+    With a fixed destination the top max_results date combinations for that
+    destination are returned; without one ("weekend getaway" mode) the best
+    combination per destination is returned, cheapest destinations first.
+
+    Returns:
+        (results list, all_from_cache, provider_status)
+
+    Raises:
+        ValueError: if origin (or destination, when given) is not an active airport.
+    """
+    # --- 1. Airports
+    airport_rows = await session.execute(select(Airport).where(Airport.is_active.is_(True)))
+    airport_map: dict[str, Airport] = {a.iata_code: a for a in airport_rows.scalars().all()}
+    if origin not in airport_map:
+        raise ValueError(f"Origin airport '{origin}' not found or inactive.")
+    if destination is not None and destination not in airport_map:
+        raise ValueError(f"Destination airport '{destination}' not found or inactive.")
+
+    return_from, return_to = _return_window(depart_from, depart_to, min_nights, max_nights)
+
+    # --- 2. Coverage of both directions (one grouped query)
+    outbound_cond = and_(
+        FlightCache.origin == origin,
+        FlightCache.departure_date.between(depart_from, depart_to),
+    )
+    inbound_cond = and_(
+        FlightCache.destination == origin,
+        FlightCache.departure_date.between(return_from, return_to),
+    )
+    if destination is not None:
+        outbound_cond = and_(outbound_cond, FlightCache.destination == destination)
+        inbound_cond = and_(inbound_cond, FlightCache.origin == destination)
+
+    coverage_rows = await session.execute(
+        select(
+            FlightCache.origin, FlightCache.destination, FlightCache.departure_date,
+            func.min(FlightCache.price_eur),
+        )
+        .where(is_fresh(), or_(outbound_cond, inbound_cond))
+        .group_by(FlightCache.origin, FlightCache.destination, FlightCache.departure_date)
+    )
+    coverage: dict[tuple[str, str], float] = {}
+    cached_days: dict[tuple[str, str], set[date]] = {}
+    for frm, to, day, price in coverage_rows.all():
+        cached_days.setdefault((frm, to), set()).add(day)
+        if price is not None:
+            coverage[(frm, to)] = min(float(price), coverage.get((frm, to), float(price)))
+
+    # --- 3. Fill the missing halves through the provider cascade
+    if destination is not None:
+        candidates = [destination]
+    else:
+        covered = {to for frm, to in coverage if frm == origin} | {frm for frm, to in coverage if to == origin}
+        complete = sum(1 for d in covered if (origin, d) in coverage and (d, origin) in coverage)
+        # Cold or thin cache: also try the nearest airports with nothing cached
+        home = airport_map[origin]
+        uncovered = sorted(
+            (code for code in airport_map if code != origin and code not in covered),
+            key=lambda code: haversine_km(
+                home.latitude, home.longitude, airport_map[code].latitude, airport_map[code].longitude
+            ),
+        )
+        candidates = sorted(covered) + uncovered[:max(0, max_results - complete)]
+    planned = _plan_missing_directions(origin, coverage, candidates, _MAX_NEW_CALLS_PER_SEARCH)
+
+    def _window(frm: str) -> list[date]:
+        return _date_range(depart_from, depart_to) if frm == origin else _date_range(return_from, return_to)
+
+    def _runs(frm: str, to: str) -> list[tuple[date, date]]:
+        return missing_runs(_window(frm), cached_days.get((frm, to), set()))
+
+    # Gaps of the partly cached directions come after, cheapest known direction first
+    partial = sorted(
+        (
+            (frm, to)
+            for d in candidates
+            for frm, to in ((origin, d), (d, origin))
+            if (frm, to) in cached_days
+        ),
+        key=lambda direction: coverage.get(direction, float("inf")),
+    )
+    to_fetch: list[tuple[str, str, date, date]] = [
+        (frm, to, run_from, run_to)
+        for frm, to in planned + partial
+        for run_from, run_to in _runs(frm, to)
+    ][:_MAX_NEW_CALLS_PER_SEARCH]
+
+    providers_in_order = await get_providers_in_order()
+    active_provider = providers_in_order[0][0] if providers_in_order else "none"
+
+    answers = await asyncio.gather(*[
+        search_one_way_cascade(
+            providers_in_order, frm, to, run_from, run_to,
+            direct_only=direct_only, max_results=10,
+        )
+        for frm, to, run_from, run_to in to_fetch
+    ])
+
+    n_fresh = 0
+    to_save: dict[tuple[str, str, date], list[FlightOffer]] = {}
+    for (frm, to, run_from, run_to), (_, offers) in zip(to_fetch, answers):
+        if not offers:
+            continue
+        n_fresh += 1
+        for single_date, day_offers in split_by_departure_date(offers, _date_range(run_from, run_to)).items():
+            to_save[(frm, to, single_date)] = day_offers
+    await save_to_cache_many(session, to_save)
+
+    # --- 4. Pairing in SQL
+    max_per_destination = max_results if destination is not None else 1
+    pairs = (await session.execute(_pairing_query(
+        origin, depart_from, depart_to, min_nights, max_nights,
+        destination, direct_only, max_per_destination, max_results,
+    ))).all()
+
+    # --- 5. Decode only the winning rows
+    row_ids = {p.out_id for p in pairs} | {p.in_id for p in pairs}
+    rows: dict[int, FlightCache] = {}
+    if row_ids:
+        detail = await session.execute(select(FlightCache).where(FlightCache.id.in_(row_ids)))
+        rows = {r.id: r for r in detail.scalars()}
+
+    results: list[dict] = []
+    for pair in pairs:
+        outbound = _cheapest_offer(rows[pair.out_id]) if pair.out_id in rows else None
+        inbound = _cheapest_offer(rows[pair.in_id]) if pair.in_id in rows else None
+        airport = airport_map.get(pair.destination)
+        if outbound is None or inbound is None or airport is None:
+            continue
+        results.append(_build_result(outbound, inbound, airport, int(pair.nights)))
+
+    # --- 6. Provider status
+    quotas = await get_provider_quotas()
+    provider_status = ProviderStatus(
+        active_provider=active_provider,
+        serpapi_remaining=quotas.get("serpapi", 0),
+        amadeus_remaining=quotas.get("amadeus", 0),
+        note=PROVIDER_NOTES.get(active_provider, ""),
+    )
+
+    return results, n_fresh == 0, provider_status
+
+
+def _build_result(
+    outbound: FlightOffer, inbound: FlightOffer, airport: Airport, nights: int
+) -> dict:
+    return {
+        "destination": airport.iata_code,
+        "destination_city": airport.city,
+        "latitude": airport.latitude,
+        "longitude": airport.longitude,
+        "nights": nights,
+        "total_price_eur": round(outbound.price_eur + inbound.price_eur, 2),
+        "outbound": outbound,
+        "inbound": inbound,
+    }
@@ -0,0 +1,128 @@
+"""
+Route Validator — geographic sanity check between Step 2 and Step 3 of Smart Multi-City.
+
+Candidate routes (from the LLM in particular) may name airports that do not
+exist, lie outside the explorable radius, or visit sensible stops in an order
+that zig-zags across the map. Every leg of them would cost a provider call
+before the route is discarded, or worse, ranked. Before pricing:
+
+    unknown airport   a stop missing from the airports registry (or inactive)  → dropped
+    out of radius     a stop not among AreaResult.airports                     → dropped
+    zig-zag           tour longer than _MAX_DETOUR_RATIO × the shortest
+                      ordering of the same stops                               → re-ordered
+    duplicate         same route as an earlier candidate (after re-ordering)   → dropped
+
+Routes are expected well formed (the engine's _is_valid_route: start and end
+at the origin, no repeated stop). The shortest ordering is found by brute
+force over the permutations of the stops, at most _MAX_STOPS_FOR_REORDER! =
+720 tours, summed from a table of the hops between the stops built once per
+route. Airports are looked up in one index built once per screen_routes() call.
+"""
+from dataclasses import dataclass, field, replace
+from itertools import permutations
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.airport import Airport
+from app.services.area_calculator import AreaResult, ReachableAirport
+from app.services.llm.base import SuggestedItinerary
+from app.utils.geo import haversine_km
+
+# A route is re-ordered when its tour is this much longer than the shortest one
+_MAX_DETOUR_RATIO = 1.3
+
+# Above this many stops the permutations are not tried (the route is kept as is)
+_MAX_STOPS_FOR_REORDER = 6
+
+
+@dataclass
+class ScreenedRoutes:
+    suggestions: list[SuggestedItinerary]
+    # dropped routes per reason: "unknown_airport", "out_of_radius", "duplicate"
+    dropped: dict[str, int] = field(default_factory=dict)
+    reordered: int = 0
+
+
+def _hop_km(a: ReachableAirport, b: ReachableAirport) -> float:
+    return haversine_km(a.latitude, a.longitude, b.latitude, b.longitude)
+
+
+def tour_km(route: list[str], airports: dict[str, ReachableAirport]) -> float:
+    """Length of a closed route origin → stops → origin; `airports` indexes the area by IATA code."""
+    stops = route[1:-1]
+    total = airports[stops[0]].distance_km + airports[stops[-1]].distance_km
+    for a, b in zip(stops, stops[1:]):
+        total += _hop_km(airports[a], airports[b])
+    return total
+
+
+def shortest_ordering(route: list[str], airports: dict[str, ReachableAirport]) -> list[str]:
+    """Same origin and stops, in the order with the shortest tour."""
+    origin, stops = route[0], route[1:-1]
+    if len(stops) > _MAX_STOPS_FOR_REORDER:
+        return route
+    hops = {(a, b): _hop_km(airports[a], airports[b]) for a, b in permutations(stops, 2)}
+
+    def length(order: tuple[str, ...]) -> float:
+        return (
+            airports[order[0]].distance_km + airports[order[-1]].distance_km
+            + sum(hops[a, b] for a, b in zip(order, order[1:]))
+        )
+
+    return [origin, *min(permutations(stops), key=length), origin]
+
+
+async def _registered_codes(session: AsyncSession, codes: set[str]) -> set[str]:
+    """The codes among `codes` that are active airports (one query)."""
+    if not codes:
+        return set()
+    rows = await session.execute(
+        select(Airport.iata_code).where(Airport.iata_code.in_(codes), Airport.is_active.is_(True))
+    )
+    return set(rows.scalars().all())
+
+
+async def screen_routes(
+    session: AsyncSession,
+    suggestions: list[SuggestedItinerary],
+    area: AreaResult,
+) -> ScreenedRoutes:
+    """
+    Drops the candidate routes that cannot be priced sensibly and re-orders
+    the zig-zagging ones (see module docstring). The registry is queried only
+    for stops outside the area, so routes within it cost no query.
+    """
+    in_area = {a.iata_code: a for a in area.airports}
+    outside = {code for s in suggestions for code in s.route[1:-1] if code not in in_area}
+    registered = await _registered_codes(session, outside)
+
+    result = ScreenedRoutes(suggestions=[])
+    seen: set[tuple[str, ...]] = set()
+    for suggested in suggestions:
+        stops = suggested.route[1:-1]
+        if any(code not in in_area and code not in registered for code in stops):
+            reason = "unknown_airport"
+        elif any(code not in in_area for code in stops):
+            reason = "out_of_radius"
+        else:
+            reason = None
+            current_km = tour_km(suggested.route, in_area)
+            shortest = shortest_ordering(suggested.route, in_area)
+            shortest_km = tour_km(shortest, in_area)
+            if current_km > _MAX_DETOUR_RATIO * shortest_km:
+                result.reordered += 1
+                suggested = replace(
+                    suggested,
+                    route=shortest,
+                    reasoning=f"{suggested.reasoning} (stops re-ordered: {current_km:.0f} → {shortest_km:.0f} km)",
+                )
+            if tuple(suggested.route) in seen:
+                reason = "duplicate"
+
+        if reason is not None:
+            result.dropped[reason] = result.dropped.get(reason, 0) + 1
+            continue
+        seen.add(tuple(suggested.route))
+        result.suggestions.append(suggested)
+    return result
@@ -3,11 +3,13 @@ Core logic for Reverse Search.
 
 Flow:
   1. Efficient batch query: finds all valid cache entries for
-     (any_origin → destination) on the requested dates.
-  2. For airports with no cache hit, calls providers in cascade order
-     (SerpAPI → Amadeus) until one returns results.
-     Maximum _MAX_NEW_CALLS_PER_SEARCH airports per search.
-  3. Saves new results to cache.
+     (any_origin → destination) on the requested dates. Dates already
+     fully loaded in the in-process LRU (db/memory_cache.py) skip the DB.
+  2. For the days each airport has no cache hit on, calls providers in cascade
+     order (SerpAPI → Amadeus) until one returns results: one call per run of
+     consecutive uncached days, airports with nothing cached first.
+     Maximum _MAX_NEW_CALLS_PER_SEARCH calls per search.
+  3. Saves new results to cache (one batched upsert after all provider calls).
   4. Returns an enriched list with airport coordinates + provider metadata.
 
 Monthly rate limiting is managed via Redis: separate key per provider
@@ -24,7 +26,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings  # noqa: F401 — kept for existing import compatibility
 from app.models.airport import Airport
 from app.models.flight_cache import FlightCache
-from app.db.cache import save_to_cache
+from app.db.cache import is_fresh, missing_runs, offers_from_row, save_to_cache_many, split_by_departure_date
+from app.db.memory_cache import offer_lru
 from app.models.schemas import ProviderStatus
 from app.services.providers.base import FlightOffer
 from app.services.providers.factory import (
@@ -33,6 +36,7 @@ from app.services.providers.factory import (
     PROVIDER_NOTES,
     get_provider_quotas,
     get_providers_in_order,
+    quota_units,
 )
 from app.utils.geo import haversine_km
 from app.utils.rate_limiter import check_rate_limit
@@ -43,11 +47,6 @@ logger = logging.getLogger(__name__)
 _MAX_NEW_CALLS_PER_SEARCH = 50
 
 
-def _cache_cutoff() -> datetime:
-    from app.config import settings as _s
-    return (datetime.now(timezone.utc) - timedelta(hours=_s.cache_ttl_hours)).replace(tzinfo=None)
-
-
 async def reverse_search(
     session: AsyncSession,
     destination: str,
@@ -97,61 +96,99 @@ async def reverse_search(
         current += timedelta(days=1)
 
     # --- 3. Checking in cache for (date_list)
-    stmt_cache = select(FlightCache).where(
-        FlightCache.destination == destination,
-        FlightCache.departure_date.in_(date_list),
-        FlightCache.fetched_at >= _cache_cutoff(),
-    )
-    cache_rows = await session.execute(stmt_cache)
-
+    #        In-process LRU first: dates whose rows are all in memory skip the DB.
     cache_best: dict[str, tuple[FlightOffer, datetime]] = {}
-    for single_flight_cache_obj in cache_rows.scalars():
-        offers = [FlightOffer(**item) for item in (single_flight_cache_obj.raw_response or [])]
-        if not offers:
-            continue
+    cached_days: dict[str, set[date]] = {}
+
+    def _keep_cheapest(origin: str, day: date, offers: list[FlightOffer], fetched_at: datetime) -> None:
+        cached_days.setdefault(origin, set()).add(day)
         cheapest = min(offers, key=lambda o: o.price_eur)
-        prev = cache_best.get(single_flight_cache_obj.origin)
+        prev = cache_best.get(origin)
         if prev is None or cheapest.price_eur < prev[0].price_eur:
-            cache_best[single_flight_cache_obj.origin] = (
-                cheapest, single_flight_cache_obj.fetched_at
+            cache_best[origin] = (cheapest, fetched_at)
+
+    dates_to_query: list[date] = []
+    for single_date in date_list:
+        scanned = offer_lru.scanned_origins(destination, single_date)
+        if scanned is None:
+            dates_to_query.append(single_date)
+            continue
+        for origin in scanned:
+            entry = offer_lru.get((origin, destination, single_date))
+            if entry is not None and entry.offers:
+                _keep_cheapest(origin, single_date, entry.offers, entry.fetched_at)
+
+    if dates_to_query:
+        stmt_cache = select(FlightCache).where(
+            FlightCache.destination == destination,
+            FlightCache.departure_date.in_(dates_to_query),
+            is_fresh(),
+        )
+        cache_rows = await session.execute(stmt_cache)
+
+        found: dict[date, set[str]] = {d: set() for d in dates_to_query}
+        for single_flight_cache_obj in cache_rows.scalars():
+            offers = offers_from_row(single_flight_cache_obj)
+            if not offers:
+                continue
+            offer_lru.put(
+                (single_flight_cache_obj.origin, destination, single_flight_cache_obj.departure_date),
+                offers,
+                single_flight_cache_obj.fetched_at,
+                single_flight_cache_obj.expires_at,
+            )
+            found.setdefault(single_flight_cache_obj.departure_date, set()).add(
+                single_flight_cache_obj.origin
             )
+            _keep_cheapest(
+                single_flight_cache_obj.origin,
+                single_flight_cache_obj.departure_date,
+                offers,
+                single_flight_cache_obj.fetched_at,
+            )
+
+        for single_date, origins in found.items():
+            offer_lru.mark_scanned(destination, single_date, origins)
 
-    # --- 4. Missing origins
-    all_origins = set(airport_map.keys())
-    cached_origins = set(cache_best.keys())
-    missing_origins = list(all_origins - cached_origins)[:_MAX_NEW_CALLS_PER_SEARCH]
+    # --- 4. Missing days per origin (one call per run of uncached days),
+    #        origins with nothing cached first
+    to_fetch: list[tuple[str, date, date]] = [
+        (origin, run_from, run_to)
+        for origin in sorted(airport_map, key=lambda o: o in cached_days)
+        for run_from, run_to in missing_runs(date_list, cached_days.get(origin, set()))
+    ][:_MAX_NEW_CALLS_PER_SEARCH]
 
     # --- 5. Cascade provider setup
     providers_in_order = await get_providers_in_order()
     active_provider = providers_in_order[0][0] if providers_in_order else "none"
 
     fresh_best: dict[str, FlightOffer] = {}
+    to_save: dict[tuple[str, str, date], list[FlightOffer]] = {}
 
-    async def _fetch(origin: str) -> None:
+    async def _fetch(origin: str, run_from: date, run_to: date) -> None:
         for provider_name, provider in providers_in_order:
             rate_key = f"{provider_name}:monthly"
             allowed = await check_rate_limit(
-                rate_key, PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW
+                rate_key, PROVIDER_LIMITS[provider_name], MONTHLY_WINDOW,
+                cost=quota_units(provider_name, run_from, run_to),
             )
             if not allowed:
                 continue
             try:
                 offers = await provider.search_one_way(
-                    origin, destination, date_from, date_to,
+                    origin, destination, run_from, run_to,
                     direct_only=direct_only, max_results=10,
                 )
                 if not offers:
                     continue
 
-                # Save to cache per date
-                for single_date in date_list:
-                    day_offers = [
-                        o for o in offers
-                        if o.departure.startswith(single_date.isoformat())
-                    ]
-                    if day_offers:
-                        await save_to_cache(session, origin, destination, single_date, day_offers)
-                fresh_best[origin] = min(offers, key=lambda o: o.price_eur)
+                # Saved per date after the gather, in one batch
+                run_days = [d for d in date_list if run_from <= d <= run_to]
+                for single_date, day_offers in split_by_departure_date(offers, run_days).items():
+                    to_save[(origin, destination, single_date)] = day_offers
+                cheapest = min(offers, key=lambda o: o.price_eur)
+                if origin not in fresh_best or cheapest.price_eur < fresh_best[origin].price_eur:
+                    fresh_best[origin] = cheapest
                 return  # provider responded: skip remaining providers
 
             except Exception as exc:
@@ -161,21 +198,22 @@ async def reverse_search(
                 )
                 continue  # try the next provider
 
-    await asyncio.gather(*[_fetch(o) for o in missing_origins])
+    await asyncio.gather(*[_fetch(o, run_from, run_to) for o, run_from, run_to in to_fetch])
+    await save_to_cache_many(session, to_save)
 
-    # --- 6. Assembling the answer
+    # --- 6. Assembling the answer: cheapest of the cached and fresh days per origin
     results: list[dict] = []
-
-    for origin, (offer, fetched_at) in cache_best.items():
-        airport = airport_map.get(origin)
-        if airport:
-            results.append(_build_result(offer, airport, fetched_at))
-
     now = datetime.now(timezone.utc)
-    for origin, offer in fresh_best.items():
+    for origin in cache_best.keys() | fresh_best.keys():
         airport = airport_map.get(origin)
-        if airport:
-            results.append(_build_result(offer, airport, now))
+        if not airport:
+            continue
+        cached = cache_best.get(origin)
+        fresh = fresh_best.get(origin)
+        if fresh is not None and (cached is None or fresh.price_eur < cached[0].price_eur):
+            results.append(_build_result(fresh, airport, now))
+        else:
+            results.append(_build_result(cached[0], airport, cached[1]))
 
     results.sort(key=lambda r: r["price_eur"])
     results = results[:max_results]
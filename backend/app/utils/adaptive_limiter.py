@@ -0,0 +1,189 @@
+"""
+Adaptive concurrency limit per upstream provider (AIMD).
+
+A fixed semaphore is either too small on quiet days (throughput left on the
+table) or too large on busy ones (429 storms, then exponential backoff). Each
+provider gets instead one AdaptiveLimiter, shared by every call site in the
+worker, whose limit follows the upstream behaviour:
+
+    additive increase        +1 per `limit` healthy calls (≈ +1 per round of
+                             concurrent calls), only while the latency EWMA is
+                             under the target and the error-rate EWMA is low
+    multiplicative decrease  × _BACKOFF_FACTOR on overload (HTTP 429, timeout),
+                             at most once per _DECREASE_COOLDOWN_S so a single
+                             burst of 429s counts as one signal
+
+Usage (one slot per upstream HTTP call):
+
+    async with get_limiter("amadeus").slot() as call:
+        resp = await client.get(...)
+        if resp.status_code == 429:
+            call.overloaded()
+
+Exceptions raised inside the block count as errors (not as overload: wrap
+timeouts and call call.overloaded() explicitly). A cancelled call gives no
+feedback. Latency is measured from slot entry, or from call.started() when
+the block waits on something else first (e.g. a pacing token).
+
+State is per process, like the in-process LRU: limiter_stats() is exposed by
+GET /api/v1/metrics/providers.
+"""
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+_BACKOFF_FACTOR = 0.5
+_DECREASE_COOLDOWN_S = 1.0
+# Weight of the latest call in the latency / error-rate EWMAs
+_EWMA_ALPHA = 0.2
+# Error rate above which the limit stops growing
+_MAX_HEALTHY_ERROR_RATE = 0.1
+
+
+class _Call:
+    """Outcome of one call, filled in by the call site."""
+
+    def __init__(self) -> None:
+        self.overload = False
+        self.start = time.monotonic()
+
+    def started(self) -> None:
+        """The upstream call starts now: the wait before it is not latency."""
+        self.start = time.monotonic()
+
+    def overloaded(self) -> None:
+        """The upstream pushed back (429, timeout): shrink the limit."""
+        self.overload = True
+
+
+class AdaptiveLimiter:
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        max_limit: int,
+        latency_target_s: float,
+        min_limit: int = 1,
+    ) -> None:
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_s = latency_target_s
+        self._limit = float(initial)
+        self._in_flight = 0
+        # futures of the callers waiting for a slot, FIFO; created on the running
+        # loop at wait time, so the limiter is not bound to any event loop
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._latency_ewma: float | None = None
+        self._error_ewma = 0.0
+        self._calls = 0
+        self._errors = 0
+        self._overloads = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[_Call]:
+        await self._acquire()
+        call = _Call()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(time.monotonic() - call.start, call.overload, error=True)
+            raise
+        else:
+            self._record(time.monotonic() - call.start, call.overload, error=call.overload)
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # slot handed over just before the cancellation: give it back
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    def _record(self, latency_s: float, overload: bool, error: bool) -> None:
+        self._calls += 1
+        self._errors += error
+        self._error_ewma += _EWMA_ALPHA * (float(error) - self._error_ewma)
+
+        if overload:
+            self._overloads += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= _DECREASE_COOLDOWN_S:
+                self._last_decrease = now
+                self._limit = max(float(self.min_limit), self._limit * _BACKOFF_FACTOR)
+            return
+
+        if not error:
+            self._latency_ewma = latency_s if self._latency_ewma is None else (
+                self._latency_ewma + _EWMA_ALPHA * (latency_s - self._latency_ewma)
+            )
+            if self._latency_ewma <= self.latency_target_s and self._error_ewma <= _MAX_HEALTHY_ERROR_RATE:
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+                self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "latency_ewma_ms": None if self._latency_ewma is None else int(self._latency_ewma * 1000),
+            "latency_target_ms": int(self.latency_target_s * 1000),
+            "error_rate": round(self._error_ewma, 3),
+            "calls": self._calls,
+            "errors": self._errors,
+            "overloads": self._overloads,
+        }
+
+
+_LIMITERS: dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(
+    name: str,
+    initial: int = 4,
+    max_limit: int = 16,
+    latency_target_s: float = 5.0,
+) -> AdaptiveLimiter:
+    """The worker's limiter for `name`; the parameters only apply on first use."""
+    if name not in _LIMITERS:
+        _LIMITERS[name] = AdaptiveLimiter(name, initial, max_limit, latency_target_s)
+    return _LIMITERS[name]
+
+
+def limiter_stats() -> list[dict]:
+    """Current state of every limiter of this worker."""
+    return [limiter.stats() for limiter in _LIMITERS.values()]
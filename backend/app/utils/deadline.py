@@ -0,0 +1,66 @@
+"""
+Request deadline shared by the steps of a long pipeline.
+
+An outer asyncio.wait_for() cancels everything at once when it fires, losing
+the work already done. A Deadline is passed down instead: each step takes its
+share of the time left and stops waiting when it runs out, so the caller can
+still answer with what was completed.
+
+    deadline = Deadline(55)
+    llm_deadline = deadline.share(0.6)          # 60% of the time left
+    result = await llm_deadline.run(call())     # TimeoutError once it expires
+    done, _ = await asyncio.wait(tasks, timeout=deadline.timeout())
+
+Deadline.never() has no limit: run() awaits plainly and timeout() is None.
+"""
+import asyncio
+import math
+import time
+from collections.abc import Awaitable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class Deadline:
+
+    def __init__(self, seconds: float) -> None:
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def never(cls) -> "Deadline":
+        return cls(math.inf)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative (inf for Deadline.never())."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def timeout(self) -> float | None:
+        """remaining() in the form asyncio timeouts take: None when unlimited."""
+        remaining = self.remaining()
+        return None if remaining == math.inf else remaining
+
+    def share(self, fraction: float, reserve_s: float = 0.0) -> "Deadline":
+        """
+        Sub-deadline for one step: `fraction` of the time left after keeping
+        `reserve_s` seconds for what comes after. Never later than this one.
+        """
+        remaining = self.remaining()
+        if remaining == math.inf:
+            return Deadline.never()
+        return Deadline(max(0.0, remaining - reserve_s) * fraction)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Awaits within the deadline. Raises TimeoutError when it expires."""
+        timeout = self.timeout()
+        if timeout is None:
+            return await awaitable
+        if timeout == 0.0:
+            # already expired: do not even start
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise TimeoutError("deadline expired")
+        return await asyncio.wait_for(awaitable, timeout)
@@ -7,8 +7,9 @@ Uso tipico:
         raise HTTPException(429, "Rate limit SerpAPI raggiunto")
 
 Note:
-- Il contatore è incrementato ad ogni chiamata.
-- Il TTL viene impostato solo alla prima chiamata nella finestra (incr → 1).
+- Il contatore è incrementato ad ogni chiamata, di `cost` unità (default 1):
+  una ricerca su N giorni fatta con N richieste upstream ne consuma N.
+- Il TTL viene impostato solo alla prima chiamata nella finestra (incrby → cost).
 - Non è atomico al 100% su race condition estreme, ma è sufficiente per questo use case.
 """
 from app.db.redis import get_redis
@@ -18,6 +19,7 @@ async def check_rate_limit(
     key: str,
     max_calls: int,
     window_seconds: int,
+    cost: int = 1,
 ) -> bool:
     """
     Verifica e incrementa il contatore per la chiave data.
@@ -26,13 +28,14 @@ async def check_rate_limit(
         key:            Chiave Redis (es. "serpapi:monthly").
         max_calls:      Numero massimo di chiamate permesse nella finestra.
         window_seconds: Durata della finestra in secondi.
+        cost:           Unità consumate da questa chiamata (richieste upstream).
 
     Returns:
         True se la chiamata è permessa, False se il limite è raggiunto.
     """
     redis = await get_redis()
-    count = await redis.incr(key)
-    if count == 1:
+    count = await redis.incrby(key, cost)
+    if count == cost:
         # Prima chiamata nella finestra: imposta il TTL
         await redis.expire(key, window_seconds)
     return count <= max_calls
@@ -0,0 +1,36 @@
+"""
+Token bucket pacing outgoing requests to a fixed rate (per worker).
+
+The adaptive limiter (utils/adaptive_limiter.py) bounds how many calls are in
+flight and reacts to 429s after they happen; an upstream with a hard
+requests-per-second cap (Amadeus: ~10 req/s) is better never exceeded:
+
+    _BUCKET = TokenBucket(rate_per_s=8, burst=8)
+
+    await _BUCKET.acquire()     # returns at once while tokens are left,
+    resp = await client.get()   # otherwise sleeps until the next one is due
+
+Tokens are reserved in arrival order: a caller finding the bucket empty takes
+the next token in advance (the balance goes negative) and sleeps until it is
+due, so concurrent callers are spaced 1/rate apart without polling. A caller
+cancelled while sleeping does not give its token back (conservative).
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+
+    def __init__(self, rate_per_s: float, burst: int) -> None:
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate_per_s)
@@ -9,9 +9,18 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from app.db.memory_cache import offer_lru
 from app.services.providers.base import FlightOffer
 
 
+@pytest.fixture(autouse=True)
+def _empty_offer_lru():
+    """L'LRU in-process è globale: ogni test parte da cache vuota."""
+    offer_lru.clear()
+    yield
+    offer_lru.clear()
+
+
 # ---------------------------------------------------------------------------
 # Aeroporti fittizi
 # ---------------------------------------------------------------------------
@@ -0,0 +1,130 @@
+"""
+Test per il limitatore di concorrenza adattivo (utils/adaptive_limiter.py).
+
+Nessuna dipendenza esterna: le chiamate sono blocchi `async with slot()`
+con latenze simulate patchando time.monotonic dove serve.
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.adaptive_limiter import AdaptiveLimiter, get_limiter, limiter_stats
+
+
+async def _calls(limiter, n, overload=False):
+    for _ in range(n):
+        async with limiter.slot() as call:
+            if overload:
+                call.overloaded()
+
+
+class TestAimd:
+
+    async def test_healthy_calls_raise_the_limit_additively(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=10, latency_target_s=5.0)
+        # +1/limit per chiamata, cioè circa +1 ogni `limit` chiamate: 2 → 4 in 6 chiamate
+        await _calls(limiter, 6)
+        assert limiter.limit == 4
+
+    async def test_limit_capped_at_max(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=3, latency_target_s=5.0)
+        await _calls(limiter, 50)
+        assert limiter.limit == 3
+
+    async def test_overload_halves_once_per_burst(self):
+        limiter = AdaptiveLimiter("t", initial=8, max_limit=10, latency_target_s=5.0)
+        await _calls(limiter, 3, overload=True)
+        # tre 429 ravvicinati = un solo dimezzamento
+        assert limiter.limit == 4
+        assert limiter.stats()["overloads"] == 3
+
+    async def test_never_below_min(self):
+        limiter = AdaptiveLimiter("t", initial=1, max_limit=10, latency_target_s=5.0)
+        await _calls(limiter, 1, overload=True)
+        assert limiter.limit == 1
+
+    async def test_slow_upstream_holds_the_limit(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=10, latency_target_s=1.0)
+        clock = iter([0.0, 3.0] * 10)
+        with patch("app.utils.adaptive_limiter.time.monotonic", side_effect=lambda: next(clock)):
+            await _calls(limiter, 5)
+        assert limiter.limit == 2
+        assert limiter.stats()["latency_ewma_ms"] == 3000
+
+    async def test_latency_measured_from_started(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=10, latency_target_s=1.0)
+        # ingresso nello slot a 0, attesa del ritmo fino a 5, risposta a 5.2
+        clock = iter([0.0, 5.0, 5.2])
+        with patch("app.utils.adaptive_limiter.time.monotonic", side_effect=lambda: next(clock)):
+            async with limiter.slot() as call:
+                call.started()
+        assert limiter.stats()["latency_ewma_ms"] == 200
+
+    async def test_errors_stop_the_growth(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=10, latency_target_s=5.0)
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                async with limiter.slot():
+                    raise RuntimeError("boom")
+        await _calls(limiter, 4)
+        # error rate ancora sopra la soglia: nessun aumento
+        assert limiter.limit == 2
+        assert limiter.stats()["errors"] == 3
+
+
+class TestConcurrency:
+
+    async def test_calls_beyond_the_limit_wait(self):
+        limiter = AdaptiveLimiter("t", initial=2, max_limit=2, latency_target_s=5.0)
+        release = asyncio.Event()
+        running = 0
+        peak = 0
+
+        async def call():
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                await release.wait()
+                running -= 1
+
+        tasks = [asyncio.create_task(call()) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert limiter.stats()["in_flight"] == 2 and limiter.stats()["waiting"] == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert peak == 2
+        assert limiter.stats()["in_flight"] == 0
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        limiter = AdaptiveLimiter("t", initial=1, max_limit=1, latency_target_s=5.0)
+        release = asyncio.Event()
+
+        async def call():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(call())
+        waiter = asyncio.create_task(call())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await holder
+
+        async with limiter.slot():
+            assert limiter.stats()["in_flight"] == 1
+        assert limiter.stats()["in_flight"] == 0 and limiter.stats()["waiting"] == 0
+
+
+class TestRegistry:
+
+    def test_one_limiter_per_provider_in_the_stats(self):
+        import app.services.providers.factory  # noqa: F401 — i provider registrano il limitatore all'import
+
+        limiter = get_limiter("test-provider", initial=3, max_limit=5)
+        assert get_limiter("test-provider") is limiter
+        stats = {s["provider"]: s for s in limiter_stats()}
+        assert stats["test-provider"]["limit"] == 3
+        assert {"serpapi", "amadeus", "apify"} <= set(stats)
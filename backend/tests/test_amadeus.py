@@ -0,0 +1,201 @@
+"""
+Test per AmadeusProvider: pricing multi-city in blocco (anche per tratte
+non collegate, search_legs) e ricerca su un intervallo di date.
+
+Le chiamate HTTP sono mockate: _post_offers (POST multi-city), search_one_way
+(GET per tratta, usato come fallback) e _search_day (GET per singolo giorno).
+"""
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from app.services.providers import amadeus
+from app.services.providers.amadeus import (
+    _MAX_DAYS_IN_RANGE,
+    _MAX_ORIGIN_DESTINATIONS,
+    AmadeusProvider,
+    _split_multi_city_offer,
+)
+from app.services.providers.base import FlightOffer, Leg
+
+
+def _itinerary(origin, destination, day, minutes):
+    return {
+        "duration": f"PT{minutes // 60}H{minutes % 60}M",
+        "segments": [{
+            "departure": {"iataCode": origin, "at": f"{day}T08:00:00"},
+            "arrival": {"iataCode": destination},
+            "carrierCode": "AZ",
+        }],
+    }
+
+
+def _ticket(legs, total, minutes=60):
+    return {
+        "price": {"total": str(total)},
+        "itineraries": [_itinerary(leg.origin, leg.destination, leg.date.isoformat(), minutes) for leg in legs],
+    }
+
+
+LEGS = [Leg("CTA", "FCO", date(2026, 6, 1)), Leg("FCO", "ATH", date(2026, 6, 5)), Leg("ATH", "CTA", date(2026, 6, 9))]
+
+
+def test_ticket_price_shared_by_flight_time():
+    item = _ticket(LEGS[:2], 150.0)
+    item["itineraries"][1]["duration"] = "PT2H"
+    offers = _split_multi_city_offer(item)
+    # 60 + 120 minuti → 50 + 100 €
+    assert [o.price_eur for o in offers] == [50.0, 100.0]
+    assert [(o.origin, o.destination) for o in offers] == [("CTA", "FCO"), ("FCO", "ATH")]
+
+
+async def test_one_post_per_itinerary_cheapest_ticket_wins():
+    provider = AmadeusProvider("k", "s")
+    post = AsyncMock(return_value=[_ticket(LEGS, 300.0), _ticket(LEGS, 240.0)])
+    with patch.object(provider, "_post_offers", new=post), \
+         patch.object(provider, "search_one_way", new=AsyncMock()) as one_way:
+        offers = await provider.search_multi_city(LEGS)
+
+    assert post.await_count == 1
+    one_way.assert_not_called()
+    body = post.await_args.args[0]
+    assert [od["originLocationCode"] for od in body["originDestinations"]] == ["CTA", "FCO", "ATH"]
+    assert sum(o.price_eur for o in offers) == pytest.approx(240.0)
+
+
+async def test_long_itinerary_split_in_groups():
+    legs = [Leg("CTA", f"A{i}", date(2026, 6, 1 + i)) for i in range(_MAX_ORIGIN_DESTINATIONS + 2)]
+    provider = AmadeusProvider("k", "s")
+
+    async def post(body):
+        group = [Leg(od["originLocationCode"], od["destinationLocationCode"],
+                     date.fromisoformat(od["departureDateTimeRange"]["date"])) for od in body["originDestinations"]]
+        return [_ticket(group, 10.0 * len(group))]
+
+    with patch.object(provider, "_post_offers", new=AsyncMock(side_effect=post)) as mock_post:
+        offers = await provider.search_multi_city(legs)
+
+    assert mock_post.await_count == 2
+    assert len(offers) == len(legs)
+
+
+async def test_failed_post_falls_back_to_per_leg_calls():
+    provider = AmadeusProvider("k", "s")
+
+    async def one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+        return [FlightOffer(origin, destination, f"{date_from}T08:00:00", 70.0, "AZ", True, 60)]
+
+    with patch.object(provider, "_post_offers", new=AsyncMock(return_value=None)), \
+         patch.object(provider, "search_one_way", new=AsyncMock(side_effect=one_way)) as mock_one_way:
+        offers = await provider.search_multi_city(LEGS)
+
+    assert mock_one_way.await_count == 3
+    assert [o.price_eur for o in offers] == [70.0, 70.0, 70.0]
+
+
+async def test_search_legs_prices_the_itinerary_with_one_post():
+    provider = AmadeusProvider("k", "s")
+    post = AsyncMock(return_value=[_ticket(LEGS, 240.0)])
+    with patch.object(provider, "_post_offers", new=post):
+        found = await provider.search_legs(LEGS)
+
+    assert provider.max_legs_per_call == _MAX_ORIGIN_DESTINATIONS
+    assert post.await_count == 1
+    # le tratte dell'itinerario nel loro ordine di viaggio
+    sent = post.await_args.args[0]["originDestinations"]
+    assert [(od["originLocationCode"], od["destinationLocationCode"]) for od in sent] == [
+        (leg.origin, leg.destination) for leg in LEGS
+    ]
+    # una quota del biglietto per tratta (mai salvata in cache)
+    assert list(found) == [(leg.origin, leg.destination, leg.date) for leg in LEGS]
+    assert all(offers[0].ticket_share for offers in found.values())
+    assert sum(offers[0].price_eur for offers in found.values()) == pytest.approx(240.0)
+
+
+async def test_search_legs_raises_when_every_post_fails():
+    provider = AmadeusProvider("k", "s")
+    with patch.object(provider, "_post_offers", new=AsyncMock(return_value=None)):
+        with pytest.raises(RuntimeError):
+            await provider.search_legs(LEGS)
+
+
+async def test_search_legs_without_ticket_omits_the_legs():
+    provider = AmadeusProvider("k", "s")
+    with patch.object(provider, "_post_offers", new=AsyncMock(return_value=[])):
+        assert await provider.search_legs(LEGS) == {}
+
+
+def _offer(day, price):
+    return FlightOffer(
+        origin="CTA", destination="FCO", departure=f"{day.isoformat()}T08:00:00",
+        price_eur=price, airline="AZ", direct=True, duration_minutes=60,
+    )
+
+
+async def test_date_range_one_request_per_day_merged():
+    provider = AmadeusProvider("k", "s")
+    start = date(2026, 6, 1)
+
+    async def search_day(origin, destination, day, direct_only, max_results):
+        return [_offer(day, 100.0 - (day - start).days * 10)]
+
+    with patch.object(provider, "_search_day", new=AsyncMock(side_effect=search_day)) as day_search:
+        offers = await provider.search_one_way("CTA", "FCO", start, start + timedelta(days=2))
+
+    assert sorted(c.args[2] for c in day_search.await_args_list) == [start + timedelta(days=i) for i in range(3)]
+    # unite e ordinate per prezzo: il giorno più economico per primo
+    assert [o.price_eur for o in offers] == [80.0, 90.0, 100.0]
+
+
+async def test_date_range_capped_and_failed_days_skipped():
+    provider = AmadeusProvider("k", "s")
+    start = date(2026, 6, 1)
+
+    async def search_day(origin, destination, day, direct_only, max_results):
+        if day == start:
+            raise RuntimeError("boom")
+        return [_offer(day, 50.0)]
+
+    with patch.object(provider, "_search_day", new=AsyncMock(side_effect=search_day)) as day_search:
+        offers = await provider.search_one_way("CTA", "FCO", start, start + timedelta(days=30), max_results=3)
+
+    assert day_search.await_count == _MAX_DAYS_IN_RANGE
+    assert len(offers) == 3
+    assert all(not o.departure.startswith(start.isoformat()) for o in offers)
+
+
+async def test_pacing_token_taken_inside_the_limiter_slot():
+    """Token OAuth prima dello slot; token del bucket dentro, subito prima della richiesta,
+    così le chiamate in coda sul limitatore non partono a raffica oltre il ritmo."""
+    provider = AmadeusProvider("k", "s")
+    steps = []
+
+    async def get_token(client):
+        steps.append("oauth")
+        return "tok"
+
+    async def acquire():
+        steps.append("bucket")
+
+    @asynccontextmanager
+    async def slot():
+        steps.append("slot")
+        call = MagicMock()
+        call.started.side_effect = lambda: steps.append("clock")
+        yield call
+
+    async def request(self, method, url, **kwargs):
+        steps.append(method)
+        return httpx.Response(200, json={"data": []}, request=httpx.Request(method, url))
+
+    with patch.object(provider, "_get_token", new=get_token), \
+         patch.object(amadeus._BUCKET, "acquire", new=acquire), \
+         patch.object(amadeus._LIMITER, "slot", new=slot), \
+         patch.object(httpx.AsyncClient, "request", new=request):
+        offers = await provider._search_day("CTA", "FCO", date(2026, 6, 1), False, 10)
+
+    assert offers == []
+    assert steps == ["oauth", "slot", "bucket", "clock", "GET"]
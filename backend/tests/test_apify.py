@@ -0,0 +1,79 @@
+"""
+Test per il pricing multi-city di un itinerario con ApifyProvider.search_legs
+(anche con esecuzioni dell'actor fallite).
+
+_run_actor è mockato: nessuna chiamata ad Apify.
+"""
+import json
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+from app.services.providers.apify import _MAX_LEGS_PER_RUN, ApifyProvider
+from app.services.providers.base import Leg
+
+
+def _item(origin, destination, day, price, stops=1):
+    flights = [
+        {"departure_airport": {"id": origin, "time": f"{day} 08:00"}, "arrival_airport": {"id": "XXX"}, "airline": "FR"},
+    ] * (stops - 1) + [
+        {"departure_airport": {"id": origin, "time": f"{day} 08:00"}, "arrival_airport": {"id": destination}, "airline": "FR"},
+    ]
+    return {"flights": flights, "total_duration": 90, "price": price}
+
+
+async def test_long_itinerary_split_into_runs_and_demultiplexed():
+    legs = [Leg("CTA", f"A{i}", date(2026, 6, 1 + i)) for i in range(7)]
+
+    async def fake_run_actor(actor_input):
+        requested = json.loads(actor_input["multi_city_json"])
+        items = [_item(leg["departure_id"], leg["arrival_id"], leg["date"], 40.0) for leg in requested]
+        # offerta di una tratta non richiesta: scartata
+        items.append(_item("CTA", "ZZZ", "2026-06-01", 10.0))
+        return [{"best_flights": items}]
+
+    run_actor = AsyncMock(side_effect=fake_run_actor)
+    with patch("app.services.providers.apify._run_actor", new=run_actor):
+        found = await ApifyProvider().search_legs(legs)
+
+    # 7 tratte → 2 esecuzioni dell'actor invece di 7
+    assert run_actor.await_count == 2
+    assert [len(json.loads(c.args[0]["multi_city_json"])) for c in run_actor.await_args_list] == [_MAX_LEGS_PER_RUN, 2]
+    assert set(found) == {(leg.origin, leg.destination, leg.date) for leg in legs}
+    assert found[("CTA", "A3", date(2026, 6, 4))][0].price_eur == 40.0
+    # risultati multi-city, non tariffe one-way: mai salvati in flight_cache
+    assert all(o.ticket_share for offers in found.values() for o in offers)
+
+
+async def test_direct_only_filters_connections():
+    legs = [Leg("CTA", "ATH", date(2026, 6, 1))]
+    pages = [{"best_flights": [_item("CTA", "ATH", "2026-06-01", 30.0, stops=2), _item("CTA", "ATH", "2026-06-01", 55.0)]}]
+
+    run_actor = AsyncMock(return_value=pages)
+    with patch("app.services.providers.apify._run_actor", new=run_actor):
+        found = await ApifyProvider().search_legs(legs, direct_only=True)
+
+    assert run_actor.await_args.args[0]["max_stops"] == 0
+    assert [o.price_eur for o in found[("CTA", "ATH", date(2026, 6, 1))]] == [55.0]
+
+
+async def test_failed_runs_lose_only_their_legs():
+    legs = [Leg("CTA", f"A{i}", date(2026, 6, 1 + i)) for i in range(_MAX_LEGS_PER_RUN + 1)]
+
+    async def fake_run_actor(actor_input):
+        requested = json.loads(actor_input["multi_city_json"])
+        if len(requested) == 1:
+            raise RuntimeError("actor run failed")
+        return [{"best_flights": [_item(leg["departure_id"], leg["arrival_id"], leg["date"], 40.0) for leg in requested]}]
+
+    with patch("app.services.providers.apify._run_actor", new=AsyncMock(side_effect=fake_run_actor)):
+        found = await ApifyProvider().search_legs(legs)
+
+    assert len(found) == _MAX_LEGS_PER_RUN
+    assert ("CTA", f"A{_MAX_LEGS_PER_RUN}", legs[-1].date) not in found
+
+
+async def test_every_run_failed_returns_no_legs():
+    """Esecuzioni fallite (_run_actor restituisce [] sugli errori HTTP): nessuna tratta, il chiamante ripiega."""
+    legs = [Leg("CTA", "ATH", date(2026, 6, 1)), Leg("ATH", "CTA", date(2026, 6, 5))]
+    with patch("app.services.providers.apify._run_actor", new=AsyncMock(return_value=[])):
+        assert await ApifyProvider().search_legs(legs) == {}
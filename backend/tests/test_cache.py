@@ -0,0 +1,164 @@
+"""
+Test per le letture/scritture batch della cache (get_cached_many / save_to_cache_many)
+e per earliest_expiry.
+"""
+from dataclasses import asdict, replace
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db.cache import earliest_expiry, get_cached_many, missing_runs, save_to_cache_many
+from app.db.memory_cache import offer_lru
+from app.services.providers.base import FlightOffer
+
+DAY = date.today() + timedelta(days=10)
+
+
+def _offer(origin, destination, price=50.0):
+    return FlightOffer(origin, destination, f"{DAY.isoformat()}T08:00:00", price, "ITA", True, 90)
+
+
+def _row(origin, destination, offers):
+    row = MagicMock()
+    row.origin = origin
+    row.destination = destination
+    row.departure_date = DAY
+    row.fetched_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    row.expires_at = row.fetched_at + timedelta(hours=6)
+    row.raw_response = [asdict(o) for o in offers]
+    row.raw_packed = None
+    return row
+
+
+def _session_returning(rows):
+    result = MagicMock()
+    result.scalars.return_value = iter(rows)
+    session = AsyncMock()
+    session.execute.return_value = result
+    return session
+
+
+class TestGetCachedMany:
+
+    async def test_single_unnest_query_for_all_keys(self):
+        session = _session_returning([_row("FCO", "CTA", [_offer("FCO", "CTA")])])
+        keys = [("FCO", "CTA", DAY), ("ATH", "CTA", DAY)]
+
+        found = await get_cached_many(session, keys)
+
+        assert session.execute.await_count == 1
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "unnest(" in sql
+        assert list(found) == [("FCO", "CTA", DAY)]
+        assert found[("FCO", "CTA", DAY)][0][0].price_eur == 50.0
+
+    async def test_lru_is_used_and_misses_are_remembered(self):
+        session = _session_returning([_row("FCO", "CTA", [_offer("FCO", "CTA")])])
+        keys = [("FCO", "CTA", DAY), ("ATH", "CTA", DAY)]
+        await get_cached_many(session, keys)
+
+        # seconda chiamata: hit e miss vengono entrambi dalla memoria
+        session.execute.reset_mock()
+        found = await get_cached_many(session, keys)
+        session.execute.assert_not_called()
+        assert list(found) == [("FCO", "CTA", DAY)]
+
+
+class TestSaveToCacheMany:
+
+    async def test_one_upsert_for_many_keys(self):
+        previous = MagicMock()
+        previous.all.return_value = [("FCO", "CTA", DAY, Decimal("35.00"), None)]
+        session = AsyncMock()
+        session.begin_nested = MagicMock()
+        session.execute.side_effect = [previous, MagicMock(), MagicMock()]
+        entries = {
+            ("FCO", "CTA", DAY): [_offer("FCO", "CTA", 40.0), _offer("FCO", "CTA", 30.0)],
+            ("ATH", "CTA", DAY): [_offer("ATH", "CTA")],
+            ("BUD", "CTA", DAY): [],                                        # vuota: saltata
+            ("BER", "CTA", date(2000, 1, 1)): [_offer("BER", "CTA")],       # fuori partizioni
+        }
+        with patch("app.db.cache.publish_invalidation", new=AsyncMock()) as publish:
+            await save_to_cache_many(session, entries)
+
+        # osservazioni precedenti + un solo upsert + append nello storico prezzi
+        assert session.execute.await_count == 3
+        rows = session.execute.await_args_list[1].args[1]
+        history = session.execute.await_args_list[2].args[1]
+        assert {(h["origin"], h["min_price_eur"], h["sample_count"]) for h in history} == {("FCO", 30.0, 2), ("ATH", 50.0, 1)}
+        assert {(r["origin"], r["price_eur"]) for r in rows} == {("FCO", 30.0), ("ATH", 50.0)}
+        by_origin = {r["origin"]: r for r in rows}
+        assert by_origin["FCO"]["price_volatility"] == pytest.approx(5 / 35, abs=1e-4)
+        assert by_origin["ATH"]["price_volatility"] is None
+        assert all(r["expires_at"] > r["fetched_at"] for r in rows)
+        session.commit.assert_awaited_once()
+        publish.assert_awaited_once_with([("FCO", "CTA", DAY), ("ATH", "CTA", DAY)])
+        assert offer_lru.get(("ATH", "CTA", DAY)).offers[0].origin == "ATH"
+
+    async def test_history_failure_keeps_cache_write(self):
+        previous = MagicMock()
+        previous.all.return_value = []
+        session = AsyncMock()
+        session.begin_nested = MagicMock()
+        session.execute.side_effect = [previous, MagicMock(), RuntimeError("no partition")]
+        with patch("app.db.cache.publish_invalidation", new=AsyncMock()) as publish:
+            await save_to_cache_many(session, {("FCO", "CTA", DAY): [_offer("FCO", "CTA")]})
+
+        # lo storico fallisce nel suo savepoint: l'upsert viene comunque confermato
+        session.begin_nested.return_value.__aexit__.assert_awaited_once()
+        session.commit.assert_awaited_once()
+        publish.assert_awaited_once()
+
+    async def test_nothing_to_save(self):
+        session = AsyncMock()
+        await save_to_cache_many(session, {("FCO", "CTA", DAY): []})
+        session.execute.assert_not_called()
+
+    async def test_ticket_shares_are_not_stored(self):
+        session = AsyncMock()
+        share = replace(_offer("FCO", "CTA"), ticket_share=True)
+        await save_to_cache_many(session, {("FCO", "CTA", DAY): [share]})
+        # quota di un biglietto multi-city: né flight_cache né price_history
+        session.execute.assert_not_called()
+
+
+class TestEarliestExpiry:
+
+    async def test_single_min_query(self):
+        expires = datetime(2026, 5, 1, 12, 0)
+        result = MagicMock()
+        result.scalar_one_or_none.return_value = expires
+        session = AsyncMock()
+        session.execute.return_value = result
+
+        found = await earliest_expiry(session, [("FCO", "CTA", DAY), ("CTA", "FCO", DAY), ("FCO", "CTA", DAY)])
+
+        assert found == expires
+        assert session.execute.await_count == 1
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "min(flight_cache.expires_at)" in sql
+
+    async def test_no_keys_no_query(self):
+        session = AsyncMock()
+        assert await earliest_expiry(session, []) is None
+        session.execute.assert_not_called()
+
+
+class TestMissingRuns:
+
+    def test_only_uncached_days_in_consecutive_runs(self):
+        days = [DAY + timedelta(days=i) for i in range(7)]
+        cached = {days[0], days[3], days[4]}
+        assert missing_runs(days, cached) == [(days[1], days[2]), (days[5], days[6])]
+
+    def test_fully_cached_no_runs(self):
+        days = [DAY + timedelta(days=i) for i in range(3)]
+        assert missing_runs(days, set(days)) == []
+
+    def test_long_window_split_at_max_days(self):
+        # finestra di ritorno più lunga del limite di giorni per chiamata dei provider
+        days = [DAY + timedelta(days=i) for i in range(10)]
+        assert missing_runs(days, set(), max_days=7) == [(days[0], days[6]), (days[7], days[9])]
@@ -0,0 +1,134 @@
+"""
+Test per la manutenzione di flight_cache partizionata (db/cache_maintenance.py).
+"""
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.db.cache_maintenance import (
+    _add_months,
+    drop_old_history_partitions,
+    drop_past_partitions,
+    ensure_history_partitions,
+    ensure_partitions,
+    partition_name,
+    purge_expired_rows,
+    run_maintenance,
+    storable_range,
+)
+from app.models.flight_cache import FlightCache
+
+TODAY = date(2026, 10, 19)
+
+
+def _result(scalar=None, rows=None, rowcount=0):
+    r = MagicMock()
+    r.scalar_one_or_none.return_value = scalar
+    r.all.return_value = rows or []
+    r.rowcount = rowcount
+    return r
+
+
+def _session(partitions=(), relkind="p", delete_counts=()):
+    """Session mock che risponde in base al testo SQL eseguito."""
+    deletes = iter(delete_counts)
+    executed: list[str] = []
+
+    async def execute(stmt, params=None):
+        sql = str(stmt)
+        executed.append(sql)
+        if "relkind" in sql:
+            return _result(scalar=relkind)
+        if "pg_inherits" in sql:
+            return _result(rows=[(name,) for name in partitions])
+        if sql.startswith("DELETE"):
+            return _result(rowcount=next(deletes, 0))
+        return _result()
+
+    session = AsyncMock()
+    session.execute.side_effect = execute
+    session.executed = executed
+    return session
+
+
+class TestHelpers:
+
+    def test_add_months_crosses_year(self):
+        assert _add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+
+    def test_partition_name(self):
+        assert partition_name(date(2026, 3, 1)) == "flight_cache_202603"
+
+    def test_storable_range(self):
+        with patch("app.db.cache_maintenance.settings.cache_partition_months_ahead", 2):
+            assert storable_range(TODAY) == (date(2026, 10, 1), date(2027, 1, 1))
+
+
+class TestModel:
+
+    def test_table_is_range_partitioned_by_departure_date(self):
+        ddl = str(CreateTable(FlightCache.__table__).compile(dialect=postgresql.dialect()))
+        assert "PARTITION BY RANGE (departure_date)" in ddl
+        assert "PRIMARY KEY (id, departure_date)" in ddl
+
+
+class TestEnsurePartitions:
+
+    async def test_current_and_future_months(self):
+        session = _session()
+        with patch("app.db.cache_maintenance.settings.cache_partition_months_ahead", 2):
+            names = await ensure_partitions(session, TODAY)
+        assert names == ["flight_cache_202610", "flight_cache_202611", "flight_cache_202612"]
+        creates = [s for s in session.executed if s.startswith("CREATE TABLE")]
+        assert "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')" in creates[-1]
+
+    async def test_legacy_table_is_left_alone(self):
+        session = _session(relkind="r")
+        assert await ensure_partitions(session, TODAY) == []
+        assert not any(s.startswith("CREATE TABLE") for s in session.executed)
+
+
+class TestHistoryPartitions:
+
+    async def test_current_and_next_month(self):
+        session = _session()
+        names = await ensure_history_partitions(session, TODAY)
+        assert names == ["price_history_202610", "price_history_202611"]
+
+    async def test_retention(self):
+        session = _session(partitions=[
+            "price_history_202508", "price_history_202509", "price_history_202510",
+            "flight_cache_202501",          # altra tabella: ignorata
+        ])
+        with patch("app.db.cache_maintenance.settings.price_history_retention_months", 13):
+            dropped = await drop_old_history_partitions(session, TODAY)
+        assert dropped == ["price_history_202508"]
+
+
+class TestDropPastPartitions:
+
+    async def test_only_finished_months_are_dropped(self):
+        session = _session(partitions=["flight_cache_202608", "flight_cache_202609", "flight_cache_202610"])
+        dropped = await drop_past_partitions(session, TODAY)
+        assert dropped == ["flight_cache_202608", "flight_cache_202609"]
+        assert "DROP TABLE IF EXISTS flight_cache_202609" in session.executed
+
+
+class TestPurgeExpiredRows:
+
+    async def test_batches_until_partition_is_clean(self):
+        session = _session(partitions=["flight_cache_202610"], delete_counts=[3, 3, 1])
+        with patch("app.db.cache_maintenance.settings.cache_purge_batch_size", 3):
+            deleted = await purge_expired_rows(session, TODAY)
+        assert deleted == 7
+        # un commit per batch
+        assert session.commit.await_count == 3
+
+
+class TestRunMaintenance:
+
+    async def test_skipped_on_legacy_table(self):
+        summary = await run_maintenance(_session(relkind="r"), TODAY)
+        assert summary == {"skipped": "not_partitioned", "history_dropped": []}
@@ -0,0 +1,124 @@
+"""
+Test per export/restore degli snapshot di flight_cache (db/cache_snapshot.py).
+
+Nessun DB: si verificano serializzazione, filtri, lettura a chunk e SQL generato.
+"""
+import gzip
+import json
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db.cache_snapshot import (
+    _UPSERT_FROM_STAGING,
+    SNAPSHOT_FORMAT,
+    SNAPSHOT_VERSION,
+    SnapshotFilter,
+    _export_query,
+    _line_to_record,
+    _parse_args,
+    _row_to_line,
+    read_snapshot,
+)
+
+NOW = datetime.now(timezone.utc).replace(tzinfo=None)
+DAY = date.today() + timedelta(days=10)
+
+
+def _row(destination="CTA", departure_date=DAY, expires_at=None, packed=None):
+    return SimpleNamespace(
+        origin="FCO",
+        destination=destination,
+        departure_date=departure_date,
+        price_eur=Decimal("49.99"),
+        airline="ITA",
+        direct_flight=True,
+        flight_duration_minutes=80,
+        fetched_at=NOW,
+        expires_at=expires_at or NOW + timedelta(hours=6),
+        price_volatility=0.05,
+        raw_response=None if packed else '[{"origin": "FCO"}]',
+        raw_packed=packed,
+    )
+
+
+def _write_snapshot(path, rows, header=None):
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        out.write(json.dumps(header or {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION}) + "\n")
+        for row in rows:
+            out.write(_row_to_line(row) + "\n")
+
+
+class TestSerialization:
+
+    def test_line_round_trip(self):
+        record = _line_to_record(_row_to_line(_row()))
+        assert record[:3] == ("FCO", "CTA", DAY)
+        assert record[3] == Decimal("49.99")
+        assert record[7] == NOW
+        assert record[10] == '[{"origin": "FCO"}]'    # JSON text, passato tale e quale
+        assert record[11] is None
+
+    def test_packed_bytes_survive(self):
+        record = _line_to_record(_row_to_line(_row(packed=b"HC\x01\x00\xff")))
+        assert record[11] == b"HC\x01\x00\xff"
+
+
+class TestReadSnapshot:
+
+    def test_filters_and_chunks(self, tmp_path):
+        path = tmp_path / "cache.ndjson.gz"
+        _write_snapshot(path, [
+            _row(),
+            _row(destination="ATH"),
+            _row(expires_at=NOW - timedelta(hours=1)),              # scaduta
+            _row(departure_date=date(2000, 1, 1)),                  # senza partizione
+        ] + [_row() for _ in range(4)])
+
+        with patch("app.db.cache_snapshot._CHUNK_ROWS", 2):
+            chunks = list(read_snapshot(str(path), SnapshotFilter(destinations={"CTA"})))
+
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert all(r[1] == "CTA" for c in chunks for r in c)
+
+    def test_include_expired(self, tmp_path):
+        path = tmp_path / "cache.ndjson.gz"
+        _write_snapshot(path, [_row(expires_at=NOW - timedelta(hours=1))])
+        chunks = list(read_snapshot(str(path), SnapshotFilter(include_expired=True)))
+        assert len(chunks[0]) == 1
+
+    def test_wrong_header(self, tmp_path):
+        path = tmp_path / "other.ndjson.gz"
+        _write_snapshot(path, [], header={"format": "something-else"})
+        with pytest.raises(ValueError, match="not a flight cache snapshot"):
+            list(read_snapshot(str(path), SnapshotFilter()))
+
+
+class TestSql:
+
+    def test_export_query_filters(self):
+        flt = SnapshotFilter(date(2026, 11, 1), date(2026, 11, 30), {"CTA"})
+        sql = str(_export_query(flt).compile(dialect=postgresql.dialect()))
+        assert "CAST(flight_cache.raw_response AS TEXT)" in sql
+        assert "flight_cache.departure_date >=" in sql
+        assert "flight_cache.destination IN" in sql
+        assert "flight_cache.expires_at >" in sql
+
+    def test_restore_never_overwrites_newer_rows(self):
+        assert "ON CONFLICT (origin, destination, departure_date)" in _UPSERT_FROM_STAGING
+        assert "WHERE flight_cache.fetched_at < EXCLUDED.fetched_at" in _UPSERT_FROM_STAGING
+        assert "raw_response::jsonb" in _UPSERT_FROM_STAGING
+
+
+class TestArgs:
+
+    def test_parse(self):
+        args, flt = _parse_args(["restore", "x.gz", "--from", "2026-11-01", "--destination", "cta, fco"])
+        assert args.command == "restore"
+        assert flt.date_from == date(2026, 11, 1)
+        assert flt.destinations == {"CTA", "FCO"}
+        assert flt.include_expired is False
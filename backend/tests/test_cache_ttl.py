@@ -0,0 +1,51 @@
+"""
+Test per il TTL adattivo per riga (db/cache_ttl.py) — puro.
+"""
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.db.cache_ttl import ttl_for, update_volatility
+
+TODAY = date(2026, 10, 19)
+
+
+def _hours(departure_in_days, volatility=None):
+    with patch("app.db.cache_ttl.settings.cache_ttl_hours", 6), \
+         patch("app.db.cache_ttl.settings.cache_ttl_min_hours", 1), \
+         patch("app.db.cache_ttl.settings.cache_ttl_max_hours", 48):
+        ttl = ttl_for(TODAY + timedelta(days=departure_in_days), volatility, TODAY)
+    return ttl.total_seconds() / 3600
+
+
+class TestTtlFor:
+
+    def test_grows_with_days_to_departure(self):
+        assert _hours(2) < _hours(6) < _hours(20) < _hours(60) < _hours(150)
+
+    def test_reference_ttl_for_a_few_weeks_out(self):
+        assert _hours(20) == 6
+
+    def test_stable_routes_last_longer(self):
+        assert _hours(60, volatility=0.0) == pytest.approx(18)
+        assert _hours(60, volatility=0.2) == pytest.approx(6)
+
+    def test_clamped(self):
+        assert _hours(1, volatility=0.5) == 1       # 6 × 0.25 × 0.5 = 0.75 → minimo 1
+        assert _hours(300, volatility=0.0) == 36    # 6 × 4 × 1.5
+        with patch("app.db.cache_ttl.settings.cache_ttl_max_hours", 24):
+            assert ttl_for(TODAY + timedelta(days=300), 0.0, TODAY) == timedelta(hours=24)
+
+
+class TestUpdateVolatility:
+
+    def test_first_fetch_is_unknown(self):
+        assert update_volatility(None, None, 50.0) is None
+
+    def test_second_fetch_measures_change(self):
+        assert update_volatility(None, 100.0, 90.0) == pytest.approx(0.1)
+
+    def test_exponential_average(self):
+        # 0.3 × 0.0 + 0.7 × 0.2
+        assert update_volatility(0.2, 100.0, 100.0) == pytest.approx(0.14)
@@ -0,0 +1,75 @@
+"""
+Test per la scadenza di richiesta (utils/deadline.py) e il suo uso nel
+fallback LLM (services/llm/factory.py) e nel calcolo dell'area.
+"""
+import asyncio
+import math
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.area_calculator import calculate_area
+from app.services.llm.factory import generate_with_fallback
+from app.utils.deadline import Deadline
+
+LLM_PARAMS = dict(
+    origin="CTA", duration_days=10, budget_per_leg=100.0, season="summer",
+    num_stops=2, available_airports=["ATH (Athens)"],
+)
+
+
+class TestDeadline:
+
+    def test_share_takes_a_fraction_of_the_time_left(self):
+        deadline = Deadline(10)
+        assert deadline.share(0.5).remaining() == pytest.approx(5, abs=0.1)
+        assert deadline.share(1.0, reserve_s=2).remaining() == pytest.approx(8, abs=0.1)
+
+    def test_never_has_no_timeout(self):
+        deadline = Deadline.never()
+        assert deadline.remaining() == math.inf
+        assert deadline.timeout() is None
+        assert not deadline.share(0.5).expired()
+
+    async def test_run_raises_when_time_runs_out(self):
+        with pytest.raises(TimeoutError):
+            await Deadline(0.05).run(asyncio.sleep(1))
+
+    async def test_expired_deadline_does_not_start_the_call(self):
+        started = False
+
+        async def call():
+            nonlocal started
+            started = True
+
+        with pytest.raises(TimeoutError):
+            await Deadline(0).run(call())
+        assert not started
+
+
+class TestLlmFallbackDeadline:
+
+    async def test_slow_provider_is_abandoned_and_no_backup_tried(self):
+        async def slow(**kwargs):
+            await asyncio.sleep(1)
+
+        gemini = MagicMock()
+        gemini.generate_itineraries = slow
+        groq = MagicMock()
+        groq.generate_itineraries = AsyncMock(return_value=[])
+
+        with patch("app.services.llm.factory.settings.llm_provider", "gemini"), \
+             patch.dict("app.services.llm.factory._PROVIDERS", {"gemini": lambda: gemini, "groq": lambda: groq}):
+            with pytest.raises(TimeoutError):
+                await generate_with_fallback(**LLM_PARAMS, deadline=Deadline(0.05))
+
+        groq.generate_itineraries.assert_not_called()
+
+
+class TestCalculateAreaDeadline:
+
+    async def test_expired_deadline_runs_no_query(self):
+        session = AsyncMock()
+        with pytest.raises(TimeoutError):
+            await calculate_area(session, "CTA", 10, deadline=Deadline(0))
+        session.execute.assert_not_called()
@@ -0,0 +1,190 @@
+"""
+Test per il modulo forward_search (origine fissa → tutte le destinazioni).
+
+Dipendenze esterne mockate come in test_search.py:
+  - AsyncSession           → side_effect che alterna risposta airports / cache / giorni coperti
+  - get_providers_in_order → lista con un provider fittizio
+  - check_rate_limit       → patchato in providers.factory (usato dalla cascade)
+  - save_to_cache_many     → AsyncMock silenzioso
+"""
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.forward_search import forward_search
+from app.services.providers.base import FlightOffer
+
+_FAKE_QUOTAS = {"serpapi": 200, "amadeus": 1800}
+
+DATE_FROM = date(2026, 6, 1)
+DATE_TO = date(2026, 6, 3)
+
+
+def _make_airport(iata, city, lat, lon):
+    a = MagicMock()
+    a.iata_code = iata
+    a.city = city
+    a.latitude = lat
+    a.longitude = lon
+    a.is_active = True
+    return a
+
+
+def _make_cache_entry(origin, destination, offers, departure_date=DATE_FROM):
+    entry = MagicMock()
+    entry.origin = origin
+    entry.destination = destination
+    entry.departure_date = departure_date
+    entry.fetched_at = datetime(2026, 6, 1, 6, 0, 0)
+    entry.raw_response = [asdict(o) for o in offers]
+    entry.raw_packed = None
+    return entry
+
+
+def _build_session(airports, cache_entries, covered_days=(DATE_FROM,)):
+    """La query di copertura riporta per ogni destinazione in cache i giorni covered_days."""
+    session = AsyncMock()
+    airport_result = MagicMock()
+    airport_result.scalars.return_value.all.return_value = airports
+    cache_result = MagicMock()
+    cache_result.scalars.return_value = iter(cache_entries)
+    coverage_result = MagicMock()
+    coverage_result.all.return_value = [
+        (e.destination, day) for e in cache_entries for day in covered_days
+    ]
+    session.execute.side_effect = [airport_result, cache_result, coverage_result]
+    return session
+
+
+ALL_DAYS = tuple(DATE_FROM + timedelta(days=i) for i in range((DATE_TO - DATE_FROM).days + 1))
+
+
+def _patches(providers, save=None, rate_limit=None):
+    return (
+        patch("app.services.forward_search.get_providers_in_order",
+              new=AsyncMock(return_value=providers)),
+        patch("app.services.forward_search.get_provider_quotas",
+              new=AsyncMock(return_value=_FAKE_QUOTAS)),
+        patch("app.services.providers.factory.check_rate_limit",
+              new=rate_limit or AsyncMock(return_value=True)),
+        patch("app.services.forward_search.save_to_cache_many", new=save or AsyncMock()),
+    )
+
+
+AIRPORTS = [
+    _make_airport("CTA", "Catania", 37.47, 15.06),
+    _make_airport("FCO", "Rome", 41.80, 12.24),
+    _make_airport("ATH", "Athens", 37.94, 23.94),
+    _make_airport("BER", "Berlin", 52.37, 13.50),
+]
+
+
+class TestForwardSearch:
+
+    async def test_unknown_origin_raises(self):
+        session = _build_session(AIRPORTS, [])
+        p1, p2, p3, p4 = _patches([])
+        with p1, p2, p3, p4:
+            with pytest.raises(ValueError, match="XYZ"):
+                await forward_search(session, "XYZ", DATE_FROM, DATE_TO)
+
+    async def test_cache_hits_skip_provider(self):
+        """Destinazioni in cache su tutti i giorni non vengono richieste al provider."""
+        cached = [
+            _make_cache_entry("CTA", code, [
+                FlightOffer("CTA", code, "2026-06-01T08:00:00", price, "X", True, 90)
+            ])
+            for code, price in (("FCO", 40.0), ("ATH", 60.0), ("BER", 90.0))
+        ]
+        session = _build_session(AIRPORTS, cached, covered_days=ALL_DAYS)
+        mock_provider = AsyncMock()
+
+        p1, p2, p3, p4 = _patches([("serpapi", mock_provider)])
+        with p1, p2, p3, p4:
+            results, all_from_cache, _, _ = await forward_search(session, "CTA", DATE_FROM, DATE_TO)
+
+        assert all_from_cache is True
+        assert [r["destination"] for r in results] == ["FCO", "ATH", "BER"]
+        mock_provider.search_one_way.assert_not_called()
+
+    async def test_partly_cached_destination_fetches_missing_days_last(self):
+        """Una destinazione con un solo giorno in cache viene interrogata solo sui giorni
+        mancanti, dopo le destinazioni senza cache, e non compare due volte nei risultati."""
+        captured = []
+
+        async def fake_search_one_way(origin, destination, date_from, date_to, **kwargs):
+            captured.append((destination, date_from, date_to))
+            price = 20.0 if destination == "FCO" else 70.0
+            return [FlightOffer(origin, destination, f"{date_to.isoformat()}T09:00:00", price, "Y", True, 80)]
+
+        cached = [_make_cache_entry("CTA", "FCO", [
+            FlightOffer("CTA", "FCO", "2026-06-01T08:00:00", 40.0, "X", True, 90)
+        ])]
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = fake_search_one_way
+        save = AsyncMock()
+        rate_limit = AsyncMock(return_value=True)
+        session = _build_session(AIRPORTS, cached)
+
+        p1, p2, p3, p4 = _patches([("serpapi", mock_provider)], save=save, rate_limit=rate_limit)
+        with p1, p2, p3, p4:
+            results, _, _, _ = await forward_search(session, "CTA", DATE_FROM, DATE_TO)
+
+        assert captured == [
+            ("ATH", DATE_FROM, DATE_TO),
+            ("BER", DATE_FROM, DATE_TO),
+            ("FCO", date(2026, 6, 2), DATE_TO),
+        ]
+        # una unità di quota per giorno chiesto: 3 + 3 + 2
+        assert [c.kwargs["cost"] for c in rate_limit.await_args_list] == [3, 3, 2]
+        assert ("CTA", "FCO", DATE_FROM) not in save.await_args.args[1]
+        fco = [r for r in results if r["destination"] == "FCO"]
+        assert len(fco) == 1 and fco[0]["price_eur"] == 20.0
+
+    async def test_missing_destinations_fetched_nearest_first_and_cached(self):
+        """Le destinazioni mancanti sono interrogate (più vicine prima) e salvate in cache."""
+        captured = []
+
+        async def fake_search_one_way(origin, destination, *args, **kwargs):
+            captured.append(destination)
+            return [FlightOffer(origin, destination, "2026-06-02T09:00:00", 30.0, "Y", True, 80)]
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = fake_search_one_way
+        save = AsyncMock()
+        session = _build_session(AIRPORTS, [])
+
+        p1, p2, p3, p4 = _patches([("serpapi", mock_provider)], save=save)
+        with p1, p2, p3, p4:
+            results, all_from_cache, _, _ = await forward_search(session, "CTA", DATE_FROM, DATE_TO)
+
+        assert all_from_cache is False
+        assert captured == ["FCO", "ATH", "BER"]
+        # un solo upsert batch per tutte le destinazioni nuove
+        assert save.await_count == 1
+        assert {k[1] for k in save.await_args.args[1]} == {"FCO", "ATH", "BER"}
+        assert {r["destination"] for r in results} == {"FCO", "ATH", "BER"}
+
+    async def test_radius_filter(self):
+        """Con radius_km solo le destinazioni entro il raggio vengono interrogate."""
+        captured = []
+
+        async def fake_search_one_way(origin, destination, *args, **kwargs):
+            captured.append(destination)
+            return []
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = fake_search_one_way
+        session = _build_session(AIRPORTS, [])
+
+        p1, p2, p3, p4 = _patches([("serpapi", mock_provider)])
+        with p1, p2, p3, p4:
+            results, _, _, _ = await forward_search(
+                session, "CTA", DATE_FROM, DATE_TO, radius_km=1000
+            )
+
+        assert results == []
+        assert "BER" not in captured
+        assert "FCO" in captured
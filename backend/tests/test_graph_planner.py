@@ -0,0 +1,118 @@
+"""
+Test per il motore a grafo di Smart Multi-City (services/graph_planner.py).
+
+plan_tours è puro; suggest_itineraries ha il DB mockato.
+"""
+import random
+import time
+from datetime import date
+from itertools import permutations
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.area_calculator import AreaResult, ReachableAirport
+from app.services.graph_planner import (
+    distance_matrix,
+    estimated_fare,
+    plan_tours,
+    suggest_itineraries,
+)
+from app.utils.geo import haversine_km
+
+DATES = [date(2026, 6, 1), date(2026, 6, 5), date(2026, 6, 9), date(2026, 6, 13), date(2026, 6, 17)]
+
+
+def _area(n_airports=3, num_stops=2, seed=None):
+    if seed is None:
+        airports = [
+            ReachableAirport("FCO", "Rome", "Italy", 41.80, 12.24, 480),
+            ReachableAirport("ATH", "Athens", "Greece", 37.94, 23.94, 850),
+            ReachableAirport("BUD", "Budapest", "Hungary", 47.44, 19.26, 1600),
+        ][:n_airports]
+    else:
+        rng = random.Random(seed)
+        airports = []
+        for i in range(n_airports):
+            lat, lon = rng.uniform(36, 55), rng.uniform(-5, 28)
+            airports.append(ReachableAirport(
+                f"A{i:02d}", f"City {i}", "X", lat, lon, round(haversine_km(37.47, 15.06, lat, lon)),
+            ))
+    return AreaResult(origin_iata="CTA", radius_km=2600, num_stops=num_stops, airports=airports)
+
+
+def _brute_force(origin, distance, num_stops, leg_dates, known_prices):
+    stops = sorted({b for a, b in distance if a == origin})
+    best = None
+    for path in permutations(stops, num_stops):
+        route = [origin, *path, origin]
+        cost = sum(
+            known_prices.get((route[i], route[i + 1], leg_dates[i]), estimated_fare(distance[(route[i], route[i + 1])]))
+            for i in range(num_stops + 1)
+        )
+        if best is None or cost < best[0]:
+            best = (cost, route)
+    return best
+
+
+class TestPlanTours:
+
+    def test_cached_prices_beat_estimates(self):
+        area = _area()
+        distance = distance_matrix(area)
+        # BUD è lontano, ma con prezzi in cache molto bassi diventa la scelta migliore
+        known = {("CTA", "BUD", DATES[0]): 9.0, ("BUD", "ATH", DATES[1]): 9.0}
+        tours = plan_tours("CTA", distance, 2, DATES[:3], known)
+
+        assert tours[0].route == ["CTA", "BUD", "ATH", "CTA"]
+        assert tours[0].cached_legs == 2
+        assert tours == sorted(tours, key=lambda t: t.estimated_cost_eur)
+
+    def test_matches_brute_force(self):
+        area = _area(n_airports=9, num_stops=3, seed=7)
+        distance = distance_matrix(area)
+        rng = random.Random(1)
+        known = {
+            (a, b, DATES[i]): rng.uniform(10, 120)
+            for (a, b) in distance for i in range(4) if rng.random() < 0.3
+        }
+        tours = plan_tours("CTA", distance, 3, DATES[:4], known)
+        cost, route = _brute_force("CTA", distance, 3, DATES[:4], known)
+
+        assert tours[0].route == route
+        assert tours[0].estimated_cost_eur == round(cost, 2)
+
+    def test_stops_are_distinct_and_tour_is_closed(self):
+        tours = plan_tours("CTA", distance_matrix(_area(n_airports=12, num_stops=4, seed=3)), 4, DATES, {})
+        assert len(tours) == 10
+        for tour in tours:
+            assert tour.route[0] == tour.route[-1] == "CTA"
+            assert len(set(tour.route[1:-1])) == 4
+
+    def test_not_enough_airports(self):
+        assert plan_tours("CTA", distance_matrix(_area(n_airports=1)), 2, DATES[:3], {}) == []
+
+    def test_fast_on_50_airports_4_stops(self):
+        distance = distance_matrix(_area(n_airports=50, num_stops=4, seed=11))
+        t = time.perf_counter()
+        tours = plan_tours("CTA", distance, 4, DATES, {})
+        assert tours
+        assert time.perf_counter() - t < 0.5
+
+
+class TestSuggestItineraries:
+
+    async def test_single_price_query_and_suggestions(self):
+        result = MagicMock()
+        result.all.return_value = [("CTA", "ATH", DATES[0], 12.0)]
+        session = AsyncMock()
+        session.execute.return_value = result
+
+        suggestions = await suggest_itineraries(session, _area(num_stops=1), DATES[:2])
+
+        assert session.execute.await_count == 1
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "flight_cache.expires_at >" in sql
+        assert suggestions[0].route[0] == suggestions[0].route[-1] == "CTA"
+        assert len(suggestions) == 3
+        assert "1/2 legs from cached prices" in suggestions[0].reasoning
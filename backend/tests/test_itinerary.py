@@ -6,21 +6,34 @@ Copertura:
   - parse_itineraries (llm/base.py) — puro
   - calculate_area    — DB mockato
   - run_smart_multi   — tutti i layer mockati (DB, LLM, FlightProvider cascade)
+  - stream_smart_multi — ordine degli eventi del flusso progressivo
+  - result cache       — replay di una ricerca ripetuta, salvataggio a fine pipeline
+  - prefetch speculativo durante la chiamata LLM
 """
-from datetime import date
+import asyncio
+import math
+from datetime import date, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from app.db.result_cache import CachedItinerary, CachedResult
 from app.services.itinerary_engine import (
+    _candidate_dates,
+    _cheapest_date_combination,
+    _date_runs,
     _days_per_stop,
     _is_valid_route,
     _leg_dates,
+    _prefetch_runs,
+    _route_lower_bound,
     _season_from_date,
     run_smart_multi,
+    stream_smart_multi,
 )
 from app.services.llm.base import SuggestedItinerary, parse_itineraries
-from app.services.providers.base import FlightOffer
+from app.services.providers.base import FlightOffer, Leg
+from app.utils.deadline import Deadline
 
 
 # ---------------------------------------------------------------------------
@@ -90,6 +103,75 @@ class TestLegDates:
             assert result[i] < result[i + 1]
 
 
+# ---------------------------------------------------------------------------
+# Date flessibili: _candidate_dates, _cheapest_date_combination, _date_runs
+# ---------------------------------------------------------------------------
+
+class TestFlexDates:
+
+    def test_candidates_stay_inside_the_window(self):
+        legs = [Leg("CTA", "ATH", date(2026, 6, 1)), Leg("ATH", "CTA", date(2026, 6, 7))]
+        result = _candidate_dates(legs, date(2026, 6, 1), date(2026, 6, 8), flex_days=2)
+        assert result[0] == [date(2026, 6, 1), date(2026, 6, 2), date(2026, 6, 3)]
+        assert result[1] == [date(2026, 6, d) for d in (5, 6, 7, 8)]
+
+    def test_no_flex_keeps_planned_dates(self):
+        legs = [Leg("CTA", "ATH", date(2026, 6, 1))]
+        assert _candidate_dates(legs, date(2026, 6, 1), date(2026, 6, 2), flex_days=0) == [[date(2026, 6, 1)]]
+
+    def test_dp_picks_cheapest_feasible_combination(self):
+        d = lambda n: date(2026, 6, n)  # noqa: E731
+        prices = [
+            {d(1): 50.0, d(2): 20.0},
+            {d(4): 10.0, d(6): 30.0},
+        ]
+        # soggiorno 3..5 giorni: (2→4) = 2 giorni non ammesso
+        assert _cheapest_date_combination(prices, [(3, 5)]) == [d(2), d(6)]
+        assert _cheapest_date_combination(prices, [(2, 5)]) == [d(2), d(4)]
+        assert _cheapest_date_combination(prices, [(3, 3)]) == [d(1), d(4)]
+
+    def test_dp_infeasible(self):
+        prices = [{date(2026, 6, 1): 50.0}, {date(2026, 6, 2): 10.0}]
+        assert _cheapest_date_combination(prices, [(3, 5)]) is None
+
+    def test_date_runs(self):
+        days = [date(2026, 6, 1) + timedelta(days=i) for i in (0, 1, 2, 5, 6)] + [date(2026, 6, 20)]
+        runs = _date_runs(days, max_len=2)
+        assert [len(r) for r in runs] == [2, 1, 2, 1]
+
+
+# ---------------------------------------------------------------------------
+# _route_lower_bound
+# ---------------------------------------------------------------------------
+
+class TestRouteLowerBound:
+
+    D1, D2 = date(2026, 6, 1), date(2026, 6, 2)
+
+    def _offer(self, o, d, day, price):
+        return FlightOffer(o, d, f"{day.isoformat()}T08:00:00", price, "TestAir", True, 90)
+
+    def test_priced_legs_plus_floors_of_pending_ones(self):
+        legs = [[("CTA", "ATH", self.D1)], [("ATH", "CTA", self.D2)]]
+        table = {("CTA", "ATH", self.D1): [self._offer("CTA", "ATH", self.D1, 80.0)]}
+        bound = _route_lower_bound(legs, table, {("CTA", "ATH", self.D1)}, {("ATH", "CTA"): 25.0})
+        assert bound == pytest.approx(105.0)
+
+    def test_pending_leg_without_floor_counts_zero(self):
+        legs = [[("CTA", "ATH", self.D1)], [("ATH", "CTA", self.D2)]]
+        assert _route_lower_bound(legs, {}, set(), {}) == 0.0
+
+    def test_flex_leg_takes_its_cheapest_candidate_date(self):
+        # un giorno prezzato a 90, l'altro ancora in attesa con pavimento 30
+        legs = [[("CTA", "ATH", self.D1), ("CTA", "ATH", self.D2)]]
+        table = {("CTA", "ATH", self.D1): [self._offer("CTA", "ATH", self.D1, 90.0)]}
+        assert _route_lower_bound(legs, table, {("CTA", "ATH", self.D1)}, {("CTA", "ATH"): 30.0}) == 30.0
+
+    def test_leg_priced_without_offers_is_infinite(self):
+        legs = [[("CTA", "ATH", self.D1)]]
+        assert _route_lower_bound(legs, {}, {("CTA", "ATH", self.D1)}, {}) == math.inf
+
+
 # ---------------------------------------------------------------------------
 # _days_per_stop
 # ---------------------------------------------------------------------------
@@ -218,7 +300,8 @@ def _make_db_airport(iata, city, lat, lon):
     return a
 
 
-def _make_area_result(origin="CTA"):
+def _make_area_result(origin="CTA", extra_stops=()):
+    """Area con ATH/BUD/FCO; extra_stops aggiunge aeroporti raggiungibili con coordinate fittizie."""
     from app.services.area_calculator import AreaResult, ReachableAirport
     return AreaResult(
         origin_iata=origin,
@@ -228,7 +311,7 @@ def _make_area_result(origin="CTA"):
             ReachableAirport("ATH", "Athens", "Greece", 37.94, 23.94, 850),
             ReachableAirport("BUD", "Budapest", "Hungary", 47.44, 19.26, 1600),
             ReachableAirport("FCO", "Rome", "Italy", 41.80, 12.24, 480),
-        ],
+        ] + [ReachableAirport(code, code, "X", 40.0, 15.0, 300) for code in extra_stops],
     )
 
 
@@ -241,20 +324,27 @@ def _make_suggestion(route):
     )
 
 
-def _make_offers_for_route(route, price_per_leg=50.0):
-    """Crea un FlightOffer per ogni tratta della rotta."""
-    offers = []
-    for i in range(len(route) - 1):
-        offers.append(FlightOffer(
-            origin=route[i],
-            destination=route[i + 1],
-            departure=f"2026-06-{(i+1):02d}T08:00:00",
-            price_eur=price_per_leg,
+def _make_provider(prices):
+    """
+    Provider mock: search_one_way risponde con un'offerta al prezzo indicato
+    per la coppia (origine, destinazione), lista vuota per le coppie assenti.
+    """
+    async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+        if (origin, destination) not in prices:
+            return []
+        return [FlightOffer(
+            origin=origin,
+            destination=destination,
+            departure=f"{date_from.isoformat()}T08:00:00",
+            price_eur=prices[(origin, destination)],
             airline="TestAir",
             direct=True,
             duration_minutes=90,
-        ))
-    return offers
+        )]
+
+    provider = AsyncMock(max_legs_per_call=1)
+    provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+    return provider
 
 
 # ---------------------------------------------------------------------------
@@ -272,8 +362,49 @@ SMART_PARAMS = dict(
 )
 
 
+class TestPrefetchRuns:
+
+    def test_first_and_last_leg_of_the_closest_airports(self):
+        runs = _prefetch_runs(_make_area_result(), "CTA", date(2026, 6, 1), date(2026, 6, 13), 12, 0)
+        # num_stops=2 → 3 tratte: partenza il 1, rientro il 9
+        assert runs == [
+            (("CTA", "ATH"), [date(2026, 6, 1)]), (("ATH", "CTA"), [date(2026, 6, 9)]),
+            (("CTA", "BUD"), [date(2026, 6, 1)]), (("BUD", "CTA"), [date(2026, 6, 9)]),
+            (("CTA", "FCO"), [date(2026, 6, 1)]), (("FCO", "CTA"), [date(2026, 6, 9)]),
+        ]
+
+    def test_flex_days_in_one_run_per_leg(self):
+        runs = _prefetch_runs(_make_area_result(), "CTA", date(2026, 6, 1), date(2026, 6, 13), 12, 1)
+        # il giorno prima di date_from è escluso
+        assert runs[0] == (("CTA", "ATH"), [date(2026, 6, 1), date(2026, 6, 2)])
+        assert runs[1] == (("ATH", "CTA"), [date(2026, 6, 8), date(2026, 6, 9), date(2026, 6, 10)])
+
+
 class TestRunSmartMulti:
 
+    @pytest.fixture(autouse=True)
+    def _empty_flight_cache(self):
+        """
+        flight_cache, price_history e result cache vuote: ogni tratta passa dal
+        provider; i salvataggi sono registrati. Niente prefetch speculativo
+        (ha i suoi test): i conteggi delle chiamate restano quelli delle rotte.
+        """
+        with patch("app.services.itinerary_engine.get_cached_many", new=AsyncMock(return_value={})) as get, \
+             patch("app.services.itinerary_engine.save_to_cache_many", new=AsyncMock()) as save, \
+             patch("app.services.itinerary_engine.cheapest_seen_many", new=AsyncMock(return_value={})) as floors, \
+             patch("app.services.itinerary_engine.get_result", new=AsyncMock(return_value=None)) as get_result, \
+             patch("app.services.itinerary_engine.save_result", new=AsyncMock()) as save_result, \
+             patch("app.services.itinerary_engine.earliest_expiry",
+                   new=AsyncMock(return_value=datetime(2026, 5, 1, 12, 0))) as expiry, \
+             patch("app.services.itinerary_engine._PREFETCH_AIRPORTS", 0):
+            self.get_cached_many = get
+            self.save_to_cache_many = save
+            self.cheapest_seen_many = floors
+            self.get_result = get_result
+            self.save_result = save_result
+            self.earliest_expiry = expiry
+            yield
+
     async def test_happy_path_returns_ranked_itineraries(self):
         """Percorso felice: LLM propone 2 rotte, entrambe sotto budget → top-2 restituite."""
         suggestions = [
@@ -281,11 +412,10 @@ class TestRunSmartMulti:
             _make_suggestion(["CTA", "BUD", "CTA"]),
         ]
         # Rotta ATH: 2 tratte × 60€ = 120€; Rotta BUD: 2 tratte × 40€ = 80€
-        offers_ath = _make_offers_for_route(["CTA", "ATH", "CTA"], price_per_leg=60.0)
-        offers_bud = _make_offers_for_route(["CTA", "BUD", "CTA"], price_per_leg=40.0)
-
-        mock_provider = AsyncMock()
-        mock_provider.search_multi_city = AsyncMock(side_effect=[offers_ath, offers_bud])
+        mock_provider = _make_provider({
+            ("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0,
+            ("CTA", "BUD"): 40.0, ("BUD", "CTA"): 40.0,
+        })
 
         session = AsyncMock()
 
@@ -321,10 +451,7 @@ class TestRunSmartMulti:
     async def test_all_itineraries_over_budget_raises(self):
         """Tutte le rotte costano più del budget → ValueError con messaggio 'oltre il budget'."""
         suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
-        expensive_offers = _make_offers_for_route(["CTA", "ATH", "CTA"], price_per_leg=200.0)
-
-        mock_provider = AsyncMock()
-        mock_provider.search_multi_city = AsyncMock(return_value=expensive_offers)
+        mock_provider = _make_provider({("CTA", "ATH"): 200.0, ("ATH", "CTA"): 200.0})
 
         session = AsyncMock()
 
@@ -348,8 +475,7 @@ class TestRunSmartMulti:
         """Il provider non trova voli per nessuna rotta → ValueError con 'senza copertura'."""
         suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
 
-        mock_provider = AsyncMock()
-        mock_provider.search_multi_city = AsyncMock(return_value=[])  # nessun volo
+        mock_provider = _make_provider({})  # nessun volo
 
         session = AsyncMock()
 
@@ -387,19 +513,8 @@ class TestRunSmartMulti:
             _make_suggestion(["CTA", "ATH", "CTA"]),  # nessun volo
             _make_suggestion(["CTA", "BUD", "CTA"]),  # sopra budget
         ]
-        expensive_offers = _make_offers_for_route(["CTA", "BUD", "CTA"], price_per_leg=200.0)
-
-        call_count = 0
-
-        async def fake_search(legs):
-            nonlocal call_count
-            call_count += 1
-            if call_count == 1:
-                return []  # nessun volo per ATH
-            return expensive_offers
-
-        mock_provider = AsyncMock()
-        mock_provider.search_multi_city = fake_search
+        # nessun volo per ATH, BUD sopra budget
+        mock_provider = _make_provider({("CTA", "BUD"): 200.0, ("BUD", "CTA"): 200.0})
 
         session = AsyncMock()
 
@@ -422,10 +537,7 @@ class TestRunSmartMulti:
     async def test_travelers_multiplies_total_price(self):
         """Il prezzo totale per tutti i viaggiatori = prezzo/persona × viaggiatori."""
         suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
-        offers = _make_offers_for_route(["CTA", "ATH", "CTA"], price_per_leg=50.0)
-
-        mock_provider = AsyncMock()
-        mock_provider.search_multi_city = AsyncMock(return_value=offers)
+        mock_provider = _make_provider({("CTA", "ATH"): 50.0, ("ATH", "CTA"): 50.0})
 
         session = AsyncMock()
 
@@ -446,3 +558,665 @@ class TestRunSmartMulti:
         assert itin.total_price_all_travelers_eur == pytest.approx(
             itin.total_price_per_person_eur * 3
         )
+
+    async def test_shared_legs_are_priced_once(self):
+        """Tratte uguali (stessa coppia, stessa data) in più itinerari → una sola chiamata provider."""
+        suggestions = [
+            _make_suggestion(["CTA", "ATH", "BUD", "CTA"]),
+            _make_suggestion(["CTA", "ATH", "FCO", "CTA"]),
+            _make_suggestion(["CTA", "ATH", "CTA"]),  # stessa coppia, ma date diverse per la tratta di ritorno
+        ]
+        mock_provider = _make_provider({
+            ("CTA", "ATH"): 30.0, ("ATH", "BUD"): 40.0, ("BUD", "CTA"): 50.0,
+            ("ATH", "FCO"): 45.0, ("FCO", "CTA"): 20.0, ("ATH", "CTA"): 60.0,
+        })
+
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS)
+
+        # 8 tratte in totale, CTA→ATH del primo giorno condivisa da tutti e tre gli itinerari
+        assert mock_provider.search_one_way.await_count == 6
+        assert [i.route for i in result.itineraries] == [
+            ["CTA", "ATH", "CTA"], ["CTA", "ATH", "FCO", "CTA"], ["CTA", "ATH", "BUD", "CTA"],
+        ]
+
+    async def test_cached_legs_skip_the_provider_and_fresh_ones_are_saved(self):
+        """Read-through: tratte in flight_cache non chiamano il provider; le nuove vengono salvate."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+        first_day = SMART_PARAMS["date_from"]
+        cached_offer = FlightOffer("CTA", "ATH", f"{first_day.isoformat()}T06:00:00", 25.0, "Ryanair", True, 95)
+        self.get_cached_many.return_value = {("CTA", "ATH", first_day): ([cached_offer], None)}
+        mock_provider = _make_provider({("CTA", "ATH"): 99.0, ("ATH", "CTA"): 60.0})
+
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS)
+
+        # solo la tratta di ritorno va al provider
+        assert mock_provider.search_one_way.await_count == 1
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(85.0)
+        saved = self.save_to_cache_many.await_args.args[1]
+        assert list(saved) == [("ATH", "CTA", date(2026, 6, 7))]
+
+    async def test_graph_engine_skips_the_llm(self):
+        """engine="graph": candidati dal grafo, nessuna chiamata LLM."""
+        graph_suggestions = [_make_suggestion(["CTA", "ATH", "BUD", "CTA"])]
+        mock_provider = _make_provider({("CTA", "ATH"): 30.0, ("ATH", "BUD"): 40.0, ("BUD", "CTA"): 50.0})
+        llm = AsyncMock()
+
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback", new=llm), \
+             patch("app.services.itinerary_engine.suggest_itineraries",
+                   new=AsyncMock(return_value=graph_suggestions)) as graph, \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS, engine="graph")
+
+        llm.assert_not_called()
+        # date delle 3 tratte passate al grafo
+        assert graph.await_args.args[2] == [date(2026, 6, 1), date(2026, 6, 5), date(2026, 6, 9)]
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(120.0)
+
+    async def test_flex_days_pick_cheaper_dates_with_one_call_per_leg(self):
+        """flex_days: una chiamata per tratta sull'intervallo di date, scelta la combinazione più economica."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+        cheap_day = date(2026, 6, 8)
+
+        async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+            day = date_from
+            offers = []
+            while day <= date_to:
+                price = 20.0 if (destination == "CTA" and day == cheap_day) else 60.0
+                offers.append(FlightOffer(origin, destination, f"{day.isoformat()}T08:00:00", price, "TestAir", True, 90))
+                day += timedelta(days=1)
+            return offers
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS, flex_days=2)
+
+        # CTA→ATH 1..3 giugno, ATH→CTA 5..9 giugno: due chiamate in tutto
+        assert mock_provider.search_one_way.await_count == 2
+        itin = result.itineraries[0]
+        assert itin.total_price_per_person_eur == pytest.approx(80.0)
+        assert itin.legs[1].departure.date() == cheap_day
+        assert itin.suggested_days_per_stop == [(cheap_day - itin.legs[0].departure.date()).days]
+
+    async def test_stream_sends_candidates_then_itineraries_then_done(self):
+        """Streaming: rotte candidate, poi ogni itinerario prezzato con la top-5 corrente, infine il risultato."""
+        suggestions = [
+            _make_suggestion(["CTA", "ATH", "CTA"]),
+            _make_suggestion(["CTA", "BUD", "CTA"]),
+            _make_suggestion(["CTA", "FCO", "CTA"]),
+        ]
+        # FCO già in cache: primo itinerario emesso prima di qualsiasi chiamata al provider
+        cached_fco = {
+            ("CTA", "FCO", date(2026, 6, 1)): ([FlightOffer("CTA", "FCO", "2026-06-01T08:00:00", 50.0, "ITA", True, 70)], None),
+            ("FCO", "CTA", date(2026, 6, 7)): ([FlightOffer("FCO", "CTA", "2026-06-07T08:00:00", 50.0, "ITA", True, 70)], None),
+        }
+        self.get_cached_many.return_value = cached_fco
+        mock_provider = _make_provider({
+            ("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0,
+            ("CTA", "BUD"): 40.0, ("BUD", "CTA"): 40.0,
+        })
+
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            events = [e async for e in stream_smart_multi(session=session, **SMART_PARAMS)]
+
+        names = [name for name, _ in events]
+        assert names == ["candidates", "itinerary", "itinerary", "itinerary", "done"]
+        assert events[0][1] == [s.route for s in suggestions]
+        first = events[1][1]
+        assert first["itinerary"].route == ["CTA", "FCO", "CTA"]
+        assert first["itinerary"].rank == 1
+        # la classifica finale nello stream coincide con quella del risultato
+        last_ranking = events[3][1]["ranking"]
+        done = events[4][1]
+        assert [r["route"] for r in last_ranking] == [i.route for i in done.itineraries]
+        assert [i.total_price_per_person_eur for i in done.itineraries] == [80.0, 100.0, 120.0]
+        assert done.provider_status.active_provider == "serpapi"
+
+    async def test_route_over_budget_is_dropped_and_its_pending_call_cancelled(self):
+        """La prima tratta sfora già il budget: la chiamata ancora in corso per la seconda viene cancellata."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "BUD", "CTA"])]
+        cancelled = asyncio.Event()
+
+        async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+            if (origin, destination) == ("ATH", "CTA"):
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            price = {("CTA", "ATH"): 500.0, ("CTA", "BUD"): 40.0, ("BUD", "CTA"): 40.0}[(origin, destination)]
+            return [FlightOffer(origin, destination, f"{date_from.isoformat()}T08:00:00", price, "TestAir", True, 90)]
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await asyncio.wait_for(run_smart_multi(session=session, **SMART_PARAMS), timeout=2)
+
+        assert cancelled.is_set()
+        assert [i.route for i in result.itineraries] == [["CTA", "BUD", "CTA"]]
+
+    async def test_lower_bounds_skip_provider_calls(self):
+        """Cache + pavimenti da price_history: le rotte fuori budget o fuori dalla top 5 non chiamano il provider."""
+        stops = ["ATH", "BUD", "FCO", "SOF", "VIE", "MLA", "OTP"]
+        suggestions = [_make_suggestion(["CTA", stop, "CTA"]) for stop in stops]
+        out_day, back_day = date(2026, 6, 1), date(2026, 6, 7)
+
+        def cached(o, d, day, price):
+            return [FlightOffer(o, d, f"{day.isoformat()}T08:00:00", price, "TestAir", True, 90)], None
+
+        # 5 rotte interamente in cache: 100, 110, 120, 130, 140
+        entries = {}
+        for n, stop in enumerate(stops[:5]):
+            entries[("CTA", stop, out_day)] = cached("CTA", stop, out_day, 50.0 + 10 * n)
+            entries[(stop, "CTA", back_day)] = cached(stop, "CTA", back_day, 50.0)
+        # MLA: andata 150 in cache → già oltre la 5ª migliore (140)
+        entries[("CTA", "MLA", out_day)] = cached("CTA", "MLA", out_day, 150.0)
+        # OTP: andata 200 in cache + pavimento del ritorno 0.5 × 260 → oltre il budget di 300
+        entries[("CTA", "OTP", out_day)] = cached("CTA", "OTP", out_day, 200.0)
+        self.get_cached_many.return_value = entries
+        self.cheapest_seen_many.return_value = {("OTP", "CTA"): 260.0}
+
+        mock_provider = _make_provider({})
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result(extra_stops=stops[3:]))), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS)
+
+        mock_provider.search_one_way.assert_not_called()
+        assert [i.total_price_per_person_eur for i in result.itineraries] == [100.0, 110.0, 120.0, 130.0, 140.0]
+
+    async def test_deadline_returns_priced_itineraries_as_partial(self):
+        """Scadenza durante il pricing: risposta con gli itinerari già prezzati, marcata partial."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "BUD", "CTA"])]
+
+        async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+            if (origin, destination) == ("ATH", "CTA"):
+                await asyncio.sleep(10)
+            return [FlightOffer(origin, destination, f"{date_from.isoformat()}T08:00:00", 40.0, "TestAir", True, 90)]
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})), \
+             patch("app.services.itinerary_engine._RESPONSE_RESERVE_S", 0.0):
+
+            result = await asyncio.wait_for(
+                run_smart_multi(session=session, **SMART_PARAMS, deadline=Deadline(0.3)), timeout=2
+            )
+
+        assert result.partial is True
+        assert [i.route for i in result.itineraries] == [["CTA", "BUD", "CTA"]]
+        # la tratta scaduta non è salvata come "nessun volo"
+        saved = self.save_to_cache_many.await_args.args[1]
+        assert ("ATH", "CTA", date(2026, 6, 7)) not in saved
+        # un risultato parziale non finisce nella result cache
+        self.save_result.assert_not_called()
+
+    async def test_deadline_before_any_itinerary_raises_timeout(self):
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=hang)
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine._RESPONSE_RESERVE_S", 0.0):
+
+            with pytest.raises(TimeoutError):
+                await run_smart_multi(session=session, **SMART_PARAMS, deadline=Deadline(0.2))
+
+    async def test_result_is_cached_until_its_first_leg_expires(self):
+        """A fine pipeline tutti gli itinerari prezzati sono salvati, con la scadenza delle loro righe."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "BUD", "CTA"])]
+        mock_provider = _make_provider({
+            ("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0,
+            ("CTA", "BUD"): 40.0, ("BUD", "CTA"): 40.0,
+        })
+        session = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS)
+
+        assert result.cached is False
+        keys = set(self.earliest_expiry.await_args.args[1])
+        assert keys == {
+            ("CTA", "ATH", date(2026, 6, 1)), ("ATH", "CTA", date(2026, 6, 7)),
+            ("CTA", "BUD", date(2026, 6, 1)), ("BUD", "CTA", date(2026, 6, 7)),
+        }
+        key, entry, expires_at = self.save_result.await_args.args
+        assert key == "smart_multi:result:CTA:12:2026-06-01:2026-06-13:0:llm:0"
+        assert entry.budget_per_person_eur == 300
+        assert [i.total_per_person for i in entry.itineraries] == [80.0, 120.0]
+        assert expires_at == datetime(2026, 5, 1, 12, 0)
+
+    async def test_repeat_search_is_replayed_from_the_result_cache(self):
+        """Budget più basso e più viaggiatori: filtro e riscalatura sulla voce salvata, nessuna chiamata."""
+        def entry(route, price):
+            offers = [
+                FlightOffer(a, b, f"{d}T08:00:00", price, "TestAir", True, 90)
+                for a, b, d in zip(route, route[1:], ["2026-06-01", "2026-06-07"])
+            ]
+            return CachedItinerary(_make_suggestion(route), offers, price * 2)
+
+        self.get_result.return_value = CachedResult(
+            budget_per_person_eur=300,
+            itineraries=[entry(["CTA", "BUD", "CTA"], 40.0), entry(["CTA", "ATH", "CTA"], 60.0),
+                         entry(["CTA", "FCO", "CTA"], 100.0)],
+        )
+        mock_provider = _make_provider({})
+        area = AsyncMock()
+        llm = AsyncMock()
+
+        with patch("app.services.itinerary_engine.calculate_area", new=area), \
+             patch("app.services.itinerary_engine.generate_with_fallback", new=llm), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(
+                session=AsyncMock(), **{**SMART_PARAMS, "budget_per_person_eur": 150, "travelers": 3}
+            )
+
+        area.assert_not_called()
+        llm.assert_not_called()
+        mock_provider.search_one_way.assert_not_called()
+        self.save_result.assert_not_called()
+        assert result.cached is True
+        assert [i.route for i in result.itineraries] == [["CTA", "BUD", "CTA"], ["CTA", "ATH", "CTA"]]
+        assert result.itineraries[1].total_price_all_travelers_eur == pytest.approx(360.0)
+
+    async def test_higher_budget_than_the_cached_one_runs_the_pipeline(self):
+        """La voce salvata non copre un budget più alto: la pipeline riparte."""
+        self.get_result.return_value = CachedResult(budget_per_person_eur=100, itineraries=[])
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(side_effect=ValueError("Origin airport 'CTA' not found"))) as area:
+            with pytest.raises(ValueError):
+                await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        area.assert_called_once()
+
+    async def _run_with_slow_llm(self, mock_provider, suggestions, quotas):
+        async def slow_llm(**kwargs):
+            await asyncio.sleep(0.05)
+            return suggestions
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback", new=slow_llm), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value=quotas)), \
+             patch("app.services.itinerary_engine._PREFETCH_AIRPORTS", 3):
+            return await asyncio.wait_for(run_smart_multi(session=AsyncMock(), **SMART_PARAMS), timeout=2)
+
+    async def test_prefetched_legs_are_reused_and_saved(self):
+        """Le tratte prezzate durante la chiamata LLM non vengono richieste di nuovo; anche quelle inutili sono salvate."""
+        prices = {("CTA", a): 50.0 for a in ("ATH", "BUD", "FCO")}
+        prices.update({(a, "CTA"): 50.0 for a in ("ATH", "BUD", "FCO")})
+        prices[("ATH", "BUD")] = 30.0
+        mock_provider = _make_provider(prices)
+
+        result = await self._run_with_slow_llm(
+            mock_provider, [_make_suggestion(["CTA", "ATH", "BUD", "CTA"])], {"serpapi": 200, "amadeus": 1800}
+        )
+
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(130.0)
+        called = [(c.args[0], c.args[1]) for c in mock_provider.search_one_way.call_args_list]
+        # 6 tratte speculative + l'unica mancante (ATH→BUD), nessun doppione
+        assert len(called) == 7 and len(set(called)) == 7
+        saved = self.save_to_cache_many.await_args.args[1]
+        assert ("FCO", "CTA", date(2026, 6, 9)) in saved
+
+    async def test_unneeded_prefetch_calls_are_cancelled(self):
+        """Le chiamate speculative ancora in corso e non usate dalle rotte vengono annullate."""
+        async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+            if "FCO" in (origin, destination):
+                await asyncio.sleep(10)
+            return [FlightOffer(origin, destination, f"{date_from.isoformat()}T08:00:00", 40.0, "TestAir", True, 90)]
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+
+        result = await self._run_with_slow_llm(
+            mock_provider, [_make_suggestion(["CTA", "ATH", "BUD", "CTA"])], {"serpapi": 200, "amadeus": 1800}
+        )
+
+        assert result.partial is False
+        saved = self.save_to_cache_many.await_args.args[1]
+        assert not any("FCO" in key for key in saved)
+
+    async def test_prefetch_cancelled_when_floors_query_fails(self):
+        """Se la query dei minimi storici fallisce, le chiamate speculative in corso vengono annullate."""
+        cancelled = []
+
+        async def fake_search_one_way(origin, destination, date_from, date_to, direct_only=False, max_results=50):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append((origin, destination))
+                raise
+
+        mock_provider = AsyncMock(max_legs_per_call=1)
+        mock_provider.search_one_way = AsyncMock(side_effect=fake_search_one_way)
+        self.cheapest_seen_many.side_effect = RuntimeError("db down")
+
+        with pytest.raises(RuntimeError):
+            await self._run_with_slow_llm(
+                mock_provider, [_make_suggestion(["CTA", "ATH", "BUD", "CTA"])], {"serpapi": 200, "amadeus": 1800}
+            )
+        await asyncio.sleep(0)
+
+        # ogni chiamata partita (le altre attendono il semaforo) è stata annullata
+        assert cancelled
+        assert len(cancelled) == mock_provider.search_one_way.call_count
+
+    async def test_no_prefetch_when_quota_is_low(self):
+        """Sotto la riserva di quota nessuna chiamata speculativa."""
+        mock_provider = _make_provider({("CTA", "ATH"): 50.0, ("ATH", "BUD"): 30.0, ("BUD", "CTA"): 50.0})
+
+        await self._run_with_slow_llm(
+            mock_provider, [_make_suggestion(["CTA", "ATH", "BUD", "CTA"])], {"serpapi": 20, "amadeus": 0}
+        )
+
+        assert mock_provider.search_one_way.call_count == 3
+
+    async def test_routes_outside_the_area_cost_no_provider_call(self):
+        """Il filtro geografico scarta la rotta con un aeroporto sconosciuto prima del pricing."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "XXX", "CTA"])]
+        mock_provider = _make_provider({("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0})
+        registry = MagicMock()
+        registry.scalars.return_value.all.return_value = []
+        session = AsyncMock()
+        session.execute.return_value = registry
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.itinerary_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=session, **SMART_PARAMS)
+
+        assert [i.route for i in result.itineraries] == [["CTA", "ATH", "CTA"]]
+        called = {(c.args[0], c.args[1]) for c in mock_provider.search_one_way.call_args_list}
+        assert called == {("CTA", "ATH"), ("ATH", "CTA")}
+
+    async def test_batching_provider_prices_many_legs_per_call(self):
+        """Provider con max_legs_per_call > 1 (Apify multi-city): un biglietto multi-city per rotta."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "BUD", "CTA"])]
+
+        async def fake_search_legs(legs, direct_only=False):
+            return {
+                (leg.origin, leg.destination, leg.date): [
+                    FlightOffer(leg.origin, leg.destination, f"{leg.date.isoformat()}T08:00:00", 45.0, "FR", True, 90)
+                ]
+                for leg in legs
+            }
+
+        batcher = AsyncMock(max_legs_per_call=3)
+        batcher.search_legs = AsyncMock(side_effect=fake_search_legs)
+        rate_limit = AsyncMock(return_value=True)
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("apify", batcher)])), \
+             patch("app.services.itinerary_engine.check_rate_limit", new=rate_limit), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 0, "amadeus": 0})):
+
+            result = await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        # 2 rotte da 2 tratte → 2 chiamate (e 2 unità di quota) invece di 4
+        assert batcher.search_legs.await_count == 2
+        assert rate_limit.await_count == 2
+        batcher.search_one_way.assert_not_called()
+        assert [i.total_price_per_person_eur for i in result.itineraries] == [90.0, 90.0]
+
+    async def test_batch_falls_back_to_the_cascade_without_quota(self):
+        """Senza quota per il provider a lotti ogni tratta passa al resto della cascata."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+        batcher = AsyncMock(max_legs_per_call=5)
+        fallback = _make_provider({("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0})
+
+        async def rate_limit(key, limit, window, cost=1):
+            return not key.startswith("apify")
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("apify", batcher), ("amadeus", fallback)])), \
+             patch("app.services.itinerary_engine.check_rate_limit", new=rate_limit), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 0, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        batcher.search_legs.assert_not_called()
+        assert fallback.search_one_way.await_count == 2
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(120.0)
+
+    async def test_ticket_offers_stay_with_their_route(self):
+        """Una tratta in comune a due rotte entra nel biglietto di entrambe: ogni rotta usa solo il proprio."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"]), _make_suggestion(["CTA", "ATH", "BUD", "CTA"])]
+        ticket_totals = {2: 100.0, 3: 60.0}
+
+        async def fake_search_legs(legs, direct_only=False):
+            share = ticket_totals[len(legs)] / len(legs)
+            return {
+                (leg.origin, leg.destination, leg.date): [FlightOffer(
+                    leg.origin, leg.destination, f"{leg.date.isoformat()}T08:00:00", share, "AZ", True, 90,
+                    ticket_share=True,
+                )]
+                for leg in legs
+            }
+
+        batcher = AsyncMock(max_legs_per_call=6)
+        batcher.search_legs = AsyncMock(side_effect=fake_search_legs)
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("amadeus", batcher)])), \
+             patch("app.services.itinerary_engine.check_rate_limit", new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 0, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        # una chiamata per rotta, ciascuna con le proprie tratte (CTA→ATH in entrambe)
+        sent = sorted(
+            [(leg.origin, leg.destination) for leg in c.args[0]] for c in batcher.search_legs.await_args_list
+        )
+        assert sent == [[("CTA", "ATH"), ("ATH", "BUD"), ("BUD", "CTA")], [("CTA", "ATH"), ("ATH", "CTA")]]
+        totals = {tuple(i.route): i.total_price_per_person_eur for i in result.itineraries}
+        assert totals == {("CTA", "ATH", "BUD", "CTA"): pytest.approx(60.0), ("CTA", "ATH", "CTA"): pytest.approx(100.0)}
+        # le quote di un biglietto non vanno in flight_cache
+        assert self.save_to_cache_many.await_args.args[1] == {}
+
+    async def test_legs_missing_from_the_ticket_priced_one_way_by_the_same_provider(self):
+        """Solo Amadeus nella cascata: le tratte senza biglietto passano alle GET one-way dello stesso provider."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+        batcher = _make_provider({("CTA", "ATH"): 60.0, ("ATH", "CTA"): 55.0})
+        batcher.max_legs_per_call = 6
+        batcher.search_legs = AsyncMock(return_value={})
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("amadeus", batcher)])), \
+             patch("app.services.itinerary_engine.check_rate_limit", new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 0, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        batcher.search_legs.assert_awaited_once()
+        assert batcher.search_one_way.await_count == 2
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(115.0)
+
+    async def test_legs_missing_from_the_batch_go_down_the_cascade(self):
+        """Le tratte senza offerte nel lotto (es. esecuzione fallita) passano alla GET one-way dello
+        stesso provider e poi al provider successivo."""
+        suggestions = [_make_suggestion(["CTA", "ATH", "CTA"])]
+
+        async def fake_search_legs(legs, direct_only=False):
+            # solo l'andata: il ritorno manca
+            return {
+                (leg.origin, leg.destination, leg.date): [
+                    FlightOffer(leg.origin, leg.destination, f"{leg.date.isoformat()}T08:00:00", 45.0, "FR", True, 90)
+                ]
+                for leg in legs if leg.origin == "CTA"
+            }
+
+        batcher = AsyncMock(max_legs_per_call=5)
+        batcher.search_legs = AsyncMock(side_effect=fake_search_legs)
+        batcher.search_one_way = AsyncMock(return_value=[])
+        fallback = _make_provider({("CTA", "ATH"): 60.0, ("ATH", "CTA"): 60.0})
+
+        with patch("app.services.itinerary_engine.calculate_area",
+                   new=AsyncMock(return_value=_make_area_result())), \
+             patch("app.services.itinerary_engine.generate_with_fallback",
+                   new=AsyncMock(return_value=suggestions)), \
+             patch("app.services.itinerary_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("apify", batcher), ("amadeus", fallback)])), \
+             patch("app.services.itinerary_engine.check_rate_limit", new=AsyncMock(return_value=True)), \
+             patch("app.services.itinerary_engine.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 0, "amadeus": 1800})):
+
+            result = await run_smart_multi(session=AsyncMock(), **SMART_PARAMS)
+
+        assert [(c.args[0], c.args[1]) for c in batcher.search_one_way.call_args_list] == [("ATH", "CTA")]
+        called = [(c.args[0], c.args[1]) for c in fallback.search_one_way.call_args_list]
+        assert called == [("ATH", "CTA")]
+        assert result.itineraries[0].total_price_per_person_eur == pytest.approx(105.0)
@@ -0,0 +1,139 @@
+"""
+Test per il modulo meet_search: pianificazione dei buchi, ranking e flusso mockato.
+"""
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.meet_search import (
+    RouteFare,
+    _plan_holes,
+    _rank_destinations,
+    meet_in_the_middle_search,
+)
+from app.services.providers.base import FlightOffer
+
+D = date(2026, 6, 1)
+
+
+def _fare(price):
+    return RouteFare(price, "X", D)
+
+
+class TestRankDestinations:
+
+    MATRIX = {
+        "BCN": {"FCO": _fare(50), "BER": _fare(50)},    # totale 100, max 50
+        "PRG": {"FCO": _fare(10), "BER": _fare(80)},    # totale 90,  max 80
+        "LIS": {"FCO": _fare(20)},                      # incompleta
+    }
+
+    def test_rank_by_total(self):
+        ranked = _rank_destinations(["FCO", "BER"], self.MATRIX, "total", 10)
+        assert [r[0] for r in ranked] == ["PRG", "BCN"]
+
+    def test_rank_by_max(self):
+        ranked = _rank_destinations(["FCO", "BER"], self.MATRIX, "max", 10)
+        assert [r[0] for r in ranked] == ["BCN", "PRG"]
+
+
+class TestPlanHoles:
+
+    def test_fewest_missing_and_cheapest_first(self):
+        origins = ["FCO", "BER", "WAW"]
+        matrix = {
+            "BCN": {"FCO": _fare(50), "BER": _fare(50)},   # manca 1, parziale 100
+            "PRG": {"FCO": _fare(10), "BER": _fare(20)},   # manca 1, parziale 30
+            "LIS": {"FCO": _fare(5)},                      # mancano 2
+            "OPO": {"FCO": _fare(1), "BER": _fare(1), "WAW": _fare(1)},  # completa
+        }
+        plan = _plan_holes(origins, matrix, "total", limit=10)
+        assert plan == [("WAW", "PRG"), ("WAW", "BCN"), ("BER", "LIS"), ("WAW", "LIS")]
+
+    def test_unknown_destinations_after_partly_known_ones(self):
+        matrix = {"LIS": {"FCO": _fare(5)}}
+        plan = _plan_holes(["FCO", "BER"], matrix, "total", limit=4, unknown=["VIE", "OSL"])
+        assert plan == [("BER", "LIS"), ("FCO", "VIE"), ("BER", "VIE")]
+
+    def test_destinations_are_not_half_completed(self):
+        matrix = {"LIS": {"FCO": _fare(5)}}
+        assert _plan_holes(["FCO", "BER", "WAW"], matrix, "total", limit=1) == []
+
+
+class TestMeetInTheMiddleSearch:
+
+    async def test_hole_is_filled_and_destination_ranked(self):
+        airports = []
+        for code in ("FCO", "BER", "PRG"):
+            a = MagicMock()
+            a.iata_code = code
+            a.city = code.title()
+            a.latitude = 50.0
+            a.longitude = 14.0
+            airports.append(a)
+
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = airports
+        matrix_result = MagicMock()
+        matrix_result.all.return_value = [("FCO", "PRG", 30.0, "Ryanair", D)]
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result, matrix_result]
+
+        offer = FlightOffer("BER", "PRG", "2026-06-02T07:00:00", 25.0, "Eurowings", True, 60)
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[offer])
+
+        with patch("app.services.meet_search.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.meet_search.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})), \
+             patch("app.services.providers.factory.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.meet_search.save_to_cache_many", new=AsyncMock()):
+
+            results, cached, _ = await meet_in_the_middle_search(
+                session, ["FCO", "BER"], D, date(2026, 6, 3)
+            )
+
+        assert cached is False
+        assert len(results) == 1
+        assert results[0]["destination"] == "PRG"
+        assert results[0]["total_price_eur"] == pytest.approx(55.0)
+        assert results[0]["max_price_eur"] == pytest.approx(30.0)
+        assert [f["origin"] for f in results[0]["fares"]] == ["FCO", "BER"]
+
+    async def test_cold_cache_tries_closest_destinations(self):
+        airports = []
+        for code, lat in (("FCO", 41.8), ("BER", 52.4), ("PRG", 50.1), ("OSL", 60.2)):
+            a = MagicMock()
+            a.iata_code = code
+            a.city = code.title()
+            a.latitude = lat
+            a.longitude = 14.0
+            airports.append(a)
+
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = airports
+        matrix_result = MagicMock()
+        matrix_result.all.return_value = []
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result, matrix_result]
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[])
+
+        with patch("app.services.meet_search.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.meet_search.get_provider_quotas",
+                   new=AsyncMock(return_value={"serpapi": 200, "amadeus": 1800})), \
+             patch("app.services.providers.factory.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.meet_search.save_to_cache_many", new=AsyncMock()), \
+             patch("app.services.meet_search._MAX_NEW_CALLS_PER_SEARCH", 2):
+
+            await meet_in_the_middle_search(session, ["FCO", "BER"], D, date(2026, 6, 3))
+
+        # nessuna tariffa nota: con 2 chiamate si completa PRG (la più vicina), non OSL
+        pairs = [c.args[:2] for c in mock_provider.search_one_way.await_args_list]
+        assert sorted(pairs) == [("BER", "PRG"), ("FCO", "PRG")]
@@ -0,0 +1,110 @@
+"""
+Test per l'LRU in-process (db/memory_cache.py) — puro, nessun servizio esterno.
+"""
+import json
+from dataclasses import replace
+from datetime import date, datetime, timedelta, timezone
+
+from app.db.memory_cache import OfferLRU, _WORKER_ID, _apply_invalidation, offer_lru
+from app.services.providers.base import FlightOffer
+
+D = date(2026, 6, 1)
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _offer(origin="FCO", price=50.0):
+    return FlightOffer(origin, "CTA", "2026-06-01T08:00:00", price, "ITA", True, 90)
+
+
+class TestOfferLRU:
+
+    def test_hit_and_miss_counted(self):
+        lru = OfferLRU(10)
+        lru.put(("FCO", "CTA", D), [_offer()], _now(), _now() + timedelta(hours=1))
+        assert lru.get(("FCO", "CTA", D)).offers[0].price_eur == 50.0
+        assert lru.get(("ATH", "CTA", D)) is None
+        stats = lru.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+
+    def test_expired_entries_are_not_served(self):
+        lru = OfferLRU(10)
+        lru.put(("FCO", "CTA", D), [_offer()], _now(), _now() - timedelta(seconds=1))
+        assert lru.get(("FCO", "CTA", D)) is None
+        assert lru.stats()["entries"] == 0
+
+    def test_least_recently_used_is_evicted(self):
+        lru = OfferLRU(2)
+        exp = _now() + timedelta(hours=1)
+        lru.put(("AAA", "CTA", D), [_offer("AAA")], _now(), exp)
+        lru.put(("BBB", "CTA", D), [_offer("BBB")], _now(), exp)
+        lru.get(("AAA", "CTA", D))                      # AAA diventa il più recente
+        lru.put(("CCC", "CTA", D), [_offer("CCC")], _now(), exp)
+        assert lru.get(("BBB", "CTA", D)) is None
+        assert lru.get(("AAA", "CTA", D)) is not None
+        assert lru.stats()["evictions"] == 1
+
+    def test_approx_bytes_follows_puts_and_evictions(self):
+        lru = OfferLRU(1)
+        exp = _now() + timedelta(hours=1)
+        lru.put(("AAA", "CTA", D), [_offer("AAA"), _offer("AAA", 60.0)], _now(), exp)
+        two = lru.stats()["approx_bytes"]
+        lru.put(("AAA", "CTA", D), [_offer("AAA")], _now(), exp)      # riscrittura
+        one = lru.stats()["approx_bytes"]
+        assert two > one > 0
+        lru.put(("BBB", "CTA", D), [_offer("BBB")], _now(), exp)      # evict AAA
+        assert lru.stats()["approx_bytes"] == one
+        lru.invalidate(("BBB", "CTA", D))
+        assert lru.stats()["approx_bytes"] == 0
+
+    def test_put_never_encodes_the_offers(self):
+        """Stima a costo fisso: anche offerte che il codec binario rifiuta entrano nell'LRU."""
+        lru = OfferLRU(10)
+        exp = _now() + timedelta(hours=1)
+        odd = replace(_offer("AAA", -5.0), duration_minutes=70_000)
+        lru.put(("AAA", "CTA", D), [odd], _now(), exp)
+        assert lru.get(("AAA", "CTA", D)).offers == [odd]
+        assert lru.stats()["approx_bytes"] > 0
+
+    def test_negative_entry(self):
+        lru = OfferLRU(10)
+        lru.put_negative(("FCO", "CTA", D))
+        entry = lru.get(("FCO", "CTA", D))
+        assert entry is not None and entry.offers is None
+
+    def test_scan_marker_follows_writes_and_invalidations(self):
+        lru = OfferLRU(10)
+        exp = _now() + timedelta(hours=1)
+        lru.put(("FCO", "CTA", D), [_offer()], _now(), exp)
+        lru.mark_scanned("CTA", D, {"FCO"})
+        assert lru.scanned_origins("CTA", D) == {"FCO"}
+
+        # una scrittura locale estende il marker
+        lru.put(("ATH", "CTA", D), [_offer("ATH")], _now(), exp)
+        assert lru.scanned_origins("CTA", D) == {"FCO", "ATH"}
+
+        # un'invalidazione remota lo rende incompleto → eliminato
+        lru.invalidate(("BUD", "CTA", D))
+        assert lru.scanned_origins("CTA", D) is None
+
+    def test_scan_marker_refused_when_rows_missing(self):
+        lru = OfferLRU(10)
+        lru.mark_scanned("CTA", D, {"FCO"})
+        assert lru.scanned_origins("CTA", D) is None
+
+
+class TestApplyInvalidation:
+
+    def test_other_worker_message_drops_key(self):
+        offer_lru.put(("FCO", "CTA", D), [_offer()], _now(), _now() + timedelta(hours=1))
+        _apply_invalidation(json.dumps({"sender": "other", "keys": [["FCO", "CTA", D.isoformat()]]}))
+        assert offer_lru.get(("FCO", "CTA", D)) is None
+
+    def test_own_message_is_ignored(self):
+        offer_lru.put(("FCO", "CTA", D), [_offer()], _now(), _now() + timedelta(hours=1))
+        _apply_invalidation(json.dumps({"sender": _WORKER_ID, "keys": [["FCO", "CTA", D.isoformat()]]}))
+        assert offer_lru.get(("FCO", "CTA", D)) is not None
@@ -0,0 +1,86 @@
+"""
+Test per offer_codec (formato binario compatto) e per la decodifica delle righe di cache.
+"""
+from dataclasses import asdict
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.db.cache import _encode_for_storage, offers_from_row
+from app.db.offer_codec import FORMAT_VERSION, decode_offers, encode_offers
+from app.services.providers.base import FlightOffer
+
+OFFERS = [
+    FlightOffer("FCO", "CTA", "2026-06-01T06:30:00", 19.99, "Ryanair", True, 75),
+    FlightOffer("FCO", "CTA", "2026-06-01T21:05:00", 123.4, "ITA Airways", False, 210),
+    FlightOffer("FCO", "CTA", "2026-06-02T00:00:00", 0.0, "Ryanair", True, 75),
+]
+
+
+class TestRoundTrip:
+
+    def test_plain(self):
+        assert decode_offers(encode_offers(OFFERS)) == OFFERS
+
+    def test_compressed(self):
+        assert decode_offers(encode_offers(OFFERS, compress=True)) == OFFERS
+
+    def test_empty_list(self):
+        assert decode_offers(encode_offers([])) == []
+
+    @pytest.mark.parametrize("departure", [
+        "2026-06-01T06:30",             # formato breve senza secondi
+        "2026-06-01T06:30:15",          # secondi diversi da zero
+        "2026-06-01T06:30:00+02:00",    # con fuso orario
+        "2026-06-01 06:30:00",          # separatore spazio
+        "",
+    ])
+    def test_departure_string_is_preserved(self, departure):
+        offer = FlightOffer("FCO", "CTA", departure, 50.0, "Ryanair", True, 75)
+        assert decode_offers(encode_offers([offer]))[0].departure == departure
+
+    def test_price_is_kept_to_the_cent(self):
+        offer = FlightOffer("FCO", "CTA", "2026-06-01T06:30:00", 49.999, "Ryanair", True, 75)
+        assert decode_offers(encode_offers([offer]))[0].price_eur == 50.0
+
+
+class TestCompactness:
+
+    def test_repeated_strings_are_interned(self):
+        offers = OFFERS[:1] * 50
+        blob = encode_offers(offers)
+        assert blob.count(b"Ryanair") == 1
+        assert len(blob) < len(str([asdict(o) for o in offers])) / 5
+
+
+class TestHeader:
+
+    def test_bad_magic(self):
+        with pytest.raises(ValueError, match="Not a packed"):
+            decode_offers(b"XX" + encode_offers(OFFERS)[2:])
+
+    def test_unknown_version(self):
+        blob = bytearray(encode_offers(OFFERS))
+        blob[2] = FORMAT_VERSION + 1
+        with pytest.raises(ValueError, match="version"):
+            decode_offers(bytes(blob))
+
+
+class TestCacheRows:
+
+    def test_offers_from_jsonb_row(self):
+        row = SimpleNamespace(raw_response=[asdict(o) for o in OFFERS], raw_packed=None)
+        assert offers_from_row(row) == OFFERS
+
+    def test_offers_from_packed_row(self):
+        row = SimpleNamespace(raw_response=None, raw_packed=encode_offers(OFFERS))
+        assert offers_from_row(row) == OFFERS
+
+    @pytest.mark.parametrize("storage_format", ["jsonb", "packed", "packed_zlib"])
+    def test_storage_format_setting(self, storage_format):
+        with patch("app.db.cache.settings.cache_storage_format", storage_format):
+            raw, packed = _encode_for_storage(OFFERS)
+        assert (raw is None) != (packed is None)
+        row = SimpleNamespace(raw_response=raw, raw_packed=packed)
+        assert offers_from_row(row) == OFFERS
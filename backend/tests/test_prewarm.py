@@ -0,0 +1,143 @@
+"""
+Test per il refresh-ahead in background (services/prewarm.py) e lo storico ricerche (db/search_history.py).
+"""
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sqlalchemy.dialects import postgresql
+
+from app.db.search_history import demand_ranking, record_search
+from app.services.prewarm import is_offpeak, refresh_candidates, run_prewarm_cycle, spare_providers
+from app.services.providers.base import FlightOffer
+
+NOW = datetime.now(timezone.utc).replace(tzinfo=None)
+DAY = date.today() + timedelta(days=10)
+NIGHT = NOW.replace(hour=3)
+
+
+def _offer(origin, destination, day=DAY, price=50.0):
+    return FlightOffer(origin, destination, f"{day.isoformat()}T08:00:00", price, "ITA", True, 90)
+
+
+def _rows_result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
+
+
+def _cache_row(origin, destination, expires_in_minutes):
+    return SimpleNamespace(
+        origin=origin, destination=destination, departure_date=DAY,
+        expires_at=NOW + timedelta(minutes=expires_in_minutes),
+    )
+
+
+class TestOffpeak:
+
+    def test_plain_window(self):
+        assert is_offpeak(3, "1-6")
+        assert not is_offpeak(6, "1-6")
+        assert not is_offpeak(12, "1-6")
+
+    def test_window_across_midnight(self):
+        assert is_offpeak(23, "22-6") and is_offpeak(2, "22-6")
+        assert not is_offpeak(12, "22-6")
+
+    def test_empty_window_disables(self):
+        assert not is_offpeak(3, "")
+
+
+class TestSpareProviders:
+
+    async def test_reserve_is_left_to_interactive_traffic(self):
+        providers = [("serpapi", MagicMock()), ("amadeus", MagicMock())]
+        with patch("app.services.prewarm.get_providers_in_order", new=AsyncMock(return_value=providers)), \
+             patch("app.services.prewarm.get_provider_quotas", new=AsyncMock(return_value={"serpapi": 100, "amadeus": 1500})), \
+             patch("app.services.prewarm.settings.prewarm_quota_reserve", 0.5):
+            spare = await spare_providers()
+        # serpapi: 100 rimaste su 230 → sotto la riserva di 115
+        assert [name for name, _ in spare] == ["amadeus"]
+
+
+class TestRefreshCandidates:
+
+    async def test_demand_first_then_soonest_expiry(self):
+        session = AsyncMock()
+        session.execute.return_value = _rows_result([
+            _cache_row("FCO", "CTA", 10),
+            _cache_row("BUD", "ATH", 5),
+            _cache_row("ATH", "CTA", 30),
+        ])
+        keys = await refresh_candidates(session, {"CTA": 9, "ATH": 2}, {"FCO": 1}, limit=2)
+
+        assert keys == [("FCO", "CTA", DAY), ("ATH", "CTA", DAY)]
+        sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "flight_cache.expires_at >" in sql and "flight_cache.expires_at <=" in sql
+
+    async def test_no_demand_no_query(self):
+        session = AsyncMock()
+        assert await refresh_candidates(session, {}, {}, limit=10) == []
+        session.execute.assert_not_called()
+
+
+class TestRunPrewarmCycle:
+
+    async def test_skipped_during_peak_hours(self):
+        session = AsyncMock()
+        with patch("app.services.prewarm.settings.prewarm_offpeak_hours", "1-6"):
+            stats = await run_prewarm_cycle(session, now=NOW.replace(hour=18))
+        assert stats == {"skipped": "peak_hours"}
+        session.execute.assert_not_called()
+
+    async def test_refreshes_candidates_within_budget(self):
+        candidates = [("FCO", "CTA", DAY), ("ATH", "CTA", DAY), ("BUD", "CTA", DAY)]
+        cascade = AsyncMock(side_effect=[
+            ("serpapi", [_offer("FCO", "CTA"), _offer("FCO", "CTA", day=DAY + timedelta(days=1))]),
+            (None, []),
+        ])
+        with patch("app.services.prewarm.settings.prewarm_offpeak_hours", "1-6"), \
+             patch("app.services.prewarm.settings.prewarm_max_calls_per_cycle", 2), \
+             patch("app.services.prewarm.demand_ranking", new=AsyncMock(return_value=({"CTA": 5}, {}))), \
+             patch("app.services.prewarm.refresh_candidates", new=AsyncMock(return_value=candidates[:2])) as pick, \
+             patch("app.services.prewarm.spare_providers", new=AsyncMock(return_value=[("serpapi", MagicMock())])), \
+             patch("app.services.prewarm.search_one_way_cascade", new=cascade), \
+             patch("app.services.prewarm.save_to_cache_many", new=AsyncMock()) as save:
+            stats = await run_prewarm_cycle(AsyncMock(), now=NIGHT)
+
+        assert pick.await_args.args[3] == 2
+        assert stats == {"candidates": 2, "calls": 2, "refreshed": 1}
+        saved = save.await_args.args[1]
+        # solo le offerte del giorno della riga
+        assert list(saved) == [("FCO", "CTA", DAY)] and len(saved[("FCO", "CTA", DAY)]) == 1
+
+    async def test_stops_when_only_reserve_is_left(self):
+        cascade = AsyncMock()
+        with patch("app.services.prewarm.settings.prewarm_offpeak_hours", "1-6"), \
+             patch("app.services.prewarm.demand_ranking", new=AsyncMock(return_value=({"CTA": 5}, {}))), \
+             patch("app.services.prewarm.refresh_candidates", new=AsyncMock(return_value=[("FCO", "CTA", DAY)])), \
+             patch("app.services.prewarm.spare_providers", new=AsyncMock(return_value=[])), \
+             patch("app.services.prewarm.search_one_way_cascade", new=cascade), \
+             patch("app.services.prewarm.save_to_cache_many", new=AsyncMock()):
+            stats = await run_prewarm_cycle(AsyncMock(), now=NIGHT)
+
+        cascade.assert_not_called()
+        assert stats["calls"] == 0
+
+
+class TestSearchHistory:
+
+    async def test_demand_ranking_groups_by_airport(self):
+        session = AsyncMock()
+        session.execute.side_effect = [_rows_result([("CTA", 7)]), _rows_result([("FCO", 3)])]
+        destinations, origins = await demand_ranking(session, days=14, limit=20)
+
+        assert destinations == {"CTA": 7} and origins == {"FCO": 3}
+        sql = str(session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        assert "search_history.params ->>" in sql
+        assert "GROUP BY" in sql
+
+    async def test_record_search_never_raises(self):
+        maker = MagicMock(side_effect=RuntimeError("db down"))
+        with patch("app.db.search_history.async_session_maker", maker):
+            await record_search("reverse", {"destination": "CTA"})
@@ -0,0 +1,110 @@
+"""
+Test per lo storico prezzi append-only (db/price_history.py).
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.db.price_history import cheapest_seen, cheapest_seen_many, price_trend, record_prices
+from app.models.flight_cache import PriceHistory
+from app.services.providers.base import FlightOffer
+
+D = date(2026, 11, 20)
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+
+
+def _sql(session):
+    return str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+
+
+class TestModel:
+
+    def test_partitioned_by_fetched_month(self):
+        ddl = str(CreateTable(PriceHistory.__table__).compile(dialect=postgresql.dialect()))
+        assert "PARTITION BY RANGE (fetched_at)" in ddl
+        assert "PRIMARY KEY (id, fetched_at)" in ddl
+
+
+class TestRecordPrices:
+
+    async def test_one_row_per_key_with_cheapest_offer(self):
+        session = AsyncMock()
+        offers = [
+            FlightOffer("FCO", "CTA", "2026-11-20T08:00:00", 45.0, "ITA", True, 80),
+            FlightOffer("FCO", "CTA", "2026-11-20T19:00:00", 29.0, "Ryanair", True, 75),
+        ]
+        await record_prices(session, {("FCO", "CTA", D): offers}, NOW)
+
+        rows = session.execute.await_args.args[1]
+        assert rows == [{
+            "origin": "FCO", "destination": "CTA", "departure_date": D, "fetched_at": NOW,
+            "min_price_eur": 29.0, "airline": "Ryanair", "sample_count": 2,
+        }]
+
+    async def test_nothing_to_record(self):
+        session = AsyncMock()
+        await record_prices(session, {}, NOW)
+        session.execute.assert_not_called()
+
+
+class TestQueries:
+
+    async def test_price_trend_groups_by_day(self):
+        result = MagicMock()
+        result.all.return_value = [(date(2026, 10, 18), Decimal("30.00"), Decimal("34.333"), 3)]
+        session = AsyncMock()
+        session.execute.return_value = result
+
+        trend = await price_trend(session, "FCO", "CTA", D, days=7)
+
+        assert trend == [{"day": date(2026, 10, 18), "min_price_eur": 30.0, "avg_price_eur": 34.33, "observations": 3}]
+        sql = _sql(session)
+        assert "GROUP BY" in sql
+        assert "price_history.departure_date =" in sql
+
+    async def test_cheapest_seen(self):
+        row = MagicMock()
+        row.min_price_eur = Decimal("19.99")
+        row.airline = "Ryanair"
+        row.departure_date = D
+        row.fetched_at = NOW
+        result = MagicMock()
+        result.scalar_one_or_none.return_value = row
+        session = AsyncMock()
+        session.execute.return_value = result
+
+        best = await cheapest_seen(session, "FCO", "CTA")
+
+        assert best["price_eur"] == 19.99
+        sql = _sql(session)
+        assert "ORDER BY price_history.min_price_eur" in sql
+        assert "price_history.departure_date" not in sql.split("WHERE")[1]
+
+    async def test_cheapest_seen_never_observed(self):
+        result = MagicMock()
+        result.scalar_one_or_none.return_value = None
+        session = AsyncMock()
+        session.execute.return_value = result
+        assert await cheapest_seen(session, "FCO", "CTA", D) is None
+
+    async def test_cheapest_seen_many_one_grouped_query(self):
+        result = MagicMock()
+        result.all.return_value = [("FCO", "CTA", Decimal("19.99"))]
+        session = AsyncMock()
+        session.execute.return_value = result
+
+        floors = await cheapest_seen_many(session, [("FCO", "CTA"), ("ATH", "CTA")], days=90)
+
+        assert floors == {("FCO", "CTA"): 19.99}
+        assert session.execute.await_count == 1
+        sql = _sql(session)
+        assert "GROUP BY price_history.origin, price_history.destination" in sql
+        assert "price_history.fetched_at >=" in sql
+
+    async def test_cheapest_seen_many_no_pairs_no_query(self):
+        session = AsyncMock()
+        assert await cheapest_seen_many(session, []) == {}
+        session.execute.assert_not_called()
@@ -0,0 +1,75 @@
+"""
+Test per la result cache dello Smart Multi-City (db/result_cache.py).
+
+Redis è sostituito da un dizionario in memoria che registra il TTL passato a SET.
+"""
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.db.result_cache import CachedItinerary, CachedResult, get_result, result_key, save_result
+from app.services.llm.base import SuggestedItinerary
+from app.services.providers.base import FlightOffer
+
+
+class _FakeRedis:
+
+    def __init__(self):
+        self.data = {}
+        self.ttl_ms = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+        self.ttl_ms[key] = px
+
+
+def _entry():
+    return CachedResult(
+        budget_per_person_eur=300.0,
+        itineraries=[CachedItinerary(
+            suggested=SuggestedItinerary(["CTA", "ATH", "CTA"], "Grecia", "easy", ["jun"]),
+            offers=[
+                FlightOffer("CTA", "ATH", "2026-06-01T08:00:00", 60.0, "A3", True, 90),
+                FlightOffer("ATH", "CTA", "2026-06-07T08:00:00", 55.0, "A3", True, 95),
+            ],
+            total_per_person=115.0,
+        )],
+    )
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def test_key_ignores_budget_and_travelers_but_not_the_search_shape():
+    key = result_key("cta", 12, date(2026, 6, 1), date(2026, 6, 13), False, "llm", 0)
+    assert key == "smart_multi:result:CTA:12:2026-06-01:2026-06-13:0:llm:0"
+    assert key != result_key("CTA", 12, date(2026, 6, 1), date(2026, 6, 13), True, "llm", 0)
+    assert key != result_key("CTA", 12, date(2026, 6, 1), date(2026, 6, 13), False, "graph", 0)
+
+
+async def test_round_trip_with_ttl_until_expiry():
+    redis = _FakeRedis()
+    with patch("app.db.result_cache.get_redis", new=AsyncMock(return_value=redis)):
+        await save_result("k", _entry(), _now() + timedelta(hours=2))
+        found = await get_result("k")
+
+    assert found == _entry()
+    assert redis.ttl_ms["k"] == pytest.approx(2 * 3600 * 1000, rel=0.01)
+
+
+async def test_already_expired_entry_is_not_stored():
+    redis = _FakeRedis()
+    with patch("app.db.result_cache.get_redis", new=AsyncMock(return_value=redis)):
+        await save_result("k", _entry(), _now() - timedelta(seconds=1))
+    assert redis.data == {}
+
+
+async def test_redis_down_is_a_miss():
+    with patch("app.db.result_cache.get_redis", new=AsyncMock(side_effect=ConnectionError("down"))):
+        await save_result("k", _entry(), _now() + timedelta(hours=1))
+        assert await get_result("k") is None
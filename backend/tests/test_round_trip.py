@@ -0,0 +1,229 @@
+"""
+Test per il modulo round_trip: helper puri, query di accoppiamento e flusso mockato.
+"""
+from dataclasses import asdict
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.providers.base import FlightOffer
+from app.services.round_trip import (
+    _pairing_query,
+    _plan_missing_directions,
+    _return_window,
+    round_trip_search,
+)
+
+_FAKE_QUOTAS = {"serpapi": 200, "amadeus": 1800}
+
+
+# ---------------------------------------------------------------------------
+# Helper puri
+# ---------------------------------------------------------------------------
+
+class TestReturnWindow:
+
+    def test_weekend(self):
+        # partenza venerdì, rientro domenica
+        friday = date(2026, 6, 5)
+        assert _return_window(friday, friday, 2, 2) == (date(2026, 6, 7), date(2026, 6, 7))
+
+    def test_range(self):
+        assert _return_window(date(2026, 6, 1), date(2026, 6, 3), 1, 4) == (
+            date(2026, 6, 2), date(2026, 6, 7)
+        )
+
+
+class TestPlanMissingDirections:
+
+    def test_only_half_cached_destinations_are_completed(self):
+        coverage = {
+            ("CTA", "ATH"): 40.0,                         # manca il ritorno
+            ("BUD", "CTA"): 30.0,                         # manca l'andata
+            ("CTA", "FCO"): 20.0, ("FCO", "CTA"): 25.0,   # completa
+        }
+        plan = _plan_missing_directions("CTA", coverage, ["ATH", "BUD", "FCO"], limit=10)
+        # la metà nota più economica viene completata per prima
+        assert plan == [("CTA", "BUD"), ("ATH", "CTA")]
+
+    def test_fixed_destination_without_cache_fetches_both(self):
+        plan = _plan_missing_directions("CTA", {}, ["ATH"], limit=10)
+        assert plan == [("CTA", "ATH"), ("ATH", "CTA")]
+
+    def test_unknown_destinations_after_half_cached_ones(self):
+        coverage = {("CTA", "ATH"): 40.0}
+        plan = _plan_missing_directions("CTA", coverage, ["ATH", "FCO", "BUD"], limit=4)
+        # FCO viene preso per intero, BUD non entra nel budget
+        assert plan == [("ATH", "CTA"), ("CTA", "FCO"), ("FCO", "CTA")]
+
+    def test_limit(self):
+        coverage = {("CTA", c): float(i) for i, c in enumerate(["AAA", "BBB", "CCC"])}
+        assert len(_plan_missing_directions("CTA", coverage, ["AAA", "BBB", "CCC"], limit=2)) == 2
+
+
+class TestPairingQuery:
+
+    def test_compiles_to_single_self_join(self):
+        stmt = _pairing_query(
+            "CTA", date(2026, 6, 5), date(2026, 6, 5), 2, 2,
+            destination=None, direct_only=True, max_per_destination=1, max_results=20,
+        )
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert sql.count("FROM flight_cache") == 1
+        assert "JOIN flight_cache" in sql
+        assert "row_number() OVER (PARTITION BY" in sql
+        assert "LIMIT" in sql
+
+
+# ---------------------------------------------------------------------------
+# round_trip_search — DB e provider mockati
+# ---------------------------------------------------------------------------
+
+def _make_airport(iata, city, latitude=40.0):
+    a = MagicMock()
+    a.iata_code = iata
+    a.city = city
+    a.latitude = latitude
+    a.longitude = 15.0
+    return a
+
+
+def _make_row(row_id, offer):
+    row = MagicMock()
+    row.id = row_id
+    row.raw_response = [asdict(offer)]
+    row.raw_packed = None
+    return row
+
+
+class TestRoundTripSearch:
+
+    async def test_missing_inbound_is_fetched_and_pairs_returned(self):
+        airports = [_make_airport("CTA", "Catania"), _make_airport("ATH", "Athens")]
+        out_offer = FlightOffer("CTA", "ATH", "2026-06-05T08:00:00", 40.0, "A3", True, 100)
+        in_offer = FlightOffer("ATH", "CTA", "2026-06-07T18:00:00", 35.0, "A3", True, 100)
+
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = airports
+        coverage_result = MagicMock()
+        coverage_result.all.return_value = [("CTA", "ATH", date(2026, 6, 5), 40.0)]
+        pair_result = MagicMock()
+        pair_result.all.return_value = [
+            SimpleNamespace(out_id=1, in_id=2, destination="ATH", nights=2, total=75.0)
+        ]
+        detail_result = MagicMock()
+        detail_result.scalars.return_value = iter([_make_row(1, out_offer), _make_row(2, in_offer)])
+
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result, coverage_result, pair_result, detail_result]
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[in_offer])
+        save = AsyncMock()
+
+        with patch("app.services.round_trip.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.round_trip.get_provider_quotas",
+                   new=AsyncMock(return_value=_FAKE_QUOTAS)), \
+             patch("app.services.providers.factory.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.round_trip.save_to_cache_many", new=save):
+
+            results, cached, _ = await round_trip_search(
+                session, "CTA", date(2026, 6, 5), date(2026, 6, 5), 2, 2,
+            )
+
+        # solo la direzione mancante (ATH → CTA) viene richiesta al provider
+        args = mock_provider.search_one_way.await_args.args
+        assert args[:2] == ("ATH", "CTA")
+        assert save.await_count == 1
+        assert cached is False
+        assert len(results) == 1
+        assert results[0]["total_price_eur"] == pytest.approx(75.0)
+        assert results[0]["nights"] == 2
+        assert results[0]["outbound"].departure.startswith("2026-06-05")
+
+    async def test_cold_cache_tries_nearest_airports(self):
+        airports = [
+            _make_airport("CTA", "Catania", 37.5),
+            _make_airport("OSL", "Oslo", 60.0),
+            _make_airport("FCO", "Rome", 41.8),
+        ]
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = airports
+        coverage_result = MagicMock()
+        coverage_result.all.return_value = []
+        pair_result = MagicMock()
+        pair_result.all.return_value = []
+
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result, coverage_result, pair_result]
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[])
+
+        with patch("app.services.round_trip.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.round_trip.get_provider_quotas",
+                   new=AsyncMock(return_value=_FAKE_QUOTAS)), \
+             patch("app.services.providers.factory.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.round_trip.save_to_cache_many", new=AsyncMock()):
+
+            await round_trip_search(
+                session, "CTA", date(2026, 6, 5), date(2026, 6, 5), 2, 2, max_results=1,
+            )
+
+        # cache vuota: entrambe le direzioni dell'aeroporto più vicino (FCO), non di OSL
+        pairs = [c.args[:2] for c in mock_provider.search_one_way.await_args_list]
+        assert sorted(pairs) == [("CTA", "FCO"), ("FCO", "CTA")]
+
+    async def test_partly_cached_direction_fetches_only_missing_days(self):
+        airports = [_make_airport("CTA", "Catania"), _make_airport("ATH", "Athens")]
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = airports
+        coverage_result = MagicMock()
+        # andata in cache solo il 5, ritorno in cache su tutta la finestra (7-8)
+        coverage_result.all.return_value = [
+            ("CTA", "ATH", date(2026, 6, 5), 40.0),
+            ("ATH", "CTA", date(2026, 6, 7), 35.0),
+            ("ATH", "CTA", date(2026, 6, 8), 30.0),
+        ]
+        pair_result = MagicMock()
+        pair_result.all.return_value = []
+
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result, coverage_result, pair_result]
+
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[])
+
+        with patch("app.services.round_trip.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.round_trip.get_provider_quotas",
+                   new=AsyncMock(return_value=_FAKE_QUOTAS)), \
+             patch("app.services.providers.factory.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.round_trip.save_to_cache_many", new=AsyncMock()):
+
+            await round_trip_search(
+                session, "CTA", date(2026, 6, 5), date(2026, 6, 6), 2, 2, destination="ATH",
+            )
+
+        # solo il giorno mancante dell'andata, il ritorno completo non viene richiesto
+        calls = [c.args[:4] for c in mock_provider.search_one_way.await_args_list]
+        assert calls == [("CTA", "ATH", date(2026, 6, 6), date(2026, 6, 6))]
+
+    async def test_unknown_destination_raises(self):
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = [_make_airport("CTA", "Catania")]
+        session = AsyncMock()
+        session.execute.side_effect = [airport_result]
+
+        with pytest.raises(ValueError, match="XYZ"):
+            await round_trip_search(
+                session, "CTA", date(2026, 6, 5), date(2026, 6, 5), 2, 2, destination="XYZ"
+            )
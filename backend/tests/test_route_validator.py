@@ -0,0 +1,87 @@
+"""
+Test per il filtro geografico delle rotte AI (services/route_validator.py).
+
+Aeroporti fittizi allineati lungo un meridiano a 111 km l'uno dall'altro:
+le lunghezze dei tour si calcolano a mente. Il registro aeroporti è mockato.
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.area_calculator import AreaResult, ReachableAirport
+from app.services.llm.base import SuggestedItinerary
+from app.services.route_validator import screen_routes, shortest_ordering, tour_km
+
+
+def _area():
+    # origine in (0, 0); A, B, C a 1°, 2°, 3° di latitudine
+    return AreaResult(
+        origin_iata="ORG",
+        radius_km=400,
+        num_stops=3,
+        airports=[
+            ReachableAirport("AAA", "A", "X", 1.0, 0.0, 111),
+            ReachableAirport("BBB", "B", "X", 2.0, 0.0, 222),
+            ReachableAirport("CCC", "C", "X", 3.0, 0.0, 333),
+        ],
+    )
+
+
+def _index():
+    return {a.iata_code: a for a in _area().airports}
+
+
+def _suggestion(*stops):
+    return SuggestedItinerary(["ORG", *stops, "ORG"], "Test route", "easy", [])
+
+
+def _session_with_registry(codes):
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = codes
+    session = AsyncMock()
+    session.execute.return_value = result
+    return session
+
+
+def test_tour_km_sums_the_legs():
+    assert tour_km(["ORG", "AAA", "BBB", "CCC", "ORG"], _index()) == pytest.approx(111 + 111 + 111 + 333, abs=1)
+
+
+def test_shortest_ordering_removes_the_zigzag():
+    best = shortest_ordering(["ORG", "CCC", "AAA", "BBB", "ORG"], _index())
+    assert sorted(best[1:-1]) == ["AAA", "BBB", "CCC"]
+    assert tour_km(best, _index()) == pytest.approx(tour_km(["ORG", "AAA", "BBB", "CCC", "ORG"], _index()))
+
+
+async def test_routes_within_the_area_cost_no_query():
+    session = _session_with_registry([])
+    screened = await screen_routes(session, [_suggestion("AAA", "BBB"), _suggestion("CCC")], _area())
+
+    session.execute.assert_not_called()
+    assert [s.route for s in screened.suggestions] == [["ORG", "AAA", "BBB", "ORG"], ["ORG", "CCC", "ORG"]]
+    assert screened.dropped == {} and screened.reordered == 0
+
+
+async def test_unknown_and_out_of_radius_airports_are_dropped():
+    # MXP esiste nel registro ma è fuori dal raggio; XXX non esiste
+    session = _session_with_registry(["MXP"])
+    screened = await screen_routes(
+        session, [_suggestion("AAA", "MXP"), _suggestion("XXX"), _suggestion("BBB")], _area()
+    )
+
+    assert session.execute.await_count == 1
+    assert [s.route for s in screened.suggestions] == [["ORG", "BBB", "ORG"]]
+    assert screened.dropped == {"out_of_radius": 1, "unknown_airport": 1}
+
+
+async def test_zigzag_is_reordered_and_duplicates_dropped():
+    session = _session_with_registry([])
+    # ORG→C→A→B→ORG = 333+222+111+222 = 888 km contro 666 km dell'ordine migliore
+    screened = await screen_routes(
+        session, [_suggestion("CCC", "AAA", "BBB"), _suggestion("CCC", "BBB", "AAA")], _area()
+    )
+
+    assert screened.reordered == 1
+    assert [s.route for s in screened.suggestions] == [["ORG", "CCC", "BBB", "AAA", "ORG"]]
+    assert "re-ordered" in screened.suggestions[0].reasoning
+    assert screened.dropped == {"duplicate": 1}
@@ -6,10 +6,10 @@ Tutte le dipendenze esterne vengono sostituite con mock:
   - get_providers_in_order → lista con un provider fittizio
   - get_provider_quotas    → saldi fissi
   - check_rate_limit    → restituisce True per default (limite non raggiunto)
-  - save_to_cache       → AsyncMock silenzioso
+  - save_to_cache_many  → AsyncMock silenzioso
 """
 from dataclasses import asdict
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -42,7 +42,9 @@ def _make_cache_entry(origin, destination, departure_date, offers, fetched_at=No
     entry.destination = destination
     entry.departure_date = departure_date
     entry.fetched_at = fetched_at or datetime(2026, 6, 1, 6, 0, 0)
+    entry.expires_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=6)
     entry.raw_response = [asdict(o) for o in offers]
+    entry.raw_packed = None
     return entry
 
 
@@ -115,12 +117,15 @@ DATE_TO = date(2026, 6, 3)
 class TestReverseSearch:
 
     async def test_all_from_cache(self):
-        """Se tutti gli aeroporti hanno cache valida, il provider non viene chiamato."""
+        """Se tutti gli aeroporti hanno cache valida su ogni giorno, il provider non viene chiamato."""
         fco_airport = _make_airport("FCO", "Rome", 41.80, 12.24)
         offer = FlightOffer("FCO", "CTA", "2026-06-01T08:00:00", 49.99, "ITA", True, 90)
-        cache_entry = _make_cache_entry("FCO", "CTA", DATE_FROM, [offer])
+        cache_entries = [
+            _make_cache_entry("FCO", "CTA", DATE_FROM + timedelta(days=i), [offer])
+            for i in range((DATE_TO - DATE_FROM).days + 1)
+        ]
 
-        session = _build_session([fco_airport], [cache_entry])
+        session = _build_session([fco_airport], cache_entries)
         mock_provider = AsyncMock()
 
         with patch("app.services.search_engine.get_providers_in_order",
@@ -129,7 +134,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=True)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()):
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
 
             results, all_from_cache, _, status = await reverse_search(
                 session=session,
@@ -145,6 +150,42 @@ class TestReverseSearch:
         assert status.serpapi_remaining == 200
         mock_provider.search_one_way.assert_not_called()
 
+    async def test_partial_cache_fetches_only_missing_days(self):
+        """Con un solo giorno in cache si chiedono al provider solo i giorni mancanti, tenendo il più economico."""
+        fco_airport = _make_airport("FCO", "Rome", 41.80, 12.24)
+        cached_offer = FlightOffer("FCO", "CTA", "2026-06-01T08:00:00", 49.99, "ITA", True, 90)
+        fresh_offer = FlightOffer("FCO", "CTA", "2026-06-03T08:00:00", 29.99, "Ryanair", True, 90)
+
+        session = _build_session(
+            [fco_airport], [_make_cache_entry("FCO", "CTA", DATE_FROM, [cached_offer])]
+        )
+        mock_provider = AsyncMock()
+        mock_provider.search_one_way = AsyncMock(return_value=[fresh_offer])
+        rate_limit = AsyncMock(return_value=True)
+
+        with patch("app.services.search_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[("serpapi", mock_provider)])), \
+             patch("app.services.search_engine.get_provider_quotas",
+                   new=AsyncMock(return_value=_FAKE_QUOTAS)), \
+             patch("app.services.search_engine.check_rate_limit", new=rate_limit), \
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
+
+            results, all_from_cache, _, _ = await reverse_search(
+                session=session,
+                destination=DESTINATION,
+                date_from=DATE_FROM,
+                date_to=DATE_TO,
+            )
+
+        mock_provider.search_one_way.assert_awaited_once()
+        args = mock_provider.search_one_way.call_args.args
+        assert args[2:4] == (date(2026, 6, 2), DATE_TO)
+        # Una unità di quota per ciascuno dei due giorni chiesti
+        assert rate_limit.call_args.kwargs["cost"] == 2
+        assert all_from_cache is False
+        assert len(results) == 1
+        assert results[0]["price_eur"] == 29.99
+
     async def test_no_cache_provider_returns_offers(self):
         """Cache vuota → il provider viene chiamato e i risultati vengono restituiti."""
         fco_airport = _make_airport("FCO", "Rome", 41.80, 12.24)
@@ -161,7 +202,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=True)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()):
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
 
             results, all_from_cache, _, _ = await reverse_search(
                 session=session,
@@ -187,7 +228,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=False)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()):
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
 
             results, all_from_cache, _, _ = await reverse_search(
                 session=session,
@@ -220,7 +261,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=True)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()), \
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()), \
              caplog.at_level(logging.WARNING, logger="app.services.search_engine"):
 
             results, _, _, _ = await reverse_search(
@@ -260,7 +301,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=True)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()):
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
 
             results, _, _, _ = await reverse_search(
                 session=session,
@@ -294,7 +335,7 @@ class TestReverseSearch:
                    new=AsyncMock(return_value=_FAKE_QUOTAS)), \
              patch("app.services.search_engine.check_rate_limit",
                    new=AsyncMock(return_value=True)), \
-             patch("app.services.search_engine.save_to_cache", new=AsyncMock()):
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
 
             await reverse_search(
                 session=session,
@@ -309,3 +350,38 @@ class TestReverseSearch:
         # Solo FCO (~900km da CTA) dovrebbe essere interrogato
         assert "FCO" in captured_origins
         assert "BER" not in captured_origins
+
+    async def test_second_search_served_from_memory(self):
+        """Seconda ricerca identica: le date già scansionate non interrogano il DB."""
+        fco_airport = _make_airport("FCO", "Rome", 41.80, 12.24)
+        offer = FlightOffer("FCO", "CTA", "2026-06-01T08:00:00", 49.99, "ITA", True, 90)
+        fresh = datetime.now(timezone.utc).replace(tzinfo=None)
+        cache_entry = _make_cache_entry("FCO", "CTA", DATE_FROM, [offer], fetched_at=fresh)
+
+        first_session = _build_session([fco_airport], [cache_entry])
+        # seconda sessione: solo la query degli aeroporti è disponibile
+        second_session = AsyncMock()
+        airport_result = MagicMock()
+        airport_result.scalars.return_value.all.return_value = [fco_airport]
+        second_session.execute.side_effect = [airport_result]
+
+        with patch("app.services.search_engine.get_providers_in_order",
+                   new=AsyncMock(return_value=[])), \
+             patch("app.services.search_engine.get_provider_quotas",
+                   new=AsyncMock(return_value=_FAKE_QUOTAS)), \
+             patch("app.services.search_engine.check_rate_limit",
+                   new=AsyncMock(return_value=True)), \
+             patch("app.services.search_engine.save_to_cache_many", new=AsyncMock()):
+
+            await reverse_search(
+                session=first_session, destination=DESTINATION,
+                date_from=DATE_FROM, date_to=DATE_FROM,
+            )
+            results, all_from_cache, _, _ = await reverse_search(
+                session=second_session, destination=DESTINATION,
+                date_from=DATE_FROM, date_to=DATE_FROM,
+            )
+
+        assert second_session.execute.await_count == 1
+        assert all_from_cache is True
+        assert results[0]["origin"] == "FCO"
@@ -0,0 +1,23 @@
+"""
+Test per il token bucket (utils/token_bucket.py) che cadenza le richieste Amadeus.
+"""
+import time
+
+from app.utils.token_bucket import TokenBucket
+
+
+async def test_burst_does_not_wait():
+    bucket = TokenBucket(rate_per_s=5, burst=3)
+    start = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+
+async def test_requests_beyond_burst_are_paced():
+    bucket = TokenBucket(rate_per_s=20, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # 1 subito, poi 3 a 1/20 s di distanza
+    assert time.monotonic() - start >= 0.14
@@ -81,3 +81,59 @@ export async function searchSmartMulti({ origin, tripDurationDays, budgetPerPers
     clearTimeout(timer)
   }
 }
+
+/**
+ * Smart Multi-City progressivo: stessa ricerca di searchSmartMulti, ma
+ * onEvent viene chiamata per ogni riga NDJSON appena arriva
+ * ({event: "candidates" | "itinerary" | "done" | "error", ...}).
+ * Ritorna il payload dell'evento "done".
+ */
+export async function streamSmartMulti({ origin, tripDurationDays, budgetPerPerson, travelers, dateFrom, dateTo, directOnly }, onEvent) {
+  const controller = new AbortController()
+  const timer = setTimeout(() => controller.abort(), 120_000)
+
+  try {
+    const res = await fetch(`${BASE}/search/smart-multi/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        origin,
+        trip_duration_days: tripDurationDays,
+        budget_per_person_eur: budgetPerPerson,
+        travelers,
+        date_from: dateFrom,
+        date_to: dateTo,
+        direct_only: directOnly,
+      }),
+      signal: controller.signal,
+    })
+
+    if (!res.ok) {
+      const body = await res.json().catch(() => ({ detail: res.statusText }))
+      throw new Error(body.detail || `Errore ${res.status}`)
+    }
+
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += value
+      const lines = buffer.split('\n')
+      buffer = lines.pop()
+      for (const line of lines) {
+        if (!line.trim()) continue
+        const msg = JSON.parse(line)
+        if (msg.event === 'error') throw new Error(msg.detail || `Errore ${msg.status}`)
+        onEvent?.(msg)
+        if (msg.event === 'done') return msg
+      }
+    }
+    throw new Error('Risposta incompleta dal server, riprova.')
+  } catch (err) {
+    if (err.name === 'AbortError') throw new Error('Ricerca troppo lenta, riprova tra qualche minuto.')
+    throw err
+  } finally {
+    clearTimeout(timer)
+  }
+}